@@ -0,0 +1,824 @@
+"""
+Benchmarks for the data / rendering layers of Online_Invoice_Application_2.
+
+Run:  python Benchmark_Invoice_Application.py [name ...]
+With no names every benchmark runs. Bills are taken from
+Invoice_mergerd.json and replicated to reach larger history sizes.
+"""
+import copy
+import hashlib
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+import Merger_Json_Files_To_firebase as json_merger
+from Online_Invoice_Application_2 import (
+    FPDF,
+    FirebaseDeltaSync,
+    FitzTextEngine,
+    InvoiceTemplate,
+    PdfLocationIndex,
+    PyPDF2TextEngine,
+    StatementMerger,
+    StockAggregator,
+    SubtotalBackfill,
+    SubstringIndex,
+    VirtualTable,
+    bill_line_items,
+    bill_sub_total,
+    commission_is_current,
+    commission_on,
+    commission_updates,
+    subtotal_from_text,
+    draw_invoice_header,
+    find_asset,
+    image_asset,
+    render_invoice_job,
+    render_invoices_parallel,
+    stamp_invoice_header,
+    iter_bill_items,
+    describe_statement,
+    np,
+    pdf_subtotal,
+    render_invoice_pdf,
+    render_statement_pdf,
+)
+
+SOURCE_FILE = "Invoice_mergerd.json"
+
+# Simulated link to Firebase used to turn bytes into latency
+NETWORK_RTT = 0.080          # seconds per request
+NETWORK_BANDWIDTH = 1_000_000  # bytes per second (upload)
+
+
+# =====================================================
+# Helpers
+# =====================================================
+def load_source():
+    with open(SOURCE_FILE, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def scaled_bills(count):
+    """Replicate the real bills until there are 'count' of them."""
+    source = list(load_source()["bills"].values())
+    bills = {}
+    i = 0
+    while len(bills) < count:
+        bill = copy.deepcopy(source[i % len(source)])
+        bill_no = f"{bill.get('bill_no', 'AP')}_{i}"
+        bill["bill_no"] = bill_no
+        bills[bill_no] = bill
+        i += 1
+    return bills
+
+
+class RecordingRef:
+    """Stand-in for a firebase_admin db.Reference that counts uploaded bytes."""
+
+    def __init__(self, path):
+        self.path = path
+        self.requests = 0
+        self.bytes_sent = 0
+
+    def _send(self, payload):
+        self.requests += 1
+        self.bytes_sent += len(json.dumps(payload, default=str).encode("utf-8"))
+
+    def set(self, data):
+        self._send(data)
+
+    def update(self, data):
+        self._send(data)
+
+
+def modeled_latency(ref, cpu_seconds):
+    return cpu_seconds + ref.requests * NETWORK_RTT + ref.bytes_sent / NETWORK_BANDWIDTH
+
+
+def report(label, rows):
+    print(f"\n{label}")
+    for row in rows:
+        print("  " + row)
+
+
+# =====================================================
+# Benchmark: full-tree set() vs delta update() per edit
+# =====================================================
+def bench_delta_sync(sizes=(270, 2_000, 10_000), edits=20):
+    rows = []
+    for size in sizes:
+        bills = scaled_bills(size)
+        keys = list(bills)
+
+        full_ref = RecordingRef("bills")
+        start = time.perf_counter()
+        for n in range(edits):
+            bills[keys[n]]["payment_status"] = f"Paid {n}"
+            full_ref.set(bills)
+        full_cpu = time.perf_counter() - start
+
+        sync = FirebaseDeltaSync()
+        delta_ref = RecordingRef("bills")
+        sync.snapshot(delta_ref, bills)
+        start = time.perf_counter()
+        for n in range(edits):
+            bills[keys[n]]["payment_status"] = f"Pending {n}"
+            sync.flush(delta_ref, bills, keys=[keys[n]])
+        delta_cpu = time.perf_counter() - start
+
+        scan_ref = RecordingRef("bills")
+        sync.snapshot(scan_ref, bills)
+        start = time.perf_counter()
+        for n in range(edits):
+            bills[keys[n]]["payment_status"] = f"Paid {n}"
+            sync.flush(scan_ref, bills)
+        scan_cpu = time.perf_counter() - start
+
+        for label, ref, cpu in (("set() full tree", full_ref, full_cpu),
+                                ("update() keyed", delta_ref, delta_cpu),
+                                ("update() diffed", scan_ref, scan_cpu)):
+            rows.append(
+                f"{size:>6} bills | {label:<16} | "
+                f"{ref.bytes_sent / edits / 1024:>10.1f} KiB/edit | "
+                f"{modeled_latency(ref, cpu) / edits * 1000:>9.1f} ms/edit"
+            )
+    report("Persistence: bytes and modeled latency per edit", rows)
+
+
+# =====================================================
+# Benchmark: Stock Report aggregation at 100k line items
+# =====================================================
+def legacy_delivery_counts(bills):
+    """The per-item string parsing loop the Stock Report used before."""
+    product_stats = {}
+    for bill_info in bills.values():
+        for item in iter_bill_items(bill_info):
+            product_name, no_of_case, per_case, quantity, unit_type = item[1], item[2], item[3], item[4], item[6]
+            if product_name not in product_stats:
+                product_stats[product_name] = {
+                    'total_cases': 0, 'per_case': per_case, 'total_quantity': 0,
+                    'unit_type': unit_type, 'delivery_count': 0
+                }
+            product_stats[product_name]['total_cases'] += int(no_of_case) if no_of_case else 0
+            product_stats[product_name]['total_quantity'] += int(quantity.split()[0]) if quantity else 0
+            product_stats[product_name]['delivery_count'] += 1
+    return product_stats
+
+
+def bench_stock_report(line_items=100_000):
+    source = load_source()["bills"]
+    per_bill = sum(len(iter_bill_items(b)) for b in source.values()) / len(source)
+    bills = scaled_bills(int(line_items / per_bill) + 1)
+    total_items = sum(len(iter_bill_items(b)) for b in bills.values())
+
+    start = time.perf_counter()
+    legacy = legacy_delivery_counts(bills)
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    parsed = {bill_no: bill_line_items(bill) for bill_no, bill in bills.items()}
+    parse_time = time.perf_counter() - start
+
+    aggregator = StockAggregator()
+    start = time.perf_counter()
+    for bill_no, lines in parsed.items():
+        aggregator.set_bill(bill_no, lines)
+    load_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    totals = aggregator.totals()
+    aggregate_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    aggregator.totals()
+    cached_time = time.perf_counter() - start
+
+    bill_no = next(iter(parsed))
+    start = time.perf_counter()
+    aggregator.set_bill(bill_no, parsed[bill_no])
+    aggregator.totals()
+    edit_time = time.perf_counter() - start
+
+    for name, stats in legacy.items():
+        for key in ("total_cases", "total_quantity", "delivery_count"):
+            assert totals[name][key] == stats[key], (name, key)
+
+    report(f"Stock Report: {total_items} line items, {len(bills)} bills "
+           f"({'NumPy' if np is not None else 'pure Python fallback'})", [
+        f"legacy string loop         {legacy_time * 1000:>9.1f} ms",
+        f"parse to LineItems (once)  {parse_time * 1000:>9.1f} ms",
+        f"load columns (once)        {load_time * 1000:>9.1f} ms",
+        f"grouped aggregation        {aggregate_time * 1000:>9.1f} ms",
+        f"cached totals              {cached_time * 1000:>9.3f} ms",
+        f"one bill edited + totals   {edit_time * 1000:>9.1f} ms",
+    ])
+
+
+# =====================================================
+# Benchmark: Treeview render at 50k rows
+# =====================================================
+def bench_table_render(row_count=50_000):
+    import tkinter as tk
+    from tkinter import ttk
+
+    try:
+        root = tk.Tk()
+    except tk.TclError as e:
+        report("Table render: skipped (no display)", [str(e)])
+        return
+    root.withdraw()
+
+    columns = ("Bill No", "Bill Date", "Customer Name", "Agent Name", "Net Amount", "Status")
+    rows = [
+        ((f"AP{i:05d}", "04/04/2025", f"CUSTOMER {i % 900}", f"AGENT {i % 40}", f"₹{i * 7.5:,.2f}", "Pending"),
+         ('evenrow',) if i % 2 == 0 else ('oddrow',))
+        for i in range(row_count)
+    ]
+
+    def make_table():
+        tree = ttk.Treeview(root, columns=columns, show="headings", height=15)
+        scrollbar = ttk.Scrollbar(root, orient="vertical", command=tree.yview)
+        tree.configure(yscrollcommand=scrollbar.set)
+        return tree, scrollbar
+
+    tree, _ = make_table()
+    start = time.perf_counter()
+    for values, tags in rows:
+        tree.insert("", "end", values=values, tags=tags)
+    root.update_idletasks()
+    legacy_time = time.perf_counter() - start
+    tree.destroy()
+
+    tree, scrollbar = make_table()
+    view = VirtualTable(tree, scrollbar)
+    start = time.perf_counter()
+    view.set_rows(rows)
+    root.update_idletasks()
+    virtual_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for offset in range(0, row_count, row_count // 100):
+        view.scroll_to(offset)
+    root.update_idletasks()
+    scroll_time = (time.perf_counter() - start) / 100
+
+    start = time.perf_counter()
+    view.sort_by(2)
+    root.update_idletasks()
+    sort_time = time.perf_counter() - start
+
+    root.destroy()
+    report(f"Table render: {row_count} rows", [
+        f"insert every row           {legacy_time * 1000:>9.1f} ms",
+        f"VirtualTable.set_rows      {virtual_time * 1000:>9.1f} ms",
+        f"scroll jump (avg)          {scroll_time * 1000:>9.2f} ms",
+        f"sort by column             {sort_time * 1000:>9.1f} ms",
+    ])
+
+
+# =====================================================
+# Benchmark: autocomplete at tens of thousands of parties
+# =====================================================
+def scaled_customer_names(count):
+    """Real customer names with a numeric suffix until there are 'count'."""
+    source = sorted({
+        bill.get("customer_name", "").strip()
+        for bill in load_source()["bills"].values()
+        if bill.get("customer_name", "").strip()
+    })
+    return [f"{source[i % len(source)]} {i}" for i in range(count)]
+
+
+def bench_autocomplete(count=50_000, limit=50):
+    names = scaled_customer_names(count)
+    queries = ["s", "sr", "sri", "trad", "agen", "zzz", "1234"]
+
+    start = time.perf_counter()
+    index = SubstringIndex(names)
+    build_time = time.perf_counter() - start
+
+    rows = [f"build index ({count} names) {build_time * 1000:>9.1f} ms"]
+    for query in queries:
+        start = time.perf_counter()
+        for _ in range(20):
+            legacy = [name for name in names if query.lower() in name.lower()]
+        legacy_time = (time.perf_counter() - start) / 20
+
+        start = time.perf_counter()
+        for _ in range(20):
+            found = index.search(query, limit)
+        index_time = (time.perf_counter() - start) / 20
+
+        assert set(found) <= set(legacy) and len(found) == min(limit, len(legacy)), query
+        rows.append(f"{query!r:<8} linear scan {legacy_time * 1000:>8.2f} ms | "
+                    f"index {index_time * 1000:>6.3f} ms | {len(legacy)} matches")
+    report("Autocomplete: linear scan vs SubstringIndex", rows)
+
+
+# =====================================================
+# Benchmark: resolving bill PDFs on disk
+# =====================================================
+def legacy_resolve(invoice_app_dir, filename, agent_folder):
+    """The per-bill folder probing and os.walk fallback used before."""
+    for year_folder in os.listdir(invoice_app_dir):
+        if not year_folder.startswith("Invoice_Bill_"):
+            continue
+        for office_folder in ("AP", "AFI", "AFF"):
+            office_path = os.path.join(invoice_app_dir, year_folder, office_folder)
+            if not os.path.exists(office_path):
+                continue
+            if os.path.exists(os.path.join(office_path, filename)):
+                return os.path.join(office_path, filename)
+            if os.path.exists(os.path.join(office_path, agent_folder, filename)):
+                return os.path.join(office_path, agent_folder, filename)
+    for year_folder in os.listdir(invoice_app_dir):
+        if year_folder.startswith("Invoice_Bill_"):
+            for root, dirs, files in os.walk(os.path.join(invoice_app_dir, year_folder)):
+                if filename in files:
+                    return os.path.join(root, filename)
+    return None
+
+
+def bench_pdf_resolve(pdf_count=5_000, lookups=300):
+    with tempfile.TemporaryDirectory() as tmp:
+        invoice_app_dir = os.path.join(tmp, "InvoiceApp")
+        names = []
+        for i in range(pdf_count):
+            folder = os.path.join(invoice_app_dir, f"Invoice_Bill_{2023 + i % 3}",
+                                  ("AP", "AFI", "AFF")[i % 3], f"AGENT_{i % 25}")
+            os.makedirs(folder, exist_ok=True)
+            name = f"CUSTOMER_{i}_{i:03d}.pdf"
+            open(os.path.join(folder, name), "wb").close()
+            names.append((name, f"AGENT_{(i + 1) % 25}"))   # agent guess misses, like renamed agents
+        wanted = names[::max(1, pdf_count // lookups)][:lookups] + [("MISSING.pdf", "AGENT_0")]
+
+        start = time.perf_counter()
+        legacy = [legacy_resolve(invoice_app_dir, name, agent) for name, agent in wanted]
+        legacy_time = time.perf_counter() - start
+
+        cache_path = os.path.join(tmp, "pdf_index.json")
+        start = time.perf_counter()
+        index = PdfLocationIndex(invoice_app_dir, cache_path)
+        index.refresh(force=True)
+        build_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        index = PdfLocationIndex(invoice_app_dir, cache_path)
+        index.refresh(force=True)
+        found = [index.resolve(name) for name, _ in wanted]
+        warm_time = time.perf_counter() - start
+
+        assert found == legacy
+
+    report(f"PDF resolve: {len(wanted)} bills, {pdf_count} PDFs on disk", [
+        f"per-bill probing + walks   {legacy_time * 1000:>9.1f} ms",
+        f"index build (one scandir)  {build_time * 1000:>9.1f} ms",
+        f"reload + mtime check + all {warm_time * 1000:>9.1f} ms",
+    ])
+
+
+# =====================================================
+# Benchmark: invoice PDFs one by one vs a process pool
+# =====================================================
+def bench_invoice_render(count=600):
+    bills = list(scaled_bills(count).values())
+    with tempfile.TemporaryDirectory() as tmp:
+        jobs = [(bill, os.path.join(tmp, "serial", f"{i}.pdf")) for i, bill in enumerate(bills)]
+        start = time.perf_counter()
+        serial = [render_invoice_job(job) for job in jobs]
+        serial_time = time.perf_counter() - start
+
+        jobs = [(bill, os.path.join(tmp, "pool", f"{i}.pdf")) for i, bill in enumerate(bills)]
+        start = time.perf_counter()
+        pooled = list(render_invoices_parallel(jobs))
+        pool_time = time.perf_counter() - start
+
+        assert not any(result[3] for result in serial + pooled)
+        per_document = sorted(result[2] for result in pooled)
+
+    report(f"Invoice render: {count} invoices, {os.cpu_count()} cores", [
+        f"one at a time      {serial_time * 1000:>9.1f} ms",
+        f"process pool       {pool_time * 1000:>9.1f} ms",
+        f"per document p50   {per_document[len(per_document) // 2] * 1000:>9.2f} ms",
+        f"per document max   {per_document[-1] * 1000:>9.2f} ms",
+    ])
+
+
+# =====================================================
+# Benchmark: drawing the office header vs stamping the template
+# =====================================================
+def header_page(office_code, header):
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.set_left_margin(15)
+    pdf.set_right_margin(15)
+    pdf.set_font("Arial", "B", 9)
+    header(pdf, office_code)
+    return pdf.output(dest="S")
+
+
+def bench_invoice_header(invoices=30):
+    offices = ("A1", "A2", "A3")
+    rows = []
+    for label, header in (("draw every header     ", draw_invoice_header),
+                          ("stamp cached template ", stamp_invoice_header)):
+        if header is stamp_invoice_header:
+            start = time.perf_counter()
+            for office_code in offices:
+                InvoiceTemplate.for_office(office_code)
+            rows.append(f"template build (x3)    {(time.perf_counter() - start) * 1000:>9.1f} ms")
+        start = time.perf_counter()
+        sizes = [len(header_page(offices[i % 3], header)) for i in range(invoices)]
+        elapsed = time.perf_counter() - start
+        rows.append(f"{label} {elapsed / invoices * 1000:>9.2f} ms/invoice "
+                    f"{sum(sizes) / len(sizes) / 1024:>7.1f} KB/invoice")
+
+    report(f"Invoice header: {invoices} invoice pages", rows)
+
+
+# =====================================================
+# Benchmark: embedding the source PNGs vs the prepared assets
+# =====================================================
+def bench_image_assets(invoices=10):
+    sources = (find_asset("logo.png"), find_asset("Title.png"))
+    if None in sources:
+        print("\nImage assets: logo.png / Title.png not found, skipped")
+        return
+
+    start = time.perf_counter()
+    prepared = (image_asset("logo.png", width_mm=27), image_asset("Title.png", width_mm=50))
+    prepare_time = time.perf_counter() - start
+
+    rows = [f"prepare (first run only) {prepare_time * 1000:>9.1f} ms"]
+    for label, (logo, title) in (("source PNGs    ", sources), ("prepared assets", prepared)):
+        start = time.perf_counter()
+        sizes = []
+        for _ in range(invoices):
+            pdf = FPDF()
+            pdf.add_page()
+            pdf.image(logo, x=6, y=1, w=27)
+            pdf.image(title, x=154, y=1, w=50, h=20)
+            sizes.append(len(pdf.output(dest="S")))
+        elapsed = time.perf_counter() - start
+        rows.append(f"{label}          {elapsed / invoices * 1000:>9.2f} ms/invoice "
+                    f"{sum(sizes) / len(sizes) / 1024:>7.1f} KB/invoice")
+
+    report(f"Image assets: logo + title on {invoices} invoices", rows)
+
+
+# =====================================================
+# Benchmark: PdfMerger vs the streaming statement merge
+# =====================================================
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:   # Windows
+        return float("nan")
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1_048_576 if sys.platform == "darwin" else peak / 1024
+
+
+def legacy_merge(paths, output_path):
+    """Every input appended to one PdfMerger and written at the end, as before."""
+    from PyPDF2 import PdfMerger
+    merger = PdfMerger()
+    for path in paths:
+        merger.append(path)
+    merger.write(output_path)
+    merger.close()
+
+
+def timed_merge(args):
+    """Runs in a fresh process so the peak RSS belongs to one merge only."""
+    method, paths, output_path = args
+    start = time.perf_counter()
+    if method == "legacy":
+        legacy_merge(paths, output_path)
+    else:
+        StatementMerger().merge(paths, output_path)
+    return time.perf_counter() - start, peak_rss_mb(), os.path.getsize(output_path)
+
+
+def bench_statement_merge(bills=400, repeat=5):
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for i, bill in enumerate(scaled_bills(bills).values()):
+            path = os.path.join(tmp, f"{i}.pdf")
+            render_invoice_pdf(bill, path)
+            paths.append(path)
+        paths = paths * repeat   # a long statement reuses the invoices
+
+        rows = []
+        for label, method in (("PdfMerger (all in memory)", "legacy"), ("StatementMerger (streamed)", "stream")):
+            with multiprocessing.Pool(1, maxtasksperchild=1) as pool:
+                seconds, rss, size = pool.apply(timed_merge, ((method, paths, os.path.join(tmp, f"{method}.out.pdf")),))
+            rows.append(f"{label:<27} {seconds * 1000:>9.1f} ms {len(paths) / seconds:>7.0f} PDFs/s "
+                        f"peak RSS {rss:>7.1f} MB  output {size / 1_048_576:>6.1f} MB")
+
+    report(f"Statement merge: {len(paths)} invoice PDFs", rows)
+
+
+# =====================================================
+# Benchmark: merging stored invoices vs rendering from bill data
+# =====================================================
+def bench_statement_render(bills=400):
+    records = list(scaled_bills(bills).values())
+    with tempfile.TemporaryDirectory() as tmp:
+        invoice_app_dir = os.path.join(tmp, "InvoiceApp")
+        folder = os.path.join(invoice_app_dir, "Invoice_Bill_2025", "AP", "AGENT")
+        os.makedirs(folder)
+        names = []
+        for i, bill in enumerate(records):
+            names.append(f"{i}.pdf")
+            render_invoice_pdf(bill, os.path.join(folder, names[-1]))
+
+        start = time.perf_counter()
+        index = PdfLocationIndex(invoice_app_dir, os.path.join(tmp, "pdf_index.json"))
+        index.refresh(force=True)
+        paths = [index.resolve(name) for name in names]
+        merged = StatementMerger().merge(paths, os.path.join(tmp, "merged.pdf"))
+        merge_time = time.perf_counter() - start
+
+        rendered = render_statement_pdf(records, os.path.join(tmp, "rendered.pdf"))
+        assert rendered["pages"] == merged["pages"]
+
+        report(f"Statement: {bills} bills", [
+            f"find + merge stored PDFs   {merge_time * 1000:>9.1f} ms "
+            f"{os.path.getsize(os.path.join(tmp, 'merged.pdf')) / 1_048_576:>7.1f} MB",
+            f"render from bill records   {rendered['seconds'] * 1000:>9.1f} ms "
+            f"{os.path.getsize(os.path.join(tmp, 'rendered.pdf')) / 1_048_576:>7.1f} MB",
+            describe_statement(rendered),
+        ])
+
+
+# =====================================================
+# Benchmark: per-bill commission saves vs one bulk update
+# =====================================================
+def legacy_commission_loop(bills, sync, ref, commission_rate):
+    """calculate_and_save_commission() for every bill: one delta save per bill."""
+    for bill_no, bill in bills.items():
+        sub_total = float(bill.get("sub_total", 0) or 0)
+        bill.update({
+            "commission_rate": commission_rate,
+            "commission_amount": sub_total * commission_rate / 100 if sub_total > 0 else 0,
+            "commission_calculated_on": "sub_total",
+            "commission_last_updated": time.strftime("%d/%m/%Y %H:%M:%S"),
+        })
+        sync.flush(ref, bills, keys=[bill_no])
+
+
+def bench_commissions(count=10_000, commission_rate=7.5):
+    bills = scaled_bills(count)
+
+    legacy_bills = copy.deepcopy(bills)
+    sync = FirebaseDeltaSync()
+    legacy_ref = RecordingRef("bills")
+    sync.snapshot(legacy_ref, legacy_bills)
+    start = time.perf_counter()
+    legacy_commission_loop(legacy_bills, sync, legacy_ref, commission_rate)
+    legacy_cpu = time.perf_counter() - start
+
+    sync = FirebaseDeltaSync()
+    bulk_ref = RecordingRef("bills")
+    sync.snapshot(bulk_ref, bills)
+    start = time.perf_counter()
+    updates = commission_updates(bills, commission_rate)
+    sync.update_fields(bulk_ref, bills, updates)
+    bulk_cpu = time.perf_counter() - start
+
+    rows = []
+    for label, ref, cpu in (("save per bill (delta)", legacy_ref, legacy_cpu),
+                            ("bulk multi-path update", bulk_ref, bulk_cpu)):
+        rows.append(f"{label:<23} {ref.requests:>6} requests {ref.bytes_sent / 1_048_576:>8.2f} MB "
+                    f"cpu {cpu * 1000:>8.1f} ms  modeled {modeled_latency(ref, cpu):>8.1f} s")
+    rows.append(f"bills updated: {len(updates)} ({'NumPy' if np is not None else 'plain Python'})")
+    report(f"Commission recalculation: {count} bills", rows)
+
+
+# =====================================================
+# Benchmark: browsing agent bills at several rates
+# =====================================================
+def legacy_commission_browse(bills, sync, ref, commission_rate):
+    """load_agent_bills_for_commission() before: rewrite and save every changed bill on load."""
+    changed = []
+    for bill_no, bill in bills.items():
+        sub_total = bill.get("sub_total", 0)
+        commission_amount = sub_total * commission_rate / 100 if sub_total > 0 else 0
+        if commission_amount != bill.get("commission_amount", 0) or commission_rate != bill.get("commission_rate", 0):
+            bill.update({
+                "commission_rate": commission_rate,
+                "commission_amount": commission_amount,
+                "commission_calculated_on": "sub_total",
+                "commission_last_updated": time.strftime("%Y-%m-%d %H:%M:%S"),
+            })
+            changed.append(bill_no)
+    if changed:
+        sync.flush(ref, bills, keys=changed)
+
+
+def bench_commission_preview(count=2_000, rates=(5.0, 6.0, 7.5, 5.0, 7.5)):
+    bills = scaled_bills(count)
+
+    legacy_bills = copy.deepcopy(bills)
+    sync = FirebaseDeltaSync()
+    legacy_ref = RecordingRef("bills")
+    sync.snapshot(legacy_ref, legacy_bills)
+    start = time.perf_counter()
+    for rate in rates:
+        legacy_commission_browse(legacy_bills, sync, legacy_ref, rate)
+    legacy_cpu = time.perf_counter() - start
+
+    sync = FirebaseDeltaSync()
+    preview_ref = RecordingRef("bills")
+    sync.snapshot(preview_ref, bills)
+    bases = {}
+    start = time.perf_counter()
+    for rate in rates:
+        unsaved = 0
+        for bill_no, bill in bills.items():
+            if bill_no not in bases:
+                bases[bill_no] = bill_sub_total(bill)[0]
+            sub_total = bases[bill_no]
+            commission_amount = commission_on(sub_total, rate)
+            unsaved += not commission_is_current(bill, commission_amount, rate)
+    preview_cpu = time.perf_counter() - start
+    start = time.perf_counter()
+    updates = commission_updates(bills, rates[-1])
+    sync.update_fields(preview_ref, bills, updates)
+    commit_cpu = time.perf_counter() - start
+
+    rows = []
+    for label, ref, cpu in (("save on every load", legacy_ref, legacy_cpu),
+                            ("preview + one commit", preview_ref, preview_cpu + commit_cpu)):
+        rows.append(f"{label:<21} {ref.requests:>6} requests {ref.bytes_sent / 1_048_576:>8.2f} MB "
+                    f"cpu {cpu * 1000:>8.1f} ms  modeled {modeled_latency(ref, cpu):>8.2f} s")
+    rows.append(f"preview only: {preview_cpu / len(rates) * 1000:.1f} ms per load, 0 requests "
+                f"({unsaved} unsaved at {rates[-1]}%, {len(updates)} saved on commit)")
+    report(f"Agent commission browsing: {count} bills, rates {', '.join(map(str, rates))}", rows)
+
+
+# =====================================================
+# Benchmark: SUB TOTAL from legacy PDFs, inline vs backfill
+# =====================================================
+def legacy_extract_subtotal(path):
+    """extract_subtotal_from_pdf() before: the text of every page, on the calling thread."""
+    import PyPDF2
+
+    with open(path, "rb") as f:
+        text = ""
+        for page in PyPDF2.PdfReader(f).pages:
+            text += page.extract_text()
+    return subtotal_from_text(text)
+
+
+def bench_subtotal_backfill(count=300, batch_size=100):
+    bills = scaled_bills(count)
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = {bill_no: os.path.join(tmp, f"{i}.pdf") for i, bill_no in enumerate(bills)}
+        for _ in render_invoices_parallel((bills[bill_no], path) for bill_no, path in paths.items()):
+            pass
+
+        start = time.perf_counter()
+        inline = {bill_no: legacy_extract_subtotal(path) for bill_no, path in paths.items()}
+        inline_time = time.perf_counter() - start
+
+        batches = []
+
+        def save(updates):
+            batches.append(len(updates))
+            for bill_no, fields in updates.items():
+                bills[bill_no].update(fields)
+
+        backfill = SubtotalBackfill(os.path.join(tmp, "checkpoint.json"), batch_size=batch_size)
+        start = time.perf_counter()
+        saved, failed = backfill.run(backfill.pending(bills), lambda bill_nos: {b: paths[b] for b in bill_nos}, save)
+        backfill_time = time.perf_counter() - start
+        resume_start = time.perf_counter()
+        backfill.run(backfill.pending(bills), lambda bill_nos: {b: paths[b] for b in bill_nos}, save)
+        resume_time = time.perf_counter() - resume_start
+
+        mismatched = sum(1 for bill_no, value in inline.items() if bills[bill_no].get("sub_total") != value)
+
+    report(f"SUB TOTAL backfill: {count} legacy PDFs, {backfill.max_workers} worker processes", [
+        f"inline, UI thread     {inline_time * 1000:>9.1f} ms ({inline_time / count * 1000:.1f} ms per bill)",
+        f"background backfill   {backfill_time * 1000:>9.1f} ms off the UI thread",
+        f"re-run (all saved)    {resume_time * 1000:>9.1f} ms",
+        f"saved {saved} in {len(batches)} batches, {failed} failed, {mismatched} differ from inline",
+    ])
+
+
+# =====================================================
+# Benchmark: SUB TOTAL extraction engines
+# =====================================================
+def bench_pdf_text(count=200):
+    bills = scaled_bills(count)
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = {bill_no: os.path.join(tmp, f"{i}.pdf") for i, bill_no in enumerate(bills)}
+        for _ in render_invoices_parallel((bills[bill_no], path) for bill_no, path in paths.items()):
+            pass
+
+        engines = (
+            ("PyPDF2, every page", legacy_extract_subtotal),
+            ("PyPDF2, last page", PyPDF2TextEngine().subtotal),
+            ("PyMuPDF, full page", FitzTextEngine(region=None).subtotal),
+            ("PyMuPDF, text layer region", FitzTextEngine(content_stream=False).subtotal),
+            ("PyMuPDF, stream region", FitzTextEngine().subtotal),
+            ("pdf_subtotal, first read", pdf_subtotal),
+            ("pdf_subtotal, cached", pdf_subtotal),
+        )
+        rows = []
+        expected = None
+        for label, extract in engines:
+            start = time.perf_counter()
+            values = [extract(path) for path in paths.values()]
+            elapsed = time.perf_counter() - start
+            expected = expected or values
+            rows.append(f"{label:<27} {elapsed * 1000:>8.1f} ms  {elapsed / count * 1000:>7.3f} ms per PDF"
+                        f"{'' if values == expected else '  MISMATCH'}")
+
+    report(f"SUB TOTAL extraction: {count} invoice PDFs", rows)
+
+
+# =====================================================
+# Benchmark: export merge, whole documents vs streamed
+# =====================================================
+def legacy_json_merge(collections, output):
+    """Merger_Json_Files_To_firebase before: load everything, fix it, dump one document."""
+    final_json = {}
+    for collection, path in collections:
+        with open(path, "r", encoding="utf-8") as f:
+            final_json[collection] = json_merger.fix_structure(json.load(f))
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(final_json, f, indent=2, ensure_ascii=False)
+
+
+def timed_json_merge(args):
+    """Runs in a fresh process so the peak RSS belongs to one merge only."""
+    method, collections, output, ndjson_dir = args
+    start = time.perf_counter()
+    if method == "legacy":
+        legacy_json_merge(collections, output)
+    else:
+        if method == "stdlib":
+            json_merger.ijson = None
+        json_merger.merge(collections, output, ndjson_dir)
+    return time.perf_counter() - start, peak_rss_mb()
+
+
+def bench_json_merge(count=50_000):
+    source = load_source()
+    with tempfile.TemporaryDirectory() as tmp:
+        collections = []
+        for collection, records in (("bills", scaled_bills(count)),
+                                    ("party_data", source["party_data"]),
+                                    ("product_data", source["product_data"])):
+            path = os.path.join(tmp, f"{collection}.json")
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(records, f, indent=2, ensure_ascii=False)
+            collections.append((collection, path))
+        export_mb = sum(os.path.getsize(path) for _, path in collections) / 1_048_576
+
+        methods = [("json.load + json.dump", "legacy"), ("streamed, stdlib parser", "stdlib")]
+        if json_merger.ijson is not None:
+            methods.append((f"streamed, ijson {json_merger.ijson.backend}", "ijson"))
+        rows = []
+        outputs = []
+        for label, method in methods:
+            output = os.path.join(tmp, f"{method}.json")
+            with multiprocessing.Pool(1, maxtasksperchild=1) as pool:
+                seconds, rss = pool.apply(timed_json_merge, ((method, collections, output, os.path.join(tmp, method)),))
+            with open(output, "rb") as f:
+                outputs.append(hashlib.sha1(f.read()).hexdigest())
+            rows.append(f"{label:<26} {seconds * 1000:>9.1f} ms  peak RSS {rss:>7.1f} MB")
+        rows.append(f"outputs identical: {len(set(outputs)) == 1}")
+
+    report(f"Export merge: {count} bills, {export_mb:.0f} MB of JSON", rows)
+
+
+BENCHMARKS = {
+    "delta_sync": bench_delta_sync,
+    "stock_report": bench_stock_report,
+    "table_render": bench_table_render,
+    "autocomplete": bench_autocomplete,
+    "pdf_resolve": bench_pdf_resolve,
+    "invoice_render": bench_invoice_render,
+    "invoice_header": bench_invoice_header,
+    "image_assets": bench_image_assets,
+    "statement_merge": bench_statement_merge,
+    "statement_render": bench_statement_render,
+    "commissions": bench_commissions,
+    "commission_preview": bench_commission_preview,
+    "subtotal_backfill": bench_subtotal_backfill,
+    "pdf_text": bench_pdf_text,
+    "json_merge": bench_json_merge,
+}
+
+
+if __name__ == "__main__":
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        BENCHMARKS[name]()
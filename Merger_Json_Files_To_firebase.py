@@ -1,5 +1,27 @@
+import glob
 import json
+import os
 import re
+import sys
+
+try:
+    import ijson  # Optional: incremental parsing in C (the stdlib reader below is the fallback)
+except ImportError:
+    ijson = None
+
+# -----------------------------------------------------
+# Merges the three exports into one Firebase-ready JSON
+# file and into NDJSON chunks for batched import. Each
+# file is read one record at a time and each record is
+# written as soon as it is fixed, so memory stays at the
+# size of the largest single record, whatever the export.
+#
+#   python Merger_Json_Files_To_firebase.py             (merge)
+#   python Merger_Json_Files_To_firebase.py firebase    (upload the chunks)
+#
+# The upload sends one multi-path update per chunk and
+# leaves records that are not in the export untouched.
+# -----------------------------------------------------
 
 # -----------------------------------------------------
 # INPUT JSON FILES
@@ -8,18 +30,111 @@ BILLS_FILE = "bills.json"
 PARTY_FILE = "party_data.json"
 PRODUCT_FILE = "product_data.json"
 
+COLLECTIONS = (
+    ("bills", BILLS_FILE),
+    ("party_data", PARTY_FILE),
+    ("product_data", PRODUCT_FILE),
+)
+
 # -----------------------------------------------------
-# OUTPUT JSON (FINAL)
+# OUTPUT JSON (FINAL) and NDJSON chunks
 # -----------------------------------------------------
 OUTPUT = "final_firebase_ready.json"
+NDJSON_DIR = "final_firebase_ready_ndjson"
+NDJSON_CHUNK = 500          # records per chunk = children per Firebase update
+READ_CHUNK = 1 << 20        # characters read at a time without ijson
+
+FIREBASE_KEY_PATH = os.path.join(os.path.expanduser("~"), "billing_key_Invoice.json")
+DATABASE_URL = "https://onlineinvoiceapplication-default-rtdb.firebaseio.com/"
 
 
 # =====================================================
-# Helper: Load JSON
+# Helper: Stream the members of a JSON file
 # =====================================================
-def load_json(path):
+def iter_members(path):
+    """
+    (key, value) for each member of the top-level object or array of a JSON
+    file, parsed one member at a time. Array members come with their index.
+    """
+    with open(path, "rb") as f:
+        first = f.read(READ_CHUNK).lstrip()[:1]
+    if first not in (b"{", b"["):
+        raise ValueError(f"{path}: expected a JSON object or array")
+
+    if ijson is not None:
+        with open(path, "rb") as f:
+            if first == b"{":
+                yield from ijson.kvitems(f, "", use_float=True)
+            else:
+                yield from enumerate(ijson.items(f, "item", use_float=True))
+        return
+
+    yield from _iter_members_stdlib(path)
+
+
+def _iter_members_stdlib(path):
+    """iter_members() with json.JSONDecoder.raw_decode over a sliding buffer."""
+    decoder = json.JSONDecoder()
+    whitespace = re.compile(r"[ \t\n\r]*")
+
     with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+        buf, pos = "", 0
+
+        def more():
+            nonlocal buf, pos
+            chunk = f.read(READ_CHUNK)
+            buf, pos = buf[pos:] + chunk, 0
+            return bool(chunk)
+
+        def next_char():
+            nonlocal pos
+            while True:
+                pos = whitespace.match(buf, pos).end()
+                if pos < len(buf):
+                    return buf[pos]
+                if not more():
+                    raise ValueError(f"{path}: unexpected end of JSON")
+
+        def decode():
+            nonlocal pos
+            next_char()
+            while True:
+                try:
+                    value, end = decoder.raw_decode(buf, pos)
+                except json.JSONDecodeError:
+                    if not more():
+                        raise
+                    continue
+                if end == len(buf) and more():
+                    continue   # A number may go on in the next chunk
+                pos = end
+                return value
+
+        def expect(char):
+            nonlocal pos
+            if next_char() != char:
+                raise ValueError(f"{path}: expected {char!r}")
+            pos += 1
+
+        closing = "}" if next_char() == "{" else "]"
+        pos += 1
+        index = 0
+        if next_char() == closing:
+            return
+        while True:
+            if closing == "}":
+                key = decode()
+                expect(":")
+            else:
+                key = index
+                index += 1
+            yield key, decode()
+
+            if next_char() == ",":
+                pos += 1
+                continue
+            expect(closing)
+            return
 
 
 # =====================================================
@@ -74,28 +189,116 @@ def fix_structure(data):
 
 
 # =====================================================
-# LOAD all 3 JSON files
+# Fix a collection record by record, like fix_structure()
+# does for the whole file
 # =====================================================
-bills_data = load_json(BILLS_FILE)
-party_data = load_json(PARTY_FILE)
-product_data = load_json(PRODUCT_FILE)
+def fixed_records(path):
+    for key, value in iter_members(path):
+        if isinstance(key, int):          # top-level array
+            if value is None:
+                continue
+            yield str(key), fix_structure(value)
+        else:
+            yield sanitize_key(key), fix_structure(value)
 
 
 # =====================================================
-# FIX structures and sanitize everything
+# NDJSON chunk writer: {"key": record} per line
 # =====================================================
-final_json = {
-    "bills": fix_structure(bills_data),
-    "party_data": fix_structure(party_data),
-    "product_data": fix_structure(product_data)
-}
+class ChunkWriter:
+    def __init__(self, directory, collection, chunk_size=NDJSON_CHUNK):
+        self.directory = directory
+        self.collection = collection
+        self.chunk_size = chunk_size
+        self.file = None
+        self.lines = 0
+        self.chunks = 0
+
+    def write(self, key, value):
+        if self.file is None or self.lines >= self.chunk_size:
+            self.close()
+            self.chunks += 1
+            path = os.path.join(self.directory, f"{self.collection}_{self.chunks:05d}.ndjson")
+            self.file = open(path, "w", encoding="utf-8", newline="\n")
+            self.lines = 0
+        self.file.write(json.dumps({key: value}, ensure_ascii=False) + "\n")
+        self.lines += 1
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
 
 
 # =====================================================
-# SAVE final Firebase-compatible JSON
+# MERGE: stream all 3 files into OUTPUT and NDJSON_DIR
 # =====================================================
-with open(OUTPUT, "w", encoding="utf-8") as f:
-    json.dump(final_json, f, indent=2, ensure_ascii=False)
+def merge(collections=COLLECTIONS, output=OUTPUT, ndjson_dir=NDJSON_DIR):
+    """
+    Writes the same document json.dump(indent=2) gave for the whole export,
+    one record at a time, plus NDJSON chunks. Returns {collection: records}.
+    """
+    os.makedirs(ndjson_dir, exist_ok=True)
+    for old_chunk in glob.glob(os.path.join(ndjson_dir, "*.ndjson")):
+        os.remove(old_chunk)
+
+    counts = {}
+    tmp_output = output + ".part"
+    with open(tmp_output, "w", encoding="utf-8") as out:
+        out.write("{")
+        for c, (collection, path) in enumerate(collections):
+            out.write(("," if c else "") + f"\n  {json.dumps(collection)}: {{")
+            chunks = ChunkWriter(ndjson_dir, collection)
+            count = 0
+            try:
+                for key, value in fixed_records(path):
+                    record = json.dumps(value, indent=2, ensure_ascii=False).replace("\n", "\n    ")
+                    out.write(("," if count else "") + f"\n    {json.dumps(key, ensure_ascii=False)}: {record}")
+                    chunks.write(key, value)
+                    count += 1
+            finally:
+                chunks.close()
+            out.write("\n  }" if count else "}")
+            counts[collection] = count
+            print(f"➡ {collection}: {count} records in {chunks.chunks} chunks")
+        out.write("\n}" if collections else "}")
+    os.replace(tmp_output, output)
+    return counts
+
+
+# =====================================================
+# IMPORT: one multi-path update per NDJSON chunk
+# =====================================================
+def import_firebase(ndjson_dir=NDJSON_DIR):
+    import firebase_admin
+    from firebase_admin import credentials, db
+
+    if not firebase_admin._apps:
+        firebase_admin.initialize_app(
+            credentials.Certificate(FIREBASE_KEY_PATH), {"databaseURL": DATABASE_URL}
+        )
+
+    for collection, _ in COLLECTIONS:
+        ref = db.reference(collection)
+        imported = 0
+        for chunk_path in sorted(glob.glob(os.path.join(ndjson_dir, f"{collection}_*.ndjson"))):
+            batch = {}
+            with open(chunk_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        batch.update(json.loads(line))
+            if batch:
+                ref.update(batch)
+                imported += len(batch)
+                print(f"➡ {collection}: {imported} records imported")
+        print(f"✔ {collection}: {imported} records in Firebase")
+
 
-print("✔ FINAL Firebase-ready JSON created successfully!")
-print("➡ OUTPUT FILE:", OUTPUT)
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "firebase":
+        import_firebase()
+    else:
+        merge()
+        print("✔ FINAL Firebase-ready JSON created successfully!")
+        print("➡ OUTPUT FILE:", OUTPUT)
+        print("➡ NDJSON CHUNKS:", NDJSON_DIR)
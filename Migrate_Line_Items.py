@@ -0,0 +1,112 @@
+import json
+import os
+import sys
+
+from Online_Invoice_Application_2 import LineItem, iter_bill_items
+
+# -----------------------------------------------------
+# Adds numeric 'line_items' to every bill that only has
+# the legacy string 'items' rows.
+#
+#   python Migrate_Line_Items.py json [Invoice_mergerd.json]
+#   python Migrate_Line_Items.py firebase
+#
+# Bills that already have 'line_items' are skipped, so the
+# migration can be stopped and re-run at any time. Bills with
+# an item row that cannot be parsed are left unmigrated and
+# listed, so no line is dropped from the stored list.
+# -----------------------------------------------------
+DEFAULT_JSON = "Invoice_mergerd.json"
+FIREBASE_KEY_PATH = os.path.join(os.path.expanduser("~"), "billing_key_Invoice.json")
+DATABASE_URL = "https://onlineinvoiceapplication-default-rtdb.firebaseio.com/"
+BATCH_SIZE = 500
+
+
+# =====================================================
+# Helper: line items for bills that still need them
+# =====================================================
+def pending_line_items(bills, unparsed):
+    """(bill_no, line items) to store; bills with a bad row go to 'unparsed' instead."""
+    for bill_no, bill in bills.items():
+        if not isinstance(bill, dict) or bill.get("line_items"):
+            continue
+        try:
+            line_items = [LineItem.from_row(row) for row in iter_bill_items(bill)]
+        except ValueError as e:
+            unparsed.append((bill_no, str(e)))
+            continue
+        if line_items:
+            yield bill_no, [line.to_dict() for line in line_items]
+
+
+def report_unparsed(unparsed):
+    if unparsed:
+        print(f"⚠ {len(unparsed)} bills left unmigrated (fix their items and re-run):")
+        for bill_no, error in unparsed:
+            print(f"   {bill_no}: {error}")
+
+
+# =====================================================
+# Migrate a JSON export in place
+# =====================================================
+def migrate_json(path):
+    with open(path, "rb") as f:
+        newline = "\r\n" if b"\r\n" in f.read(4096) else "\n"
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    bills = data.get("bills", data)
+    migrated = 0
+    unparsed = []
+    for bill_no, line_items in pending_line_items(bills, unparsed):
+        bills[bill_no]["line_items"] = line_items
+        migrated += 1
+
+    with open(path, "w", encoding="utf-8", newline=newline) as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+
+    print(f"✔ {migrated} bills migrated in {path}")
+    report_unparsed(unparsed)
+
+
+# =====================================================
+# Migrate Firebase with batched multi-path updates
+# =====================================================
+def migrate_firebase():
+    import firebase_admin
+    from firebase_admin import credentials, db
+
+    if not firebase_admin._apps:
+        firebase_admin.initialize_app(
+            credentials.Certificate(FIREBASE_KEY_PATH), {"databaseURL": DATABASE_URL}
+        )
+
+    bills_ref = db.reference("bills")
+    bills = bills_ref.get() or {}
+    if isinstance(bills, list):
+        bills = {str(i): b for i, b in enumerate(bills) if b is not None}
+
+    batch = {}
+    migrated = 0
+    unparsed = []
+    for bill_no, line_items in pending_line_items(bills, unparsed):
+        batch[f"{bill_no}/line_items"] = line_items
+        if len(batch) >= BATCH_SIZE:
+            bills_ref.update(batch)
+            migrated += len(batch)
+            print(f"➡ {migrated} bills migrated")
+            batch = {}
+    if batch:
+        bills_ref.update(batch)
+        migrated += len(batch)
+
+    print(f"✔ {migrated} bills migrated in Firebase")
+    report_unparsed(unparsed)
+
+
+if __name__ == "__main__":
+    target = sys.argv[1] if len(sys.argv) > 1 else "json"
+    if target == "firebase":
+        migrate_firebase()
+    else:
+        migrate_json(sys.argv[2] if len(sys.argv) > 2 else DEFAULT_JSON)
@@ -0,0 +1,102 @@
+import json
+import os
+import sys
+
+from Online_Invoice_Application_2 import SCHEMA_VERSION, SERVER_TIMESTAMP, canonical_party, canonical_product
+
+# -----------------------------------------------------
+# Rewrites party and product records onto the canonical
+# schema (Customer_Name, GST_Number, Product_Name,
+# Selling_Price, ...) and stamps 'schema_version'.
+#
+#   python Migrate_Schema.py json [Invoice_mergerd.json]
+#   python Migrate_Schema.py firebase
+#
+# Records already on the current schema_version are
+# skipped, so the migration can be stopped and re-run
+# at any time.
+# -----------------------------------------------------
+DEFAULT_JSON = "Invoice_mergerd.json"
+FIREBASE_KEY_PATH = os.path.join(os.path.expanduser("~"), "billing_key_Invoice.json")
+DATABASE_URL = "https://onlineinvoiceapplication-default-rtdb.firebaseio.com/"
+BATCH_SIZE = 500
+
+COLLECTIONS = {
+    "party_data": canonical_party,
+    "product_data": canonical_product,
+}
+
+
+# =====================================================
+# Helper: canonical records for records that need them
+# =====================================================
+def pending_records(records, normalize):
+    for key, record in records.items():
+        if not isinstance(record, dict) or record.get("schema_version") == SCHEMA_VERSION:
+            continue
+        yield key, normalize(record)
+
+
+# =====================================================
+# Migrate a JSON export in place
+# =====================================================
+def migrate_json(path):
+    with open(path, "rb") as f:
+        newline = "\r\n" if b"\r\n" in f.read(4096) else "\n"
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    for collection, normalize in COLLECTIONS.items():
+        records = data.get(collection) or {}
+        migrated = 0
+        for key, record in pending_records(records, normalize):
+            records[key] = record
+            migrated += 1
+        print(f"✔ {migrated} {collection} records migrated in {path}")
+
+    with open(path, "w", encoding="utf-8", newline=newline) as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+
+
+# =====================================================
+# Migrate Firebase with batched multi-path updates
+# =====================================================
+def migrate_firebase():
+    import firebase_admin
+    from firebase_admin import credentials, db
+
+    if not firebase_admin._apps:
+        firebase_admin.initialize_app(
+            credentials.Certificate(FIREBASE_KEY_PATH), {"databaseURL": DATABASE_URL}
+        )
+
+    for collection, normalize in COLLECTIONS.items():
+        ref = db.reference(collection)
+        records = ref.get() or {}
+        if isinstance(records, list):
+            records = {str(i): r for i, r in enumerate(records) if r is not None}
+
+        batch = {}
+        migrated = 0
+        for key, record in pending_records(records, normalize):
+            # Newer last_modified lets running apps pull the rewritten record
+            record["last_modified"] = SERVER_TIMESTAMP
+            batch[key] = record
+            if len(batch) >= BATCH_SIZE:
+                ref.update(batch)
+                migrated += len(batch)
+                print(f"➡ {migrated} {collection} records migrated")
+                batch = {}
+        if batch:
+            ref.update(batch)
+            migrated += len(batch)
+
+        print(f"✔ {migrated} {collection} records migrated in Firebase")
+
+
+if __name__ == "__main__":
+    target = sys.argv[1] if len(sys.argv) > 1 else "json"
+    if target == "firebase":
+        migrate_firebase()
+    else:
+        migrate_json(sys.argv[2] if len(sys.argv) > 2 else DEFAULT_JSON)
@@ -12,40 +12,2621 @@ import subprocess
 import re
 import sys
 import glob
-from PyPDF2 import PdfMerger
+import hashlib
+import functools
+import bisect
+import itertools
+import sqlite3
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 import firebase_admin
 from firebase_admin import credentials, db
 
+try:
+    import numpy as np  # Optional: vectorized stock report aggregation
+except ImportError:
+    np = None
+
 
 # ---- Flexible date parser (used in multiple places) ----
+@functools.lru_cache(maxsize=8192)
 def parse_date_flexible(date_str):
     """
-    Try several date formats and return a datetime object.
-    Works with 28/01/2025, 28.01.2025, 28-01-2025, 2025-01-28, etc.
+    Try several date formats and return a datetime object.
+    Works with 28/01/2025, 28.01.2025, 28-01-2025, 2025-01-28, etc.
+    Results are memoized, so each distinct string is parsed only once.
+    """
+    if not date_str:
+        return None
+
+    s = str(date_str).strip()
+    formats = ("%d/%m/%Y", "%d.%m.%Y", "%d-%m-%Y", "%Y-%m-%d", "%Y.%m.%d")
+
+    for fmt in formats:
+        try:
+            return datetime.strptime(s, fmt)
+        except Exception:
+            continue
+
+    try:
+        return datetime.fromisoformat(s)
+    except Exception:
+        pass
+
+    print(f"DEBUG: Unrecognized date format: {s}")
+    return None
+
+
+def bill_date_ordinal(bill):
+    """
+    Day number (date.toordinal) of a bill's date. New bills store it as
+    'bill_date_ordinal' when saved; older bills fall back to the memoized parser.
+    """
+    ordinal = bill.get("bill_date_ordinal")
+    if isinstance(ordinal, int):
+        return ordinal
+    parsed = parse_date_flexible(str(bill.get("bill_date", "") or ""))
+    return parsed.toordinal() if parsed else None
+# ---------------------------------------------------------
+
+
+# ---- Delta sync for Firebase collections (party / product / bills) ----
+# Filled in by the Firebase server (epoch milliseconds) - never the local clock
+SERVER_TIMESTAMP = {".sv": "timestamp"}
+
+# Incremental refreshes re-read this much before the watermark (milliseconds)
+SYNC_OVERLAP_MS = 5 * 60 * 1000
+
+
+class FirebaseDeltaSync:
+    """
+    Remembers a fingerprint of every child of each collection as it was last
+    loaded or saved, so a save only uploads the children that changed.
+    All changes of one save go out as a single multi-path ref.update();
+    deleted children are sent as None (Firebase removes them).
+    Changed records are stamped with 'last_modified' by the server
+    (SERVER_TIMESTAMP) so other clients can fetch them incrementally; the
+    stamped value comes back with the next refresh.
+    """
+
+    def __init__(self):
+        self.fingerprints = {}   # collection path -> {child key: digest}
+        self.dirty = {}          # collection path -> set of child keys
+        self.last_stats = {}
+
+    @staticmethod
+    def collection_path(ref):
+        return getattr(ref, "path", None) or str(ref)
+
+    @staticmethod
+    def fingerprint(value):
+        raw = json.dumps(value, sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.blake2b(raw.encode("utf-8"), digest_size=16).digest()
+
+    def snapshot(self, ref, data):
+        """Record 'data' as the state currently stored in Firebase."""
+        path = self.collection_path(ref)
+        self.fingerprints[path] = {str(k): self.fingerprint(v) for k, v in data.items()}
+        self.dirty.pop(path, None)
+
+    def mark_dirty(self, ref, *keys):
+        """Flag children that were changed (or deleted) in memory."""
+        self.dirty.setdefault(self.collection_path(ref), set()).update(str(k) for k in keys)
+
+    def has_local_changes(self, ref, data, key):
+        """True when child 'key' was changed, added or deleted in memory and not saved yet."""
+        path = self.collection_path(ref)
+        key = str(key)
+        if key in self.dirty.get(path, ()):
+            return True
+        known = self.fingerprints.get(path, {}).get(key)
+        if key not in data:
+            return known is not None
+        return known != self.fingerprint(data[key])
+
+    def build_delta(self, ref, data, keys=None):
+        """
+        Return {child key: new value or None} for the children that differ
+        from the last snapshot. When 'keys' is given only those children
+        (plus anything flagged with mark_dirty) are compared.
+        """
+        path = self.collection_path(ref)
+        known = self.fingerprints.get(path, {})
+        marked = self.dirty.get(path, set())
+
+        if keys is None:
+            candidates = set(str(k) for k in data.keys()) | set(known.keys()) | marked
+        else:
+            candidates = set(str(k) for k in keys) | marked
+
+        delta = {}
+        for key in candidates:
+            if key in data:
+                if known.get(key) != self.fingerprint(data[key]):
+                    delta[key] = data[key]
+            elif key in known:
+                delta[key] = None
+        return delta
+
+    def flush(self, ref, data, keys=None):
+        """Push the changed children of 'data' with one ref.update() call."""
+        path = self.collection_path(ref)
+        delta = self.build_delta(ref, data, keys)
+
+        self.last_stats = {
+            "collection": path,
+            "children": len(delta),
+            "bytes": len(json.dumps(delta, default=str).encode("utf-8")) if delta else 0,
+        }
+        if not delta:
+            self.dirty.pop(path, None)
+            return delta
+
+        ref.update({
+            key: dict(value, last_modified=SERVER_TIMESTAMP) if isinstance(value, dict) else value
+            for key, value in delta.items()
+        })
+
+        known = self.fingerprints.setdefault(path, {})
+        for key, value in delta.items():
+            if value is None:
+                known.pop(key, None)
+            else:
+                known[key] = self.fingerprint(value)
+        self.dirty.pop(path, None)
+        return delta
+
+    def update_fields(self, ref, data, updates):
+        """
+        Write a few fields of many children as one multi-path ref.update()
+        ({"<key>/<field>": value, ...}) instead of re-sending whole records.
+        'updates' is {child key: {field: value}}; after the upload the fields
+        are applied to 'data', and children that had no other unsaved change
+        get a fresh fingerprint. Returns the path count.
+        """
+        count = self.upload_fields(ref, updates)
+        self.apply_fields(ref, data, updates)
+        return count
+
+    def upload_fields(self, ref, updates):
+        """The upload half of update_fields(): touches no local state, so it can run on any thread."""
+        if not updates:
+            return 0
+        paths = {}
+        for key, fields in updates.items():
+            for field, value in fields.items():
+                paths[f"{key}/{field}"] = value
+            paths[f"{key}/last_modified"] = SERVER_TIMESTAMP
+
+        ref.update(paths)
+        return len(paths)
+
+    def apply_fields(self, ref, data, updates):
+        """The local half of update_fields(), after a successful upload_fields()."""
+        known = self.fingerprints.setdefault(self.collection_path(ref), {})
+        for key, fields in updates.items():
+            record = data.get(key)
+            if not isinstance(record, dict):
+                continue   # Deleted while the upload was running
+            clean = known.get(str(key)) == self.fingerprint(record)
+            record.update(fields)
+            if clean:
+                known[str(key)] = self.fingerprint(record)
+# ---------------------------------------------------------
+
+
+# ---- Local snapshot of the Firebase collections (instant startup) ----
+class LocalSnapshotCache:
+    """
+    SQLite copy of party_data / product_data / bills kept next to settings.json.
+    Each collection has a watermark (highest 'last_modified' downloaded from
+    Firebase) so a refresh only asks for records changed after it. Local
+    saves are cached without moving it: a record another client saved in
+    between must still come down with the next refresh.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS records ("
+                " collection TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,"
+                " last_modified REAL NOT NULL DEFAULT 0,"
+                " PRIMARY KEY (collection, key))"
+            )
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS collections ("
+                " collection TEXT PRIMARY KEY, watermark REAL NOT NULL DEFAULT 0)"
+            )
+
+    @staticmethod
+    def record_modified(value):
+        try:
+            return float(value.get("last_modified", 0) or 0)
+        except (AttributeError, TypeError, ValueError):
+            return 0.0
+
+    def load(self, collection):
+        """Return the cached collection, or None if it was never synced."""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT watermark FROM collections WHERE collection = ?", (collection,)
+            ).fetchone()
+            if row is None:
+                return None
+            rows = self.conn.execute(
+                "SELECT key, value FROM records WHERE collection = ?", (collection,)
+            ).fetchall()
+        return {key: json.loads(value) for key, value in rows}
+
+    def keys(self, collection):
+        """Keys of the cached records of a collection (no values decoded)."""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT key FROM records WHERE collection = ?", (collection,)
+            ).fetchall()
+        return [key for (key,) in rows]
+
+    def watermark(self, collection):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT watermark FROM collections WHERE collection = ?", (collection,)
+            ).fetchone()
+        return row[0] if row else 0.0
+
+    def replace(self, collection, data):
+        """Store a full copy of a collection (first run / full refresh)."""
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM records WHERE collection = ?", (collection,))
+            self._write(collection, data.items())
+            self.conn.execute(
+                "INSERT OR REPLACE INTO collections (collection, watermark) VALUES (?, ?)",
+                (collection, max((self.record_modified(v) for v in data.values()), default=0.0)),
+            )
+
+    def apply(self, collection, changed, deleted=(), watermark=None):
+        """
+        Upsert changed records and drop deleted keys. 'watermark' is the
+        newest 'last_modified' of a server read; only that advances it.
+        """
+        with self.lock, self.conn:
+            self._write(collection, changed.items())
+            self.conn.executemany(
+                "DELETE FROM records WHERE collection = ? AND key = ?",
+                [(collection, str(key)) for key in deleted],
+            )
+            self.conn.execute(
+                "INSERT INTO collections (collection, watermark) VALUES (?, ?) "
+                "ON CONFLICT(collection) DO UPDATE SET watermark = MAX(watermark, excluded.watermark)",
+                (collection, watermark or 0.0),
+            )
+
+    def _write(self, collection, items):
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO records (collection, key, value, last_modified) VALUES (?, ?, ?, ?)",
+            [
+                (collection, str(key), json.dumps(value, default=str), self.record_modified(value))
+                for key, value in items
+            ],
+        )
+
+
+def remote_records(data):
+    """
+    A collection as read from Firebase ({key: record}). Arrays become
+    {index: item} without the empty slots; product rows get "product_<i>".
+    """
+    if isinstance(data, dict):
+        return data
+    if not isinstance(data, list):
+        return {}
+    records = {}
+    for i, item in enumerate(data):
+        if item is not None:  # Skip None values
+            key = str(i)
+            if isinstance(item, dict) and 'Product_Name' in item:
+                key = f"product_{i}"
+            records[key] = item
+    return records
+# ---------------------------------------------------------
+
+
+# ---- Bill line items (Firebase returns lists, JSON exports use "0".."n" dicts) ----
+def iter_bill_items(bill):
+    """Return the item rows of a bill as a list of lists of strings."""
+    items = bill.get("items") or []
+    if isinstance(items, dict):
+        items = [items[k] for k in sorted(items, key=lambda k: int(k) if str(k).isdigit() else 0)]
+    rows = []
+    for item in items:
+        if isinstance(item, dict):
+            item = [item[k] for k in sorted(item, key=lambda k: int(k) if str(k).isdigit() else 0)]
+        if item:
+            rows.append(item)
+    return rows
+
+
+class LineItem:
+    """
+    One invoice line with numeric fields, parsed once from the 10-column
+    table row: S.No, Product, No. of Case, Per Case, "1800 Box", Rate,
+    Unit, "1 Box", "2250 (25%)", Amount. Older rows may stop after Unit
+    (7 columns); the missing columns take their defaults.
+    Stored on bills as 'line_items' (list of to_dict()) next to 'items'.
+    """
+
+    __slots__ = (
+        "product_name", "no_of_case", "per_case", "quantity", "unit",
+        "rate", "per", "discount_amount", "discount_percent", "amount",
+    )
+
+    FIELDS = __slots__
+
+    def __init__(self, product_name="", no_of_case=0, per_case=0, quantity=0, unit="",
+                 rate=0.0, per=1, discount_amount=0.0, discount_percent=0.0, amount=0.0):
+        self.product_name = product_name
+        self.no_of_case = no_of_case
+        self.per_case = per_case
+        self.quantity = quantity
+        self.unit = unit
+        self.rate = rate
+        self.per = per
+        self.discount_amount = discount_amount
+        self.discount_percent = discount_percent
+        self.amount = amount
+
+    @staticmethod
+    def _number(text, cast=float, default=0):
+        try:
+            return cast(float(str(text).split()[0]))
+        except (ValueError, IndexError, TypeError):
+            return default
+
+    @classmethod
+    def from_row(cls, row):
+        """Parse a legacy string row; raises ValueError if it has fewer than 7 columns."""
+        row = list(row)
+        if len(row) < 7:
+            raise ValueError(f"line item row has {len(row)} columns, expected at least 7")
+        row += [""] * (10 - len(row))
+        discount = str(row[8])
+        percent = re.search(r"\(\s*([\d.]+)\s*%", discount)
+        return cls(
+            product_name=str(row[1]),
+            no_of_case=cls._number(row[2], int),
+            per_case=cls._number(row[3], int),
+            quantity=cls._number(row[4], int),
+            unit=str(row[6]),
+            rate=cls._number(row[5]),
+            per=cls._number(row[7], int, 1),
+            discount_amount=cls._number(discount.split("(")[0]),
+            discount_percent=float(percent.group(1)) if percent else 0.0,
+            amount=cls._number(row[9]),
+        )
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**{k: data[k] for k in cls.FIELDS if k in data})
+
+    def to_dict(self):
+        return {k: getattr(self, k) for k in self.FIELDS}
+
+    def to_row(self, sno):
+        """Rebuild the legacy 10-column row shown in the product table."""
+        return [
+            str(sno), self.product_name, str(self.no_of_case), str(self.per_case),
+            f"{self.quantity} {self.unit}", str(self.rate), self.unit,
+            f"{self.per} {self.unit}",
+            f"{int(self.discount_amount)} ({int(self.discount_percent)}%)",
+            str(self.amount),
+        ]
+
+
+def bill_line_items(bill):
+    """LineItems of a bill, from 'line_items' when present, else parsed from 'items'."""
+    stored = bill.get("line_items")
+    if stored:
+        values = stored.values() if isinstance(stored, dict) else stored
+        return [LineItem.from_dict(v) for v in values if v]
+
+    line_items = []
+    for row in iter_bill_items(bill):
+        try:
+            line_items.append(LineItem.from_row(row))
+        except ValueError:
+            continue
+    return line_items
+# ---------------------------------------------------------
+
+
+# ---- Running totals for dashboards (office / month / agent / customer / day) ----
+class BillAggregates:
+    """
+    Materialized count, net amount, sub total, commission, item count and
+    paid count per group. Each bill's contribution is remembered so edits
+    and deletes subtract it again; reading a group is a dict lookup.
+    Group keys: ("all",), ("office", prefix), ("month", "YYYY-MM"),
+    ("agent", name), ("customer", name), ("office_day", prefix, ordinal).
+    """
+
+    FIELDS = ("count", "net_amount", "sub_total", "commission", "items", "paid")
+
+    def __init__(self):
+        self.groups = {}
+        self.contributions = {}   # bill_no -> (group keys, values)
+
+    @staticmethod
+    def _number(value):
+        try:
+            return float(value or 0)
+        except (TypeError, ValueError):
+            return 0.0
+
+    def rebuild(self, bills):
+        self.__init__()
+        for bill_no, bill in bills.items():
+            self.add(bill_no, bill)
+
+    def add(self, bill_no, bill):
+        """Count a new bill or replace the contribution of an edited one."""
+        self.remove(bill_no)
+
+        office = BillIndex.office_of(bill_no)
+        ordinal = bill_date_ordinal(bill)
+        keys = [
+            ("all",),
+            ("office", office),
+            ("agent", BillIndex.name_key(bill.get("agent_name"))),
+            ("customer", BillIndex.name_key(bill.get("customer_name"))),
+        ]
+        if ordinal is not None:
+            keys.append(("month", datetime.fromordinal(ordinal).strftime("%Y-%m")))
+            keys.append(("office_day", office, ordinal))
+
+        values = (
+            1,
+            self._number(bill.get("net_amount")),
+            self._number(bill.get("sub_total")),
+            self._number(bill.get("commission_amount")),
+            len(bill.get("items") or []),
+            1 if bill.get("payment_status") == "Paid" else 0,
+        )
+        for key in keys:
+            group = self.groups.setdefault(key, [0] * len(self.FIELDS))
+            for i, value in enumerate(values):
+                group[i] += value
+        self.contributions[bill_no] = (keys, values)
+
+    def remove(self, bill_no):
+        contribution = self.contributions.pop(bill_no, None)
+        if contribution is None:
+            return
+        keys, values = contribution
+        for key in keys:
+            group = self.groups[key]
+            for i, value in enumerate(values):
+                group[i] -= value
+            if group[0] <= 0:
+                del self.groups[key]
+
+    def get(self, *key):
+        """Totals of one group as a dict (zeros if the group is empty)."""
+        return dict(zip(self.FIELDS, self.groups.get(key, [0] * len(self.FIELDS))))
+# ---------------------------------------------------------
+
+
+# ---- Stock report aggregation over all line items ----
+class StockAggregator:
+    """
+    Flattened (product id, cases, quantity) columns per bill, grouped by
+    product in one np.bincount pass. Bills are added / replaced / removed
+    individually; the grouped result is cached until a bill changes.
+    Without NumPy the same columns are summed in a plain loop.
+    """
+
+    def __init__(self):
+        self.product_ids = {}     # product name -> column id
+        self.product_names = []   # column id -> product name
+        self.product_info = []    # column id -> (per_case, unit_type) of first delivery
+        self.bill_rows = {}       # bill_no -> (ids, cases, quantities)
+        self.result = None
+
+    def _product_id(self, line):
+        pid = self.product_ids.get(line.product_name)
+        if pid is None:
+            pid = self.product_ids[line.product_name] = len(self.product_names)
+            self.product_names.append(line.product_name)
+            self.product_info.append((str(line.per_case), line.unit))
+        return pid
+
+    def set_bill(self, bill_no, line_items):
+        ids = [self._product_id(line) for line in line_items]
+        cases = [line.no_of_case for line in line_items]
+        quantities = [line.quantity for line in line_items]
+        if np is not None:
+            ids = np.array(ids, dtype=np.int64)
+            cases = np.array(cases, dtype=np.int64)
+            quantities = np.array(quantities, dtype=np.int64)
+        self.bill_rows[bill_no] = (ids, cases, quantities)
+        self.result = None
+
+    def remove_bill(self, bill_no):
+        if self.bill_rows.pop(bill_no, None) is not None:
+            self.result = None
+
+    def totals(self):
+        """{product name: stats} in the shape the Stock Report expects."""
+        if self.result is None:
+            self.result = self._aggregate()
+        return self.result
+
+    def _aggregate(self):
+        size = len(self.product_names)
+        if np is not None and self.bill_rows:
+            columns = list(zip(*self.bill_rows.values()))
+            ids = np.concatenate(columns[0])
+            cases = np.bincount(ids, weights=np.concatenate(columns[1]), minlength=size)
+            quantities = np.bincount(ids, weights=np.concatenate(columns[2]), minlength=size)
+            deliveries = np.bincount(ids, minlength=size)
+            cases, quantities, deliveries = cases.tolist(), quantities.tolist(), deliveries.tolist()
+        else:
+            cases, quantities, deliveries = [0] * size, [0] * size, [0] * size
+            for ids, bill_cases, bill_quantities in self.bill_rows.values():
+                for pid, c, q in zip(ids, bill_cases, bill_quantities):
+                    cases[pid] += c
+                    quantities[pid] += q
+                    deliveries[pid] += 1
+
+        stats = {}
+        for pid, name in enumerate(self.product_names):
+            if deliveries[pid]:
+                per_case, unit_type = self.product_info[pid]
+                stats[name] = {
+                    'total_cases': int(cases[pid]),
+                    'per_case': per_case,
+                    'total_quantity': int(quantities[pid]),
+                    'unit_type': unit_type,
+                    'delivery_count': int(deliveries[pid])
+                }
+        return stats
+# ---------------------------------------------------------
+
+
+# ---- Secondary indexes over bills (customer / agent / office / product / date) ----
+class BillIndex:
+    """
+    In-memory indexes over bills_data, kept up to date with add() / remove()
+    whenever a bill is saved, deleted or merged from Firebase.
+    Name keys are case-folded and stripped. Dates are kept as a sorted list
+    of (date ordinal, bill_no) so range queries are a bisect plus a slice.
+    Every suffix of every lower-cased bill number is kept sorted too, so a
+    bill number substring search is a bisect plus the matches.
+    """
+
+    OFFICE_PREFIXES = ("AFI", "AFF", "AP")   # longest first, "AP" is the default
+
+    def __init__(self):
+        self.by_customer = {}
+        self.by_agent = {}
+        self.by_office = {}
+        self.by_product = {}
+        self.dates = []
+        self.undated = set()   # bills with no bill_date at all
+        self.suffixes = []     # sorted (suffix of bill_no.lower(), bill_no)
+        self.order = {}        # bill_no -> position, same order as bills_data
+        self.next_position = 0
+        self.entries = {}   # bill_no -> (customer, agent, office, products, ordinal)
+
+    @staticmethod
+    def name_key(name):
+        return str(name or "").strip().casefold()
+
+    @classmethod
+    def office_of(cls, bill_no):
+        for prefix in cls.OFFICE_PREFIXES:
+            if bill_no.startswith(prefix):
+                return prefix
+        return "AP"
+
+    def rebuild(self, bills):
+        self.__init__()
+        for bill_no, bill in bills.items():
+            self._add(bill_no, bill, list.append)
+        self.dates.sort()
+        self.suffixes.sort()
+
+    def add(self, bill_no, bill):
+        """Index a new bill or re-index an edited one."""
+        position = self.order.get(bill_no)
+        if bill_no in self.entries:
+            self.remove(bill_no)
+        self._add(bill_no, bill, bisect.insort)
+        if position is not None:
+            self.order[bill_no] = position   # an edit keeps its place, like a dict
+
+    def _add(self, bill_no, bill, place):
+
+        customer = self.name_key(bill.get("customer_name"))
+        agent = self.name_key(bill.get("agent_name"))
+        office = self.office_of(bill_no)
+        products = frozenset(
+            self.name_key(item[1]) for item in iter_bill_items(bill) if len(item) > 1
+        )
+        ordinal = bill_date_ordinal(bill)
+
+        self.by_customer.setdefault(customer, set()).add(bill_no)
+        self.by_agent.setdefault(agent, set()).add(bill_no)
+        self.by_office.setdefault(office, set()).add(bill_no)
+        for product in products:
+            self.by_product.setdefault(product, set()).add(bill_no)
+        if ordinal is not None:
+            place(self.dates, (ordinal, bill_no))
+        elif not bill.get("bill_date"):
+            self.undated.add(bill_no)
+        number = bill_no.lower()
+        for i in range(len(number)):
+            place(self.suffixes, (number[i:], bill_no))
+
+        self.order[bill_no] = self.next_position
+        self.next_position += 1
+        self.entries[bill_no] = (customer, agent, office, products, ordinal)
+
+    def remove(self, bill_no):
+        entry = self.entries.pop(bill_no, None)
+        if entry is None:
+            return
+        customer, agent, office, products, ordinal = entry
+
+        self._discard(self.by_customer, customer, bill_no)
+        self._discard(self.by_agent, agent, bill_no)
+        self._discard(self.by_office, office, bill_no)
+        for product in products:
+            self._discard(self.by_product, product, bill_no)
+        if ordinal is not None:
+            self._discard_sorted(self.dates, (ordinal, bill_no))
+        self.undated.discard(bill_no)
+        number = bill_no.lower()
+        for i in range(len(number)):
+            self._discard_sorted(self.suffixes, (number[i:], bill_no))
+        self.order.pop(bill_no, None)
+
+    @staticmethod
+    def _discard(index, key, bill_no):
+        bucket = index.get(key)
+        if bucket is not None:
+            bucket.discard(bill_no)
+            if not bucket:
+                del index[key]
+
+    @staticmethod
+    def _discard_sorted(entries, entry):
+        pos = bisect.bisect_left(entries, entry)
+        if pos < len(entries) and entries[pos] == entry:
+            del entries[pos]
+
+    # ----- queries -----
+    def numbers_containing(self, text):
+        """Bills whose number contains 'text' (case-insensitive)."""
+        text = str(text).lower()
+        result = set()
+        pos = bisect.bisect_left(self.suffixes, (text, ""))
+        while pos < len(self.suffixes) and self.suffixes[pos][0].startswith(text):
+            result.add(self.suffixes[pos][1])
+            pos += 1
+        return result
+
+    def in_order(self, bill_nos):
+        """'bill_nos' in bills_data order."""
+        return sorted(bill_nos, key=lambda b: self.order.get(b, self.next_position))
+
+    def customer(self, name):
+        return self.by_customer.get(self.name_key(name), set())
+
+    def customers_containing(self, text):
+        """Bills whose customer name contains 'text' (scans distinct names only)."""
+        text = self.name_key(text)
+        result = set()
+        for customer, bills in self.by_customer.items():
+            if text in customer:
+                result |= bills
+        return result
+
+    def agent(self, name):
+        return self.by_agent.get(self.name_key(name), set())
+
+    def agents_containing(self, text):
+        text = self.name_key(text)
+        result = set()
+        for agent, bills in self.by_agent.items():
+            if text in agent:
+                result |= bills
+        return result
+
+    def office(self, prefix):
+        return self.by_office.get(prefix, set())
+
+    def product(self, name):
+        return self.by_product.get(self.name_key(name), set())
+
+    def ordinal(self, bill_no):
+        entry = self.entries.get(bill_no)
+        return entry[4] if entry else None
+
+    def date_range(self, start=None, end=None, within=None, newest_first=False):
+        """
+        Bill numbers dated between 'start' and 'end' (dates / datetimes or
+        ordinals, both inclusive, None = open), in date order. 'within'
+        restricts the result to a candidate set.
+        """
+        first = float("-inf") if start is None else self._ordinal(start)
+        last = float("inf") if end is None else self._ordinal(end)
+        lo = 0 if start is None else bisect.bisect_left(self.dates, (first, ""))
+        hi = len(self.dates) if end is None else bisect.bisect_left(self.dates, (last + 1, ""))
+
+        if within is not None and len(within) < hi - lo:
+            # Fewer candidates than bills in range: check the candidates directly
+            picked = []
+            for bill_no in within:
+                ordinal = self.ordinal(bill_no)
+                if ordinal is not None and first <= ordinal <= last:
+                    picked.append((ordinal, bill_no))
+            picked.sort(reverse=newest_first)
+            return [b for _, b in picked]
+
+        rows = self.dates[lo:hi]
+        if newest_first:
+            rows = rows[::-1]
+        if within is None:
+            return [b for _, b in rows]
+        return [b for _, b in rows if b in within]
+
+    @staticmethod
+    def _ordinal(value):
+        return value if isinstance(value, int) else value.toordinal()
+# ---------------------------------------------------------
+
+
+# ---- Substring index for customer / product autocomplete ----
+class SubstringIndex:
+    """
+    Substring index over a list of names for the autocomplete comboboxes.
+    Keys are case-folded. Two sorted lists answer prefix queries with
+    bisect: whole keys (name starts with the text) and the tail of every
+    later word (a word in the name starts with the text). Matches inside
+    a word come from intersecting trigram buckets. Results are ranked in
+    that order, sorted by name within each rank, and capped at 'limit';
+    an empty text lists every name, like the plain dropdown did.
+    """
+
+    GRAM = 3
+
+    def __init__(self, names=()):
+        self.names = {}      # name -> case-folded key, in insertion order
+        self.grams = {}      # trigram -> set of names
+        self.prefixes = []   # sorted (key, name)
+        self.words = []      # sorted (key from a later word start, name)
+        for name in names:
+            self._index(name)
+        self.prefixes.sort()
+        self.words.sort()
+
+    @staticmethod
+    def _word_starts(key):
+        return [i for i in range(1, len(key)) if key[i].isalnum() and not key[i - 1].isalnum()]
+
+    def _index(self, name):
+        key = BillIndex.name_key(name)
+        self.names[name] = key
+        for i in range(len(key) - self.GRAM + 1):
+            self.grams.setdefault(key[i:i + self.GRAM], set()).add(name)
+        self.prefixes.append((key, name))
+        self.words.extend((key[i:], name) for i in self._word_starts(key))
+
+    def add(self, name):
+        if not name or name in self.names:
+            return
+        key = BillIndex.name_key(name)
+        self.names[name] = key
+        for i in range(len(key) - self.GRAM + 1):
+            self.grams.setdefault(key[i:i + self.GRAM], set()).add(name)
+        bisect.insort(self.prefixes, (key, name))
+        for i in self._word_starts(key):
+            bisect.insort(self.words, (key[i:], name))
+
+    def remove(self, name):
+        key = self.names.pop(name, None)
+        if key is None:
+            return
+        for i in range(len(key) - self.GRAM + 1):
+            bucket = self.grams.get(key[i:i + self.GRAM])
+            if bucket is not None:
+                bucket.discard(name)
+                if not bucket:
+                    del self.grams[key[i:i + self.GRAM]]
+        self._discard(self.prefixes, (key, name))
+        for i in self._word_starts(key):
+            self._discard(self.words, (key[i:], name))
+
+    @staticmethod
+    def _discard(entries, entry):
+        pos = bisect.bisect_left(entries, entry)
+        if pos < len(entries) and entries[pos] == entry:
+            del entries[pos]
+
+    def sync(self, names):
+        """Bring the index in line with 'names', touching only what changed."""
+        wanted = dict.fromkeys(name for name in names if name)
+        if not self.names:
+            self.__init__(wanted)
+            return
+        for name in [n for n in self.names if n not in wanted]:
+            self.remove(name)
+        for name in wanted:
+            self.add(name)
+
+    def search(self, text, limit=50):
+        text = BillIndex.name_key(text)
+        if not text:
+            return list(self.names)
+
+        results = {}
+        for entries in (self.prefixes, self.words):
+            pos = bisect.bisect_left(entries, (text, ""))
+            while pos < len(entries) and len(results) < limit:
+                key, name = entries[pos]
+                if not key.startswith(text):
+                    break
+                results.setdefault(name)
+                pos += 1
+            if len(results) >= limit:
+                return list(results)
+
+        # Matches inside a word: all of them, sorted, then cut to what is left
+        if len(text) < self.GRAM:
+            candidates = self.names
+        else:
+            buckets = sorted(
+                (self.grams.get(text[i:i + self.GRAM], set())
+                 for i in range(len(text) - self.GRAM + 1)),
+                key=len,
+            )
+            candidates = buckets[0].intersection(*buckets[1:])
+
+        inside = sorted(
+            (self.names[name], name) for name in candidates
+            if name not in results and text in self.names[name]
+        )
+        return list(results) + [name for _, name in inside[:limit - len(results)]]
+# ---------------------------------------------------------
+
+
+# ---- Canonical party / product record schema ----
+SCHEMA_VERSION = 1
+
+# canonical field -> spellings found in older records (canonical first)
+PARTY_FIELDS = {
+    "Customer_Name": ("Customer_Name", "Customer Name", "customer_name", "Customer  Name",
+                      "Customer name", " Customer Name", "Customer Name ", "Customer_Name ",
+                      "customer name"),
+    "Address": ("Address", "address"),
+    "GST_Number": ("GST_Number", "GST Number", "GSTNumber", "gst_number", "gst"),
+    "Phone_Number": ("Phone_Number", "Phone Number", "Phone", "phone", "phone_number"),
+    "Agent_Name": ("Agent_Name", "Agent Name", "agent_name", "Agent", "agent"),
+}
+
+PRODUCT_FIELDS = {
+    "Product_Name": ("Product_Name", "Product Name"),
+    "No_of_Case": ("No_of_Case", "No. of Case"),
+    "Per_Case": ("Per_Case", "Per Case"),
+    "Unit_Type": ("Unit_Type", "Unit Type"),
+    "Selling_Price": ("Selling_Price", "Selling Price"),
+    "Per": ("Per",),
+    "Quantity": ("Quantity",),
+    "Discount": ("Discount",),
+}
+
+
+def canonical_record(record, fields):
+    """
+    Rewrite a record onto the canonical field names in 'fields' and stamp
+    'schema_version'. Records already on the current version are returned
+    as they are. Keys outside the schema (e.g. last_modified) are kept.
+    """
+    if record.get("schema_version") == SCHEMA_VERSION:
+        return record
+
+    canonical = {}
+    for field, spellings in fields.items():
+        value = ""
+        for spelling in spellings:
+            if record.get(spelling) not in (None, ""):
+                value = record[spelling]
+                break
+        canonical[field] = value.strip() if isinstance(value, str) else value
+
+    aliases = {spelling for spellings in fields.values() for spelling in spellings}
+    for key, value in record.items():
+        if key not in aliases:
+            canonical[key] = value
+    canonical["schema_version"] = SCHEMA_VERSION
+    return canonical
+
+
+def canonical_party(record):
+    return canonical_record(record, PARTY_FIELDS)
+
+
+def canonical_product(record):
+    return canonical_record(record, PRODUCT_FIELDS)
+# ---------------------------------------------------------
+
+
+# ---- Normalized party records with a name lookup ----
+class PartyDirectory:
+    """
+    Canonical party records keyed by party code, plus a case-folded
+    customer name -> party codes map for auto-fill.
+    Update with add() / remove() as parties change.
+    """
+
+    def __init__(self):
+        self.parties = {}   # party code -> canonical record
+        self.by_name = {}   # name key -> [party codes], first saved first
+
+    def rebuild(self, party_data):
+        self.__init__()
+        for code, record in party_data.items():
+            self.add(code, record)
+
+    def add(self, code, record):
+        """Index a new party or re-index a modified one."""
+        if code in self.parties:
+            self.remove(code)
+        if not isinstance(record, dict):
+            return
+        party = canonical_party(record)
+        self.parties[code] = party
+        if party["Customer_Name"]:
+            self.by_name.setdefault(BillIndex.name_key(party["Customer_Name"]), []).append(code)
+
+    def remove(self, code):
+        party = self.parties.pop(code, None)
+        if party is None:
+            return
+        key = BillIndex.name_key(party["Customer_Name"])
+        codes = self.by_name.get(key)
+        if codes and code in codes:
+            codes.remove(code)
+            if not codes:
+                del self.by_name[key]
+
+    def lookup(self, name):
+        """Canonical record of the first party with this customer name, or None."""
+        codes = self.by_name.get(BillIndex.name_key(name))
+        return self.parties[codes[0]] if codes else None
+# ---------------------------------------------------------
+
+
+# ---- Filename -> path index over the generated invoice PDFs ----
+class PdfLocationIndex:
+    """
+    Index of every PDF under the Invoice_Bill* folders of 'root_dir'
+    (Documents/InvoiceApp), saved to 'cache_path' between runs.
+    Each directory is stored with its mtime; refresh() stats the known
+    directories and re-lists only the ones whose mtime changed (a file was
+    added, removed or renamed in them), so keeping the index fresh costs
+    one stat per folder instead of a walk of the tree.
+    """
+
+    def __init__(self, root_dir, cache_path, folder_prefix="Invoice_Bill", max_age=2.0):
+        self.root_dir = root_dir
+        self.cache_path = cache_path
+        self.folder_prefix = folder_prefix
+        self.max_age = max_age        # seconds between automatic refreshes
+        self.dirs = {}                # dir path -> [mtime_ns, [pdf names], [sub dirs]]
+        self.by_name = {}             # pdf name -> [dir paths]
+        self.last_refresh = 0.0
+        self.lock = threading.Lock()
+        self._load()
+
+    # ----- persistence -----
+    def _load(self):
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("root_dir") == self.root_dir:
+                self.dirs = data.get("dirs", {})
+        except (OSError, ValueError):
+            self.dirs = {}
+        for path, (_, names, _) in self.dirs.items():
+            self._link(path, names)
+
+    def _save(self):
+        try:
+            with open(self.cache_path, "w", encoding="utf-8") as f:
+                json.dump({"root_dir": self.root_dir, "dirs": self.dirs}, f)
+        except OSError as e:
+            print(f"⚠️ Could not save PDF index: {e}")
+
+    # ----- maintenance -----
+    def _link(self, path, names):
+        for name in names:
+            self.by_name.setdefault(name, []).append(path)
+
+    def _unlink(self, path, names):
+        for name in names:
+            paths = self.by_name.get(name)
+            if paths and path in paths:
+                paths.remove(path)
+                if not paths:
+                    del self.by_name[name]
+
+    def _scan(self, path, mtime):
+        names, subdirs = [], []
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if path != self.root_dir or entry.name.startswith(self.folder_prefix):
+                        subdirs.append(entry.path)
+                elif entry.name.lower().endswith(".pdf"):
+                    names.append(entry.name)
+        old = self.dirs.get(path)
+        if old is not None:
+            self._unlink(path, old[1])
+        self.dirs[path] = [mtime, names, subdirs]
+        self._link(path, names)
+        return subdirs
+
+    def refresh(self, force=False):
+        """Re-list directories whose mtime changed. Returns True if anything did."""
+        with self.lock:
+            if not force and time.time() - self.last_refresh < self.max_age:
+                return False
+            changed = False
+            seen = set()
+            stack = [self.root_dir]
+            while stack:
+                path = stack.pop()
+                try:
+                    mtime = os.stat(path).st_mtime_ns
+                except OSError:
+                    continue
+                seen.add(path)
+                entry = self.dirs.get(path)
+                if entry is None or entry[0] != mtime:
+                    try:
+                        stack.extend(self._scan(path, mtime))
+                    except OSError:
+                        continue
+                    changed = True
+                else:
+                    stack.extend(entry[2])
+
+            for path in [p for p in self.dirs if p not in seen]:
+                self._unlink(path, self.dirs.pop(path)[1])
+                changed = True
+
+            self.last_refresh = time.time()
+            if changed:
+                self._save()
+            return changed
+
+    def add_file(self, file_path):
+        """Register a PDF the app has just written without waiting for a refresh."""
+        path, name = os.path.split(os.path.abspath(file_path))
+        with self.lock:
+            entry = self.dirs.get(path)
+            if entry is not None and name not in entry[1]:
+                entry[1].append(name)
+                self._link(path, [name])
+
+    # ----- queries -----
+    def resolve(self, file_path, year=None):
+        """
+        Full path of an indexed PDF named like 'file_path', or None.
+        With several copies, one inside Invoice_Bill_<year> wins, then the
+        shallowest one.
+        """
+        path, name = os.path.split(file_path)
+        with self.lock:
+            entry = self.dirs.get(path)
+            if entry is not None and name in entry[1]:
+                return file_path
+            paths = list(self.by_name.get(name, ()))
+        if not paths:
+            return None
+        year_folder = f"{self.folder_prefix}_{year}" if year else None
+
+        def rank(path):
+            parts = os.path.relpath(path, self.root_dir).split(os.sep)
+            return (parts[0] != year_folder, len(parts), path)
+
+        return os.path.join(min(paths, key=rank), name)
+# ---------------------------------------------------------
+
+
+# ---- Invoice image assets (prepared once, reused by every PDF) ----
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+ASSET_CACHE_DIR = os.path.join(os.path.expanduser("~"), "invoice_assets")
+ASSET_DPI = 300
+ASSET_JPEG_QUALITY = 90
+
+
+def find_asset(name):
+    """Path of an image shipped with the app, matched case-insensitively (logo.png / Logo.png)."""
+    for folder in (os.getcwd(), APP_DIR):
+        path = os.path.join(folder, name)
+        if os.path.exists(path):
+            return path
+        try:
+            for entry in os.listdir(folder):
+                if entry.lower() == name.lower():
+                    return os.path.join(folder, entry)
+        except OSError:
+            continue
+    return None
+
+
+@functools.lru_cache(maxsize=32)
+def image_asset(name, width_mm=None, size_px=None):
+    """
+    Prepared copy of the image 'name' under ASSET_CACHE_DIR:
+    - width_mm: flattened onto white (no alpha mask for FPDF to decode pixel
+      by pixel), scaled down to that printed width at ASSET_DPI and saved as
+      a baseline JPEG, for embedding in PDFs;
+    - size_px: resized to exactly (w, h) keeping transparency, as PNG, for Tk.
+    The cached file is named after the source's mtime and size, so it is
+    rebuilt only when the source changes, and the path is remembered for the
+    life of the process. Returns the source path if it cannot be prepared.
+    """
+    source = find_asset(name)
+    if source is None:
+        return name
+    try:
+        stat = os.stat(source)
+        stem = os.path.splitext(os.path.basename(source))[0].lower()
+        if size_px:
+            variant, ext = f"{size_px[0]}x{size_px[1]}px", ".png"
+        else:
+            variant, ext = f"{width_mm}mm_{ASSET_DPI}dpi", ".jpg"
+        path = os.path.join(ASSET_CACHE_DIR, f"{stem}_{variant}_{stat.st_mtime_ns}_{stat.st_size}{ext}")
+        if os.path.exists(path):
+            return path
+
+        image = Image.open(source)
+        image.load()
+        if size_px:
+            image = image.convert("RGBA").resize(tuple(size_px), Image.LANCZOS)
+            options = {"optimize": True}
+        else:
+            if image.mode in ("RGBA", "LA", "P"):
+                image = image.convert("RGBA")
+                flat = Image.new("RGB", image.size, (255, 255, 255))
+                flat.paste(image, mask=image.getchannel("A"))
+                image = flat
+            else:
+                image = image.convert("RGB")
+            width_px = round(width_mm / 25.4 * ASSET_DPI)
+            if image.width > width_px:
+                image = image.resize((width_px, max(1, round(image.height * width_px / image.width))), Image.LANCZOS)
+            options = {"quality": ASSET_JPEG_QUALITY, "optimize": True, "dpi": (ASSET_DPI, ASSET_DPI)}
+
+        # Worker processes may prepare the same asset at once; publish it atomically
+        os.makedirs(ASSET_CACHE_DIR, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        image.save(tmp_path, "PNG" if size_px else "JPEG", **options)
+        os.replace(tmp_path, path)
+        return path
+    except Exception as e:
+        print(f"⚠ Could not prepare image {name}: {e}")
+        return source
+# ---------------------------------------------------------
+
+
+# ---- Invoice PDF rendering (GUI and batch worker processes) ----
+INVOICE_OFFICES = {
+    "A1": {
+        "folder": "AP",
+        "company": "ANGEL PYROTECH",
+        "title": "ANGEL PYROTECH                             ",
+        "address": (
+            "D NO 3/89 3/89/1 TO 3/89/11 ONDIPULINAIKANOOR                         ",
+            "ONDIPULINAIKANOOR VILLAGE TAMILNADU 626119                                ",
+        ),
+        "gstin": "33ABRFA4846J1Z3",
+    },
+    "A2": {
+        "folder": "AFI",
+        "company": "Angel Fireworks Industries",
+        "title": "ANGEL FIREWORKS INDUSTRIES                             ",
+        "address": (
+            "FACTORY AT:O.KOVILPATTI,2/2204/W,DEVINAGAR                         ",
+            "SIVAKASI-626123                                ",
+        ),
+        "gstin": "33AARFA9673N2ZL",
+    },
+    "A3": {
+        "folder": "AFF",
+        "company": "Angel Fireworks Factory",
+        "title": "ANGEL FIREWORKS FACTORY                             ",
+        "address": (
+            "FACTORY AT:O.KOVILPATTI,2/2204/X,DEVINAGAR                         ",
+            "VIRUTHUNAGAR-626123                                ",
+        ),
+        "gstin": "33ABKFA4066F1ZN",
+    },
+}
+
+MAHAMAI_PERCENTAGE = 0.3  # Fixed 0.3%
+
+
+def invoice_office(bill_no, office_type=None):
+    """Office code (A1/A2/A3) of a bill: from its prefix, else the office it was created in."""
+    bill_no = str(bill_no)
+    if bill_no.startswith("AP"):
+        return "A1"
+    if bill_no.startswith("AFI"):
+        return "A2"
+    if bill_no.startswith("AFF"):
+        return "A3"
+    return office_type if office_type in INVOICE_OFFICES else "A1"
+
+
+def safe_file_part(text):
+    return re.sub(r'[^\w\-_]', '', str(text).replace(" ", "_"))
+
+
+def invoice_pdf_path(bill, timestamp=None):
+    """
+    Relative path (from Documents) of a bill's invoice:
+    InvoiceApp/Invoice_Bill_<year>/<office>/<agent>/<customer>_<bill no>_<timestamp>.pdf
+    """
+    bill_date_obj = parse_date_flexible(str(bill.get("bill_date", "")))
+    year = str(bill_date_obj.year if bill_date_obj else datetime.now().year)
+    office = INVOICE_OFFICES[invoice_office(bill.get("bill_no", ""), bill.get("office_type"))]
+    agent_name = str(bill.get("agent_name") or "").strip() or "Unknown_Agent"
+    timestamp = timestamp or datetime.now().strftime("%Y-%m-%d_%H%M%S")
+    file_name = f"{safe_file_part(bill.get('customer_name', ''))}_{str(bill.get('bill_no', '')).zfill(3)}_{timestamp}.pdf"
+    return os.path.join("InvoiceApp", f"Invoice_Bill_{year}", office["folder"], safe_file_part(agent_name), file_name)
+
+
+def custom_round(value):
+    if value % 1 >= 0.5:
+        return int(value) + 1
+    else:
+        return int(value)
+
+
+def invoice_totals(line_items, packing_charge, gst_percentage, region):
+    """Goods value through net amount for a list of LineItems."""
+    goods_value = sum(line.amount for line in line_items)
+    special_discount = sum(line.discount_amount for line in line_items)
+    sub_total = goods_value - special_discount
+    packing_charges = (sub_total * packing_charge) / 100
+    sub_total_with_packing = sub_total + packing_charges
+    mahamai_charges = (sub_total_with_packing * MAHAMAI_PERCENTAGE) / 100
+    taxable_value = sub_total_with_packing + mahamai_charges
+    if region == "South":
+        cgst_amount = (taxable_value * (gst_percentage / 2)) / 100
+        sgst_amount = (taxable_value * (gst_percentage / 2)) / 100
+        igst_amount = 0
+    else:
+        cgst_amount = 0
+        sgst_amount = 0
+        igst_amount = (taxable_value * gst_percentage) / 100
+
+    unrounded_net_amount = taxable_value + cgst_amount + sgst_amount + igst_amount
+    net_amount = custom_round(unrounded_net_amount)
+    return {
+        "no_of_cases": sum(line.no_of_case for line in line_items),
+        "goods_value": goods_value,
+        "special_discount": special_discount,
+        "sub_total": sub_total,
+        "packing_charges": packing_charges,
+        "sub_total_with_packing": sub_total_with_packing,
+        "mahamai_charges": mahamai_charges,
+        "taxable_value": taxable_value,
+        "cgst_amount": cgst_amount,
+        "sgst_amount": sgst_amount,
+        "igst_amount": igst_amount,
+        "round_off_amount": net_amount - unrounded_net_amount,
+        "net_amount": net_amount,
+    }
+
+
+def amount_in_words(num):
+    try:
+        return num2words(num, lang='en_IN').title() + " Rupees Only"
+    except Exception:
+        return f"Amount: ₹{num:.2f}"
+
+
+def draw_invoice_header(pdf, office_code):
+    office = INVOICE_OFFICES.get(office_code, INVOICE_OFFICES["A1"])
+    row_height = 5
+    try:
+        # Add logo on the left
+        pdf.image(image_asset("logo.png", width_mm=27), x=6, y=1, w=27)
+    except:
+        # If logo not found, continue without it
+        pass
+
+    # Move to the right for the title
+    pdf.set_xy(35, 10)
+    pdf.cell(0, row_height, office["title"], ln=True, align="C")
+    # Address details
+    pdf.set_x(35)
+    pdf.cell(0, row_height, office["address"][0], ln=True, align="C")
+    pdf.set_x(40)
+    pdf.cell(0, row_height, office["address"][1], ln=True, align="C")
+
+    # Add Title.png to the top-right corner
+    page_width = pdf.w
+    try:
+        title_img_width = 50
+        title_img_height = 20
+        image_x = page_width - title_img_width - 6
+        pdf.image(image_asset("Title.png", width_mm=title_img_width), x=image_x, y=1, w=title_img_width, h=title_img_height)
+    except:
+        pass
+
+    # Add the "Glory To God" slogan at the top-center
+    pdf.set_font("Arial", "I", 8)
+    slogan_text = "Glory To God                                                                           "
+    text_width = pdf.get_string_width(slogan_text)
+    center_x = (page_width - text_width) / 2
+    pdf.set_xy(center_x, 0)
+    pdf.cell(0, 10, slogan_text, ln=True, align='C')
+
+    # Move down and add "TAX INVOICE" centered
+    pdf.set_font("Arial", "B", 9)
+    pdf.set_xy(15, 30)
+    pdf.cell(0, row_height, "TAX INVOICE", ln=True, align="C")
+
+    # GSTIN and HSN Code in the same row
+    pdf.set_xy(10, 26)
+    pdf.cell(90, 4, f"GSTIN: {office['gstin']}", align="L")
+    pdf.set_xy(110, 26)
+    pdf.cell(90, 4, "HSN CODE: 36041000", align="R")
+
+    # Draw a line below GSTIN and HSN Code
+    pdf.ln()
+    pdf.line(10, 35, 200, 35)
+
+
+class InvoiceTemplate:
+    """
+    One office's static invoice header (logo, Title.png, company name,
+    address, slogan, GSTIN / HSN line), drawn once per process on a scratch
+    FPDF page and kept as the page content it produced together with the
+    fonts and decoded images it refers to. stamp() appends that content to
+    a new invoice page instead of repeating every cell, string measurement
+    and PNG decode. The footer lines follow the totals box, so they are
+    still drawn as cells.
+    """
+
+    _templates = {}
+    _lock = threading.Lock()
+
+    def __init__(self, office_code):
+        pdf = FPDF()
+        pdf.add_page()
+        pdf.set_left_margin(15)
+        pdf.set_right_margin(15)
+        pdf.set_font("Arial", "B", 9)
+        self.page_size = (pdf.k, pdf.w, pdf.h)
+
+        start = len(pdf.pages[pdf.page])
+        draw_invoice_header(pdf, office_code)
+        self.content = pdf.pages[pdf.page][start:]
+        self.fonts = dict(pdf.fonts)
+        self.images = dict(pdf.images)
+        self.position = (pdf.x, pdf.y, pdf.lasth)
+        self.font = (pdf.font_family, pdf.font_style, pdf.font_size_pt)
+
+    @classmethod
+    def for_office(cls, office_code):
+        with cls._lock:
+            template = cls._templates.get(office_code)
+            if template is None:
+                template = cls._templates[office_code] = cls(office_code)
+            return template
+
+    @staticmethod
+    def _same_numbers(own, template):
+        """True if every font / image of the template has, or can take, the same number in 'own'."""
+        used = {entry["i"]: key for key, entry in own.items()}
+        for key, entry in template.items():
+            if key in own and own[key]["i"] != entry["i"]:
+                return False
+            if used.get(entry["i"], key) != key:
+                return False
+        return True
+
+    def _fits(self, pdf):
+        """
+        True if 'pdf' is on a new page in the state the template was drawn from,
+        and the template's /F and /I numbers mean the same fonts and images in it
+        (always for a single invoice, and for every invoice of a statement).
+        """
+        if not isinstance(getattr(pdf, "pages", None), dict) or pdf.page not in pdf.pages:
+            return False
+        if (pdf.k, pdf.w, pdf.h) != self.page_size:
+            return False
+        if not (self._same_numbers(pdf.fonts, self.fonts) and self._same_numbers(pdf.images, self.images)):
+            return False
+        return (pdf.font_family, pdf.font_style, pdf.font_size_pt) == ("helvetica", "B", 9)
+
+    def stamp(self, pdf):
+        """Append the header to the current page of 'pdf'; False if it has to be drawn instead."""
+        if not self._fits(pdf):
+            return False
+        pdf.pages[pdf.page] += self.content
+        # Output writes object numbers into the font / image entries, so every PDF gets its own copy
+        pdf.fonts.update({key: dict(font) for key, font in self.fonts.items() if key not in pdf.fonts})
+        pdf.images.update({name: dict(info) for name, info in self.images.items() if name not in pdf.images})
+        pdf.x, pdf.y, pdf.lasth = self.position
+        family, style, size = self.font
+        pdf.font_family = ""
+        pdf.set_font(family, style, size)
+        return True
+
+
+def stamp_invoice_header(pdf, office_code):
+    try:
+        stamped = InvoiceTemplate.for_office(office_code).stamp(pdf)
+    except Exception:
+        stamped = False
+    if not stamped:
+        draw_invoice_header(pdf, office_code)
+
+
+def new_invoice_pdf():
+    pdf = FPDF()
+    pdf.set_left_margin(15)
+    pdf.set_right_margin(15)
+    return pdf
+
+
+def draw_invoice(pdf, bill):
+    """
+    Lay out one invoice from a bill record (the dict saved under bills/<bill no>)
+    on a new page of 'pdf'. Uses no Tk state, so it runs the same in the GUI,
+    in batch worker processes and for statements. Returns invoice_totals().
+    """
+    office_code = invoice_office(bill.get("bill_no", ""), bill.get("office_type"))
+    line_items = bill_line_items(bill)
+    rows = iter_bill_items(bill) or [line.to_row(i) for i, line in enumerate(line_items, 1)]
+    region = bill.get("region", "South")
+    packing_charge_percentage = float(bill.get("packing_charge") or 0)
+    totals = invoice_totals(line_items, packing_charge_percentage, float(bill.get("gst_percentage") or 0), region)
+
+    pdf.add_page()
+    # Each invoice starts at FPDF's default line width, as in a document of its own
+    pdf.set_line_width(0.567 / pdf.k)
+
+    # Set font for the entire document
+    pdf.set_font("Arial", "B", 9)
+    row_height = 5
+
+    stamp_invoice_header(pdf, office_code)
+
+    # Customer Information (Left) and Bill Details (Right)
+    pdf.set_font("Arial", "B", 9)
+    pdf.set_xy(10, 36)
+    pdf.cell(90, row_height, "Customer Information", ln=False, align="L")
+    pdf.set_xy(110, 36)
+    pdf.cell(90, row_height, "Bill Details", ln=False, align="L")
+
+    # Customer Details (Left Side)
+    pdf.set_font("Arial", "", 9)
+    pdf.set_xy(10, 42)
+    pdf.cell(90, row_height, f"To           :      {bill.get('customer_name', '')}", ln=True, align="L")
+
+    pdf.set_font("Arial", size=9)
+
+    # First line: "Address : " (no line break)
+    pdf.set_xy(10, 48)
+    pdf.cell(20, 3, "Address  : ", ln=False, align="L")
+
+    # Let FPDF handle wrapping (no manual splitting)
+    pdf.multi_cell(w=80, h=3, txt=str(bill.get("address", "")), align="L", border=0)
+
+    # Bill Details (Right Side)
+    pdf.set_xy(110, 44)
+    pdf.cell(90, 0, f"Bill NO             :   {bill.get('bill_no', '')}", ln=True, align="L")
+    pdf.set_xy(110, 48)
+    pdf.cell(90, 0, f"Bill DATE         :  {bill.get('bill_date', '')}", ln=True, align="L")
+    pdf.set_xy(110, 52)
+    pdf.cell(90, 0, f"L.R. NUMBER :   {bill.get('lr_number', '')}", ln=True, align="L")
+
+    pdf.set_xy(110, 56)
+    pdf.cell(90, 0, f"GSTIN             :   {bill.get('gstin', '')}", ln=True, align="L")
+
+    # Draw a vertical line between Customer Information and Bill Details
+    pdf.set_line_width(0.4)
+    pdf.line(105, 35, 105, 60)
+
+    # Final Line after Customer & Bill Details
+    pdf.line(10, 60, 200, 60)
+
+    # Product Table
+    pdf.ln(3)
+    pdf.set_x(10)
+    pdf.set_font("Arial", "B", 10)
+    pdf.cell(0, 10, "Product Details:", ln=True, align='L')
+
+    # Table headers
+    headers = ["S.No", "Product Name", "Case", "Per Case", "Quantity", "Rate", "Per", "Discount", "Amount"]
+    col_widths = [10, 53, 10, 17, 15, 20, 19, 16, 30]
+
+    # Set line width to make borders thinner
+    pdf.set_line_width(0.4)
+
+    # Draw header row
+    pdf.set_x(10)
+    for i, header in enumerate(headers):
+        pdf.cell(col_widths[i], 6, header, border=1, align='C')
+
+    pdf.set_font("Arial", "", 9)
+
+    MAX_VISIBLE_ROWS = 22
+    row_height = 6  # Fixed row height
+
+    # ==== 1. Draw Table TOP border ====
+    pdf.set_x(10)
+    pdf.cell(sum(col_widths), row_height, "", border='T', ln=1)
+
+    # ==== 2. Draw Product Rows (NO horizontal lines) ====
+    for i, values in enumerate(rows, 1):
+        pdf.set_x(10)
+        # S.No column (left and right border)
+        pdf.cell(col_widths[0], row_height, str(i), border='LR', align='C')
+
+        # Middle columns (right border only)
+        for j, value in enumerate(values[1:]):
+            if j == 5: continue  # Skip Unit Type column
+            adjusted_index = j - 1 if j > 5 else j
+
+            if adjusted_index == 6:  # Discount column
+                match = re.search(r"(\d+)%", str(values[8]))
+                discount = match.group(1) if match else "0"
+                pdf.cell(col_widths[adjusted_index+1], row_height, f"{discount}%", border='R', align='C')
+            else:
+                pdf.cell(col_widths[adjusted_index+1], row_height, str(value), border='R', align='C')
+
+        pdf.ln(row_height)
+
+    # ==== 3. Fill remaining space with blank rows ====
+    # (just the column borders: one vertical line per column for the whole block)
+    blank_rows = max(0, MAX_VISIBLE_ROWS - len(rows))
+    if blank_rows and pdf.get_y() + blank_rows * row_height <= pdf.page_break_trigger:
+        top = pdf.get_y()
+        bottom = top + blank_rows * row_height
+        edge = 10
+        pdf.line(edge, top, edge, bottom)
+        for width in col_widths:
+            edge += width
+            pdf.line(edge, top, edge, bottom)
+        pdf.set_xy(10, bottom)
+        blank_rows = 0
+    for _ in range(blank_rows):
+        pdf.set_x(10)
+        pdf.cell(col_widths[0], row_height, "", border='LR')
+        for width in col_widths[1:-1]:
+            pdf.cell(width, row_height, "", border='R')
+        pdf.cell(col_widths[-1], row_height, "", border='R')
+        pdf.ln(row_height)
+
+    # ==== 4. End Table (No Bottom Border + No Extra Space) ====
+    pdf.set_x(10)
+    pdf.cell(sum(col_widths), row_height, "", border=0)
+
+    # Amount Section
+    def check_page_break(pdf, content_height):
+        # Check if adding content will exceed the bottom margin
+        if pdf.get_y() + content_height > pdf.h - pdf.b_margin:
+            pdf.add_page()
+        return pdf.get_y()
+
+    check_page_break(pdf, 35)
+
+    pdf.set_line_width(0.4)
+    new_x = 10
+    new_height = 38
+
+    # Check if content will exceed the page and move to the next page
+    rect_y = check_page_break(pdf, new_height)
+
+    pdf.rect(new_x, rect_y, 190, new_height)
+    pdf.line(new_x + 90, rect_y, new_x + 90, rect_y + new_height)
+
+    # Check and move the content to the next page if needed
+    rect_y = check_page_break(pdf, 10)
+
+    # Left Side (From, To, Document Through)
+    pdf.set_xy(20, rect_y + 2)
+    pdf.set_font("Arial", "B", 9)
+    pdf.cell(50, 3, f"No. of Cases          {totals['no_of_cases']}", ln=True, align="L")
+
+    pdf.set_font("Arial", "", 9)
+    for label, text, height in (
+        ("From        : ", bill.get("from_", ""), 5),
+        ("To            : ", bill.get("to_", ""), 3),
+        ("Through   : ", bill.get("document_through", ""), 3),
+    ):
+        if pdf.get_y() + 10 > pdf.h - pdf.b_margin:
+            pdf.add_page()
+            rect_y = pdf.get_y()
+        pdf.set_x(20)
+        pdf.cell(50, height, f"{label}{text}", ln=True, align="L")
+
+    # Adding space before footer text
+    pdf.ln(5)
+    if pdf.get_y() + 10 > pdf.h - pdf.b_margin:
+        pdf.add_page()
+        rect_y = pdf.get_y()
+    # Footer Note
+    pdf.set_font("Arial", "I", 9)
+    footer_text = [
+        "Note:",
+        "1. Company not responsible for transit loss/damage",
+        "2. subject to Sivakasi jurisdiction. E.& O.E"
+    ]
+
+    # Display footer note
+    for line in footer_text:
+        pdf.cell(0, 3, line, ln=True, align="L")
+
+    pdf.set_font("Arial", "", 9)
+
+    def format_value(value):
+        return f"{value:.2f}"
+
+    pdf.set_xy(110, rect_y+2)
+    pdf.cell(50, 3, "             GOODS VALUE", ln=False, align="L")
+    pdf.cell(20, 3, f"{format_value(totals['goods_value'])}", ln=True, align="R")
+
+    pdf.set_x(110)
+    pdf.cell(50, 3, "    SPECIAL DISCOUNT", ln=False, align="L")
+    pdf.cell(20, 3, f"-{format_value(totals['special_discount'])}", ln=True, align="R")
+
+    pdf.set_x(110)
+    pdf.cell(50, 3, "                  SUB TOTAL", ln=False, align="L")
+    pdf.cell(20, 3, f"{format_value(totals['sub_total'])}", ln=True, align="R")
+
+    pdf.set_x(100)
+    pdf.cell(50, 3, f"PACKING CHARGES @ {packing_charge_percentage}%", ln=False, align="L")
+    pdf.cell(30, 3, f"{format_value(totals['packing_charges'])}", ln=True, align="R")
+
+    pdf.set_x(110)
+    pdf.cell(50, 3, "                   SUB TOTAL", ln=False, align="L")
+    pdf.cell(20, 3, f"{format_value(totals['sub_total_with_packing'])}", ln=True, align="R")
+
+    pdf.set_x(100)
+    pdf.cell(50, 3, f"                  MAHAMAI @ {MAHAMAI_PERCENTAGE}%", ln=False, align="L")
+    pdf.cell(30, 3, f"{format_value(totals['mahamai_charges'])}", ln=True, align="R")
+
+    pdf.set_x(110)
+    pdf.cell(50, 3, "          TAXABLE VALUE", ln=False, align="L")
+    pdf.cell(20, 3, f"{format_value(totals['taxable_value'])}", ln=True, align="R")
+
+    if region == "South":
+        pdf.set_x(110)
+        pdf.cell(50, 3, "                     CGST (9%)", ln=False, align="L")
+        pdf.cell(20, 3, f"{format_value(totals['cgst_amount'])}", ln=True, align="R")
+
+        pdf.set_x(110)
+        pdf.cell(50, 3, "                     SGST (9%)", ln=False, align="L")
+        pdf.cell(20, 3, f"{format_value(totals['sgst_amount'])}", ln=True, align="R")
+    else:
+        pdf.set_x(110)
+        pdf.cell(50, 3, "                     IGST (18%)", ln=False, align="L")
+        pdf.cell(20, 3, f"{format_value(totals['igst_amount'])}", ln=True, align="R")
+
+    # Add the Round Off section to the PDF
+    pdf.set_x(110)
+    pdf.cell(50, 3, "                  ROUND OFF", ln=False, align="L")
+    pdf.cell(20, 3, f"{totals['round_off_amount']:.2f}", ln=True, align="R")
+
+    pdf.set_x(110)
+    pdf.set_font("Arial", "B", 10)
+    pdf.cell(50, 7, "           NET AMOUNT", ln=False, align="L")
+    pdf.cell(20, 7, f"{format_value(totals['net_amount'])}", ln=True, align="R")
+
+    if pdf.get_y() + 10 > pdf.h - pdf.b_margin:
+        pdf.add_page()
+
+    # Amount in words
+    pdf.ln(5)
+    pdf.set_line_width(0.4)
+    rect_y = pdf.get_y()
+    pdf.rect(10, rect_y, 190, 5)
+    pdf.set_xy(15, rect_y - 2)
+    pdf.set_font("Arial", "I", 9)
+    pdf.cell(0, 10, f"Amount in Words: {amount_in_words(totals['net_amount'])}", ln=True, align="L")
+
+    # Check for page break again after the NET AMOUNT
+    check_page_break(pdf, 10)
+
+    # Set the y-coordinate to a specific value to move up
+    pdf.set_y(pdf.get_y() - 3)
+
+    company_name = INVOICE_OFFICES[office_code]["company"]
+    pdf.cell(0, 10, f"                                                                                                                For {company_name}", ln=True, align="C")
+    pdf.cell(0, 10, "                                                                                                                Authorized Signature", ln=True, align="C")
+    return totals
+
+
+def render_invoice_pdf(bill, pdf_file_name):
+    """Write the invoice of one bill record to 'pdf_file_name'; returns invoice_totals()."""
+    pdf = new_invoice_pdf()
+    totals = draw_invoice(pdf, bill)
+    pdf.output(pdf_file_name)
+    return totals
+
+
+def render_invoice_job(job):
+    """Worker entry point: (bill, pdf_file_name) -> (bill_no, pdf_file_name, seconds, error)."""
+    bill, pdf_file_name = job
+    start = time.perf_counter()
+    try:
+        os.makedirs(os.path.dirname(pdf_file_name), exist_ok=True)
+        render_invoice_pdf(bill, pdf_file_name)
+        error = None
+    except Exception as e:
+        error = str(e)
+    return str(bill.get("bill_no", "")), pdf_file_name, time.perf_counter() - start, error
+
+
+def render_invoices_parallel(jobs, max_workers=None):
+    """
+    Render (bill, pdf_file_name) jobs across a process pool, one invoice per
+    task, yielding render_invoice_job() results in job order.
+    Callers on Windows must run this under `if __name__ == "__main__":`.
+    """
+    jobs = list(jobs)
+    if not jobs:
+        return
+    workers = min(max_workers or os.cpu_count() or 1, len(jobs))
+    if workers == 1:
+        for job in jobs:
+            yield render_invoice_job(job)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for result in pool.map(render_invoice_job, jobs, chunksize=max(1, len(jobs) // (workers * 8))):
+            yield result
+# ---------------------------------------------------------
+
+
+# ---- Streaming statement merge (bounded memory, prefetched inputs) ----
+class StatementMerger:
+    """
+    Appends the pages of many invoice PDFs to one statement file without
+    keeping them all open. Input files are read ahead by a small thread
+    pool (at most 'prefetch' files in memory), each one is opened, copied
+    into the output and closed, and every 'flush_every' files the output is
+    saved incrementally and reopened, which drops the copied pages from
+    memory. Resident memory therefore depends on the flush window, not on
+    how many bills the statement covers.
+
+    merge() returns a stats dict (files, pages, bytes_read, seconds, failed)
+    and writes nothing when no pages could be merged.
+    """
+
+    def __init__(self, flush_every=50, prefetch=8, workers=4):
+        self.flush_every = max(1, flush_every)
+        self.prefetch = max(1, prefetch)
+        self.workers = max(1, workers)
+
+    @staticmethod
+    def _read(path):
+        with open(path, "rb") as f:
+            data = f.read()
+        if not data.startswith(b"%PDF"):
+            raise ValueError("not a PDF file")
+        return data
+
+    def _prefetched(self, paths):
+        """Yield (path, bytes or exception) in order, reading up to 'prefetch' files ahead."""
+        paths = iter(paths)
+        window = []
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for path in itertools.islice(paths, self.prefetch):
+                window.append((path, pool.submit(self._read, path)))
+            while window:
+                path, future = window.pop(0)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = e
+                for next_path in itertools.islice(paths, 1):
+                    window.append((next_path, pool.submit(self._read, next_path)))
+                yield path, result
+
+    def merge(self, paths, output_path):
+        stats = {"files": 0, "pages": 0, "bytes_read": 0, "seconds": 0.0, "failed": []}
+        start = time.perf_counter()
+        part_path = output_path + ".part"
+        out = fitz.open()
+        saved = False
+        pending = 0
+
+        try:
+            for path, data in self._prefetched(paths):
+                if isinstance(data, Exception):
+                    stats["failed"].append((path, str(data)))
+                    continue
+                try:
+                    with fitz.open(stream=data, filetype="pdf") as src:
+                        out.insert_pdf(src)
+                        stats["pages"] += src.page_count
+                except Exception as e:
+                    stats["failed"].append((path, str(e)))
+                    continue
+                stats["files"] += 1
+                stats["bytes_read"] += len(data)
+                pending += 1
+
+                if pending >= self.flush_every:
+                    if saved:
+                        out.saveIncr()
+                    else:
+                        out.save(part_path)
+                        saved = True
+                    out.close()
+                    out = fitz.open(part_path)
+                    pending = 0
+
+            if pending and saved:
+                out.saveIncr()
+            elif pending:
+                out.save(part_path)
+                saved = True
+        except Exception:
+            out.close()
+            if os.path.exists(part_path):
+                os.remove(part_path)
+            raise
+        out.close()
+
+        if saved:
+            os.replace(part_path, output_path)
+        stats["seconds"] = time.perf_counter() - start
+        return stats
+
+    @staticmethod
+    def describe(stats):
+        """One-line throughput summary for logs and status messages."""
+        seconds = max(stats["seconds"], 1e-9)
+        return (f"{stats['files']} PDFs / {stats['pages']} pages in {stats['seconds']:.2f}s "
+                f"({stats['pages'] / seconds:.0f} pages/s, {stats['bytes_read'] / seconds / 1_048_576:.1f} MB/s)")
+# ---------------------------------------------------------
+
+
+# ---- Statements rendered from bill records ----
+def _pdf_mark(pdf):
+    """Where an FPDF document stands, for _pdf_rollback()."""
+    return pdf.page, pdf.pages.get(pdf.page), pdf.state
+
+
+def _pdf_rollback(pdf, mark):
+    """Drop everything drawn after _pdf_mark(): later pages and additions to the current one."""
+    page, content, state = mark
+    for number in [n for n in pdf.pages if n > page]:
+        del pdf.pages[number]
+        getattr(pdf, "page_links", {}).pop(number, None)
+        getattr(pdf, "orientation_changes", {}).pop(number, None)
+    if page:
+        pdf.pages[page] = content
+    pdf.page = page
+    pdf.state = state
+
+
+def render_statement_pdf(bills, output_path, leading_pdfs=(), original_pdfs=(), missing=(),
+                         missing_originals=()):
+    """
+    Write one statement PDF for 'bills' (bill records from bills_data): every
+    invoice is drawn straight from its record into a single FPDF document, so
+    the header fonts and images are embedded once and no stored invoice has
+    to be found on disk or parsed. 'leading_pdfs' (e.g. a commission summary)
+    go in front and 'original_pdfs' (the stored invoice files, when asked
+    for) are attached at the end, both streamed in by StatementMerger.
+    An invoice that fails halfway is taken out again, so no partial page
+    ends up in the statement. 'missing' bill numbers (no record) and
+    'missing_originals' (original PDF not found) are reported as failed.
+
+    Returns a stats dict: bills, rendered (bill numbers), pages, seconds,
+    attached, failed.
+    """
+    start = time.perf_counter()
+    pdf = new_invoice_pdf()
+    failed = [(str(bill_no), "no bill record") for bill_no in missing]
+    failed.extend((str(bill_no), "original PDF not found") for bill_no in missing_originals)
+    rendered = []
+    for bill in bills:
+        mark = _pdf_mark(pdf)
+        try:
+            draw_invoice(pdf, bill)
+            rendered.append(str(bill.get("bill_no", "")))
+        except Exception as e:
+            _pdf_rollback(pdf, mark)
+            failed.append((str(bill.get("bill_no", "")), str(e)))
+
+    stats = {"bills": len(rendered), "rendered": rendered, "pages": pdf.page, "seconds": 0.0,
+             "attached": 0, "failed": failed}
+    if not leading_pdfs and not original_pdfs:
+        if pdf.page:
+            pdf.output(output_path)
+    else:
+        rendered_path = output_path + ".bills.pdf"
+        parts = list(leading_pdfs)
+        if pdf.page:
+            pdf.output(rendered_path)
+            parts.append(rendered_path)
+        try:
+            merged = StatementMerger().merge(parts + list(original_pdfs), output_path)
+        finally:
+            if os.path.exists(rendered_path):
+                os.remove(rendered_path)
+        stats["pages"] = merged["pages"]
+        stats["attached"] = max(0, merged["files"] - len(parts))
+        stats["failed"].extend(merged["failed"])
+    stats["seconds"] = time.perf_counter() - start
+    return stats
+
+
+def statement_problems(stats):
+    """'bill no / file: reason' for everything a statement had to leave out."""
+    return [f"{os.path.basename(str(source))}: {error}" for source, error in stats["failed"]]
+
+
+def describe_statement(stats):
+    """One-line summary for logs and status messages."""
+    text = f"{stats['bills']} bills / {stats['pages']} pages in {stats['seconds']:.2f}s"
+    if stats["attached"]:
+        text += f", {stats['attached']} original PDFs attached"
+    return text
+# ---------------------------------------------------------
+
+
+# ---- Bulk commission recomputation ----
+def bill_sub_total(bill):
+    """
+    Commission base (SUB TOTAL) of a bill and whether it is stored on it:
+    'sub_total', else goods value - special discount, else the line items.
+    """
+    try:
+        if "sub_total" in bill:
+            return float(bill["sub_total"] or 0), True
+        if "goods_value" in bill and "special_discount" in bill:
+            return float(bill["goods_value"] or 0) - float(bill["special_discount"] or 0), False
+    except (TypeError, ValueError):
+        pass
+    return sum(line.amount - line.discount_amount for line in bill_line_items(bill)), False
+
+
+def commission_on(sub_total, commission_rate):
+    """Commission at 'commission_rate' percent of a SUB TOTAL; none on a zero or negative SUB TOTAL."""
+    return sub_total * commission_rate / 100 if sub_total > 0 else 0
+
+
+def commission_base_source(bill):
+    """
+    What a bill's commission is calculated on: 'sub_total', or 'line_items'
+    while its SUB TOTAL is only worked out from the items. That estimate is
+    never stored as 'sub_total', so SubtotalBackfill still reads the printed
+    value from the PDF.
+    """
+    return "line_items" if SubtotalBackfill.needs_subtotal(bill) else "sub_total"
+
+
+def commission_updates(bills, commission_rate, progress=None, progress_every=1000):
+    """
+    Commission of every bill in one pass: the SUB TOTALs are collected once,
+    then multiplied and compared as arrays (NumPy when available).
+    Returns {bill_no: {field: value}} for the bills whose stored commission
+    differs, ready for FirebaseDeltaSync.update_fields(); a SUB TOTAL derived
+    from goods value - special discount is stored along with it, one worked
+    out from the line items is not (see commission_base_source()).
+    progress(done, total) is called while reading.
+    """
+    keys, bases, stored, sources, old_amounts, old_rates, complete = [], [], [], [], [], [], []
+    total = len(bills)
+    for done, (bill_no, bill) in enumerate(bills.items(), 1):
+        if isinstance(bill, dict):
+            base, is_stored = bill_sub_total(bill)
+            source = commission_base_source(bill)
+            keys.append(bill_no)
+            bases.append(base)
+            stored.append(is_stored or source == "line_items")   # False: SUB TOTAL to store
+            sources.append(source)
+            old_amounts.append(BillAggregates._number(bill.get("commission_amount")))
+            old_rates.append(BillAggregates._number(bill.get("commission_rate")))
+            complete.append(bill.get("commission_calculated_on") == source)
+        if progress and done % progress_every == 0:
+            progress(done, total)
+    if progress:
+        progress(total, total)
+
+    amounts = [commission_on(base, commission_rate) for base in bases]
+    if np is not None and keys:
+        changed = (
+            (np.abs(np.array(amounts, dtype=np.float64) - np.array(old_amounts, dtype=np.float64)) > 0.005)
+            | (np.array(old_rates, dtype=np.float64) != commission_rate)
+            | ~np.array(complete, dtype=bool)
+            | ~np.array(stored, dtype=bool)
+        )
+        changed = changed.tolist()
+    else:
+        changed = [
+            abs(amount - old_amount) > 0.005 or old_rate != commission_rate or not ok or not is_stored
+            for amount, old_amount, old_rate, ok, is_stored
+            in zip(amounts, old_amounts, old_rates, complete, stored)
+        ]
+
+    stamp = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
+    updates = {}
+    for i, bill_no in enumerate(keys):
+        if not changed[i]:
+            continue
+        fields = {
+            "commission_rate": commission_rate,
+            "commission_amount": amounts[i],
+            "commission_calculated_on": sources[i],
+            "commission_last_updated": stamp,
+        }
+        if not stored[i]:
+            fields["sub_total"] = bases[i]
+        updates[bill_no] = fields
+    return updates
+
+
+def commission_is_current(bill, commission_amount, commission_rate):
+    """True when the commission stored on a bill matches a previewed one (same test as commission_updates)."""
+    source = commission_base_source(bill)
+    return (
+        abs(BillAggregates._number(bill.get("commission_amount")) - commission_amount) <= 0.005
+        and BillAggregates._number(bill.get("commission_rate")) == commission_rate
+        and bill.get("commission_calculated_on") == source
+        and (source == "line_items" or "sub_total" in bill)
+    )
+# ---------------------------------------------------------
+
+
+# ---- SUB TOTAL backfill from legacy invoice PDFs ----
+SUBTOTAL_AMOUNT = re.compile(r"[\d,]+\.\d{2}")
+
+
+def subtotal_from_text(text):
+    """SUB TOTAL amount in the extracted text of an invoice page, or None."""
+    lines = text.split('\n')
+    for i, line in enumerate(lines):
+        if "SUB TOTAL" in line.upper():
+            # Amount on the same line, else on the next one
+            amount_line = line
+            if not any(char.isdigit() for char in line) and i + 1 < len(lines):
+                amount_line = lines[i + 1]
+            numbers = SUBTOTAL_AMOUNT.findall(amount_line)
+            if numbers:
+                return float(numbers[0].replace(',', ''))
+
+    match = re.search(r"SUB TOTAL\s*([\d,]+\.\d{2})", text.upper())
+    if match:
+        return float(match.group(1).replace(',', ''))
+    return None
+
+
+def subtotal_from_words(words):
+    """
+    SUB TOTAL from PyMuPDF words (x0, y0, x1, y1, text, ...): the amount on
+    the baseline of the top-most "SUB TOTAL" label, right of it. None if absent.
+    """
+    labels = [
+        words[i + 1] for i in range(len(words) - 1)
+        if words[i][4].upper() == "SUB" and words[i + 1][4].upper() == "TOTAL"
+    ]
+    if not labels:
+        return None
+    label = min(labels, key=lambda word: word[3])
+    amounts = [
+        word for word in words
+        if word[0] >= label[2] and abs(word[3] - label[3]) < 2 and SUBTOTAL_AMOUNT.fullmatch(word[4])
+    ]
+    if not amounts:
+        return None
+    return float(min(amounts, key=lambda word: word[0])[4].replace(',', ''))
+
+
+# Text drawn by FPDF cells: BT x y Td (text) Tj ET, with \ ( ) escaped
+FPDF_TEXT_RUN = re.compile(rb"BT ([\d.]+) ([\d.]+) Td \(((?:[^\\)]|\\.)*)\) Tj ET")
+
+
+def fpdf_words(content, page_height, clip):
+    """
+    Words of the FPDF text runs in a page content stream that start inside
+    'clip', shaped like PyMuPDF words (position of the run, top-left origin).
+    """
+    words = []
+    for x, y, text in FPDF_TEXT_RUN.findall(content):
+        x, top = float(x), page_height - float(y)
+        if not (clip.x0 <= x <= clip.x1 and clip.y0 <= top <= clip.y1):
+            continue
+        text = re.sub(rb"\\(.)", rb"\1", text).decode("latin-1")
+        for word in text.split():
+            words.append((x, top, x, top, word))
+    return words
+
+
+# Right part of an invoice page (fractions of its width / height): the totals box
+INVOICE_TOTALS_REGION = (0.45, 0.0, 1.0, 1.0)
+
+
+class FitzTextEngine:
+    """
+    PyMuPDF text extraction. With a 'region' only the words inside that part
+    of the page are looked at: first straight from the content stream
+    (invoices written by FPDF, no font loading or text layout), then from
+    PyMuPDF's text layer. A page without a SUB TOTAL there (another layout)
+    is read in full.
+    """
+    name = "PyMuPDF"
+
+    def __init__(self, region=INVOICE_TOTALS_REGION, content_stream=True):
+        self.region = region
+        self.content_stream = content_stream
+
+    def subtotal(self, path):
+        with fitz.open(path) as doc:
+            for number in range(doc.page_count - 1, -1, -1):
+                page = doc[number]
+                sub_total = None
+                if self.region is not None:
+                    rect = page.rect
+                    x0, y0, x1, y1 = self.region
+                    clip = fitz.Rect(rect.x0 + rect.width * x0, rect.y0 + rect.height * y0,
+                                     rect.x0 + rect.width * x1, rect.y0 + rect.height * y1)
+                    if self.content_stream:
+                        content = b"".join(doc.xref_stream(xref) for xref in page.get_contents())
+                        sub_total = subtotal_from_words(fpdf_words(content, rect.height, clip))
+                    if sub_total is None:
+                        sub_total = subtotal_from_words(page.get_text("words", clip=clip))
+                if sub_total is None:
+                    sub_total = subtotal_from_text(page.get_text())
+                if sub_total is not None:
+                    return sub_total
+        return None
+
+
+class PyPDF2TextEngine:
+    """PyPDF2 text extraction (whole pages) - the fallback when PyMuPDF cannot read a file."""
+    name = "PyPDF2"
+
+    def subtotal(self, path):
+        import PyPDF2
+
+        reader = PyPDF2.PdfReader(path)
+        for page in reversed(reader.pages):
+            sub_total = subtotal_from_text(page.extract_text() or "")
+            if sub_total is not None:
+                return sub_total
+        return None
+
+
+# Fastest first; the next engine is tried when one fails to read a file
+PDF_TEXT_ENGINES = (FitzTextEngine(), PyPDF2TextEngine())
+
+
+@functools.lru_cache(maxsize=4096)
+def cached_pdf_subtotal(path, mtime_ns, size):
+    """SUB TOTAL of one version of a PDF file; use pdf_subtotal()."""
+    errors = []
+    for engine in PDF_TEXT_ENGINES:
+        try:
+            return engine.subtotal(path)
+        except Exception as e:
+            errors.append(f"{engine.name}: {type(e).__name__}: {e}")
+    raise ValueError("; ".join(errors))
+
+
+def pdf_subtotal(path):
+    """
+    SUB TOTAL printed on an invoice PDF, or None. The totals are on the
+    last page, so pages are read from the end and usually only one is.
+    Results are cached by path, mtime and size, so a file is read again
+    only after it changes.
+    """
+    stat = os.stat(path)
+    return cached_pdf_subtotal(path, stat.st_mtime_ns, stat.st_size)
+
+
+def subtotal_job(job):
+    """Worker entry point: (bill_no, path) -> (bill_no, sub_total or None, error)."""
+    bill_no, path = job
+    try:
+        return bill_no, pdf_subtotal(path), None
+    except Exception as e:
+        return bill_no, None, f"{type(e).__name__}: {e}"
+
+
+class SubtotalBackfill:
+    """
+    Stores 'sub_total' on legacy bills by reading it from their invoice PDFs.
+    The PDFs are parsed across a process pool and the values are handed to
+    save() in batches. Progress is checkpointed to 'checkpoint_path': values
+    read but not saved yet are saved first on the next run without parsing
+    again, and PDFs without a readable SUB TOTAL are only retried once the
+    bill resolves to a different file. stop() ends a run after the tasks
+    already running, saving what was read so far.
+    """
+
+    def __init__(self, checkpoint_path, batch_size=200, max_workers=None):
+        self.checkpoint_path = checkpoint_path
+        self.batch_size = batch_size
+        self.max_workers = max_workers or max(1, (os.cpu_count() or 2) - 1)
+        self.found = {}    # bill_no -> sub_total read but not saved yet
+        self.failed = {}   # bill_no -> [pdf path or None, reason]
+        self.stopping = threading.Event()
+        self.running = False
+        self._load()
+
+    # ----- checkpoint -----
+    def _load(self):
+        try:
+            with open(self.checkpoint_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.found = data.get("found", {})
+            self.failed = data.get("failed", {})
+        except (OSError, ValueError):
+            self.found, self.failed = {}, {}
+
+    def _save(self):
+        tmp_path = self.checkpoint_path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"found": self.found, "failed": self.failed}, f)
+            os.replace(tmp_path, self.checkpoint_path)
+        except OSError as e:
+            print(f"⚠️ Could not save SUB TOTAL backfill checkpoint: {e}")
+
+    # ----- work -----
+    @staticmethod
+    def needs_subtotal(bill):
+        """Legacy bills: no stored SUB TOTAL and nothing to derive it from exactly."""
+        return (
+            isinstance(bill, dict)
+            and "sub_total" not in bill
+            and not ("goods_value" in bill and "special_discount" in bill)
+        )
+
+    def pending(self, bills):
+        return [bill_no for bill_no, bill in bills.items() if self.needs_subtotal(bill)]
+
+    def stop(self):
+        self.stopping.set()
+
+    def _flush(self, batch, save):
+        if not batch:
+            return 0
+        self._save()   # values survive a failed save or a crash
+        save({bill_no: {"sub_total": sub_total} for bill_no, sub_total in batch.items()})
+        for bill_no in batch:
+            self.found.pop(bill_no, None)
+        self._save()
+        count = len(batch)
+        batch.clear()
+        return count
+
+    def run(self, pending, resolve_paths, save, progress=None):
+        """
+        Backfill the 'pending' bill numbers (see pending()).
+        resolve_paths(bill_nos) -> {bill_no: path or None};
+        save({bill_no: {"sub_total": value}}) writes one batch (raise on failure);
+        progress(done, total, saved) is called after every batch.
+        Returns (saved, failed) counts for this run.
+        """
+        self.stopping.clear()
+        self.running = True
+        try:
+            to_read = [bill_no for bill_no in pending if bill_no not in self.found]
+            batch = {bill_no: self.found[bill_no] for bill_no in pending if bill_no in self.found}
+            self.found = dict(batch)   # Drop values for bills that got a SUB TOTAL elsewhere
+            saved = self._flush(batch, save)
+
+            paths = resolve_paths(to_read)
+            jobs = []
+            failed = 0
+            for bill_no, path in paths.items():
+                previous = self.failed.get(bill_no)
+                if previous is not None and previous[0] == path:
+                    continue   # Same file (or still none) as the last failed attempt
+                if not path:
+                    self.failed[bill_no] = [None, "PDF not found"]
+                    failed += 1
+                    continue
+                jobs.append((bill_no, path))
+
+            total = len(jobs)
+            if progress:
+                progress(0, total, saved)
+            if not jobs:
+                self._save()
+                return saved, failed
+
+            done = 0
+            pool = ProcessPoolExecutor(max_workers=min(self.max_workers, total))
+            try:
+                futures = [pool.submit(subtotal_job, job) for job in jobs]
+                job_paths = dict(jobs)
+                for future in as_completed(futures):
+                    bill_no, sub_total, error = future.result()
+                    done += 1
+                    if sub_total is None:
+                        self.failed[bill_no] = [job_paths[bill_no], error or "No SUB TOTAL in PDF"]
+                        failed += 1
+                    else:
+                        self.failed.pop(bill_no, None)
+                        self.found[bill_no] = sub_total
+                        batch[bill_no] = sub_total
+                    if len(batch) >= self.batch_size:
+                        saved += self._flush(batch, save)
+                        if progress:
+                            progress(done, total, saved)
+                    if self.stopping.is_set():
+                        break
+            finally:
+                pool.shutdown(wait=True, cancel_futures=True)
+
+            saved += self._flush(batch, save)
+            self._save()
+            if progress:
+                progress(done, total, saved)
+            return saved, failed
+        finally:
+            self.running = False
+# ---------------------------------------------------------
+
+
+# ---- Debounced background search for filter-as-you-type screens ----
+class SearchScheduler:
+    """
+    One channel per search screen. A new request cancels the pending one;
+    after 'delay_ms' of quiet it is handed to the channel's worker thread,
+    which only ever runs the newest request and drops the ones superseded
+    while it was busy. Only the newest result per channel is applied on
+    the Tk thread (root.after). Read widget values before submitting -
+    workers must not touch Tk. If a query fails because the data changed
+    under it, it is run again on the Tk thread, where nothing else can
+    change it, so the table never stays stale.
+    """
+
+    def __init__(self, root, delay_ms=150):
+        self.root = root
+        self.delay_ms = delay_ms
+        self.pending = {}      # channel -> after id
+        self.generation = {}   # channel -> newest request number
+        self.requests = {}     # channel -> newest (generation, compute, apply) for the worker
+        self.wakeups = {}      # channel -> Event of the channel's worker
+        self.lock = threading.Lock()
+
+    def submit(self, channel, compute, apply):
+        after_id = self.pending.pop(channel, None)
+        if after_id is not None:
+            self.root.after_cancel(after_id)
+
+        generation = self.generation.get(channel, 0) + 1
+        self.generation[channel] = generation
+        self.pending[channel] = self.root.after(
+            self.delay_ms, lambda: self._start(channel, generation, compute, apply)
+        )
+
+    def is_current(self, channel, generation):
+        return self.generation.get(channel) == generation
+
+    def _start(self, channel, generation, compute, apply):
+        self.pending.pop(channel, None)
+        with self.lock:
+            self.requests[channel] = (generation, compute, apply)
+            wakeup = self.wakeups.get(channel)
+            if wakeup is None:
+                wakeup = self.wakeups[channel] = threading.Event()
+                threading.Thread(
+                    target=self._worker, args=(channel, wakeup), name=f"search-{channel}", daemon=True
+                ).start()
+        wakeup.set()
+
+    def _worker(self, channel, wakeup):
+        while True:
+            wakeup.wait()
+            wakeup.clear()
+            with self.lock:
+                request = self.requests.pop(channel, None)
+            if request is None:
+                continue
+            generation, compute, apply = request
+            if not self.is_current(channel, generation):
+                continue
+            try:
+                result = compute()
+            except Exception as e:
+                print(f"⚠️ Search '{channel}' failed in the background, retrying: {e}")
+                self.root.after(0, self._retry, channel, generation, compute, apply)
+                continue
+            self.root.after(0, self._deliver, channel, generation, apply, result)
+
+    def _retry(self, channel, generation, compute, apply):
+        if not self.is_current(channel, generation):
+            return
+        try:
+            result = compute()
+        except Exception as e:
+            print(f"❌ Search '{channel}' failed: {e}")
+            return
+        apply(result)
+
+    def _deliver(self, channel, generation, apply, result):
+        if self.is_current(channel, generation):
+            apply(result)
+# ---------------------------------------------------------
+
+
+# ---- Virtual scrolling for large Treeview tables ----
+class VirtualTable:
+    """
+    Shows a window of rows from a backing list in an existing ttk.Treeview.
+    Only the rows that fit on screen exist as Tk items; the vertical
+    scrollbar, mouse wheel and arrow keys move the window over the list.
+    Sorting (click a heading) reorders the list, not the Tk items.
+    Rows are (values, tags) tuples.
     """
-    if not date_str:
-        return None
 
-    s = str(date_str).strip()
-    formats = ("%d/%m/%Y", "%d.%m.%Y", "%d-%m-%Y", "%Y-%m-%d", "%Y.%m.%d")
+    HEADING_HEIGHT = 25
 
-    for fmt in formats:
-        try:
-            return datetime.strptime(s, fmt)
-        except Exception:
-            continue
+    def __init__(self, tree, v_scrollbar):
+        self.tree = tree
+        self.scrollbar = v_scrollbar
+        self.rows = []
+        self.offset = 0
+        self.page_size = int(tree.cget("height") or 15)
+        self.selected_rows = set()   # absolute row indexes
+        self.sort_column = None
+        self.sort_reverse = False
 
-    try:
-        return datetime.fromisoformat(s)
-    except Exception:
-        pass
+        style = ttk.Style()
+        self.row_height = int(style.lookup(tree.cget("style") or "Treeview", "rowheight") or 20)
+
+        v_scrollbar.configure(command=self.yview)
+        tree.configure(yscrollcommand=lambda *args: None)
+
+        tree.bind("<Configure>", self.on_resize, add="+")
+        tree.bind("<MouseWheel>", self.on_mousewheel, add="+")
+        tree.bind("<Button-4>", lambda e: self.scroll(-3), add="+")
+        tree.bind("<Button-5>", lambda e: self.scroll(3), add="+")
+        tree.bind("<Down>", lambda e: self.on_arrow(1), add="+")
+        tree.bind("<Up>", lambda e: self.on_arrow(-1), add="+")
+        tree.bind("<Next>", lambda e: self.scroll(self.page_size), add="+")
+        tree.bind("<Prior>", lambda e: self.scroll(-self.page_size), add="+")
+
+        for index, column in enumerate(tree["columns"]):
+            tree.heading(column, command=lambda i=index: self.sort_by(i))
+
+    # ----- model -----
+    def set_rows(self, rows):
+        """Replace the backing rows (already filtered) and show the top of the list."""
+        self.rows = list(rows)
+        self.offset = 0
+        self.selected_rows.clear()
+        if self.sort_column is not None:
+            self._sort()
+        self.render()
+
+    def sort_by(self, column_index):
+        if self.sort_column == column_index:
+            self.sort_reverse = not self.sort_reverse
+        else:
+            self.sort_column, self.sort_reverse = column_index, False
+        self._remember_selection()
+        self.selected_rows.clear()
+        self._sort()
+        self.render()
+
+    def _sort(self):
+        def key(row):
+            value = row[0][self.sort_column] if self.sort_column < len(row[0]) else ""
+            text = str(value).replace("₹", "").replace(",", "").replace("%", "").strip()
+            try:
+                return (0, float(text), "")
+            except ValueError:
+                return (1, 0.0, str(value).lower())
+        self.rows.sort(key=key, reverse=self.sort_reverse)
+
+    # ----- view -----
+    def render(self):
+        """Write the visible slice into the Tk items, reusing existing ones."""
+        visible = self.rows[self.offset:self.offset + self.page_size]
+        children = self.tree.get_children()
+
+        for slot, (values, tags) in enumerate(visible):
+            if slot < len(children):
+                self.tree.item(children[slot], values=values, tags=tags)
+            else:
+                self.tree.insert("", "end", values=values, tags=tags)
+        if len(children) > len(visible):
+            self.tree.delete(*children[len(visible):])
+
+        children = self.tree.get_children()
+        keep = [children[i - self.offset] for i in self.selected_rows
+                if self.offset <= i < self.offset + len(children)]
+        if set(keep) != set(self.tree.selection()):
+            self.tree.selection_set(keep)
+
+        total = len(self.rows)
+        if total:
+            self.scrollbar.set(self.offset / total, min(1.0, (self.offset + len(visible)) / total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    def _remember_selection(self):
+        children = self.tree.get_children()
+        for slot in range(len(children)):
+            self.selected_rows.discard(self.offset + slot)
+        for iid in self.tree.selection():
+            if iid in children:
+                self.selected_rows.add(self.offset + children.index(iid))
+
+    def scroll_to(self, offset):
+        offset = max(0, min(int(offset), max(0, len(self.rows) - self.page_size)))
+        if offset != self.offset:
+            self._remember_selection()
+            self.offset = offset
+            self.render()
+
+    def scroll(self, rows):
+        self.scroll_to(self.offset + rows)
+
+    def yview(self, *args):
+        """Scrollbar command: ('moveto', fraction) or ('scroll', n, 'units'|'pages')."""
+        if args and args[0] == "moveto":
+            self.scroll_to(float(args[1]) * len(self.rows))
+        elif args and args[0] == "scroll":
+            step = int(args[1]) * (self.page_size if args[2] == "pages" else 1)
+            self.scroll(step)
+
+    def on_mousewheel(self, event):
+        self.scroll(-3 if event.delta > 0 else 3)
+        return "break"
 
-    print(f"DEBUG: Unrecognized date format: {s}")
-    return None
+    def on_arrow(self, direction):
+        """Scroll when the focus row is already at the edge of the window."""
+        children = self.tree.get_children()
+        focus = self.tree.focus()
+        if not children or focus not in children:
+            return None
+        slot = children.index(focus)
+        if (direction > 0 and slot == len(children) - 1) or (direction < 0 and slot == 0):
+            self.scroll(direction)
+            edge = self.tree.get_children()[slot]
+            self.tree.focus(edge)
+            self.tree.selection_set(edge)
+            return "break"
+        return None
+
+    def on_resize(self, event):
+        page_size = max(1, (event.height - self.HEADING_HEIGHT) // self.row_height)
+        if page_size != self.page_size:
+            self.page_size = page_size
+            self.scroll_to(self.offset)
+            self.render()
 # ---------------------------------------------------------
 
 
 class ModernInvoiceApp:
+    PDF_PENDING = "⏳ Checking"   # statement rows whose PDF is still being looked up
+    PDF_CHECK_CHUNK = 200          # bills per streamed update
+
     def __init__(self, root):
         self.root = root
         self.root.title("🚀  Invoice Pro - Modern Edition")
@@ -128,13 +2709,43 @@ class ModernInvoiceApp:
             self.product_ref = db.reference('product_data')
             self.bills_ref = db.reference('bills')
 
-            self.party_data = self.load_data(self.party_ref)
-            self.product_data = self.clean_product_keys(self.load_data(self.product_ref))  # CLEAN HERE
-            self.bills_data = self.load_data(self.bills_ref)
+            # Tracks what is already stored so saves only upload changed children
+            self.delta_sync = FirebaseDeltaSync()
+
+            # Local copy of all collections: startup reads it instead of Firebase,
+            # then a background refresh pulls only the records changed since
+            self.snapshot_cache = LocalSnapshotCache(
+                os.path.join(os.path.expanduser("~"), "invoice_cache.sqlite3")
+            )
+
+            self.party_data = self.load_cached_data(self.party_ref, canonical_party)
+            self.product_data = self.clean_product_keys(self.load_cached_data(self.product_ref, canonical_product))  # CLEAN HERE
+            self.bills_data = self.load_cached_data(self.bills_ref)
 
             # Add this in your __init__ method after loading product_data
             self.clean_all_product_keys()
 
+            # Customer / agent / office / product / date lookups over bills_data
+            self.bill_index = BillIndex()
+            self.bill_index.rebuild(self.bills_data)
+            self.line_item_cache = {}   # bill_no -> [LineItem], filled on first use
+            self.commission_base_cache = {}   # bill_no -> (SUB TOTAL, stored?), filled on first use
+            self.stock_aggregator = None   # built the first time the Stock Report opens
+            self.bill_aggregates = BillAggregates()
+            self.bill_aggregates.rebuild(self.bills_data)
+
+            # Where each bill PDF lives on disk (saved between runs)
+            self.pdf_index = PdfLocationIndex(
+                os.path.join(os.path.expanduser("~"), "Documents", "InvoiceApp"),
+                os.path.join(os.path.expanduser("~"), "invoice_pdf_index.json")
+            )
+
+            # SUB TOTALs of legacy bills, read from their PDFs in the background
+            self.subtotal_backfill = SubtotalBackfill(
+                os.path.join(os.path.expanduser("~"), "invoice_subtotal_backfill.json")
+            )
+            self.subtotal_backfill_thread = None
+
 
             print("🔥 Firebase connected successfully.")
             self.firebase_connected = True
@@ -146,36 +2757,15 @@ class ModernInvoiceApp:
         # -------------------- FIREBASE CONNECTION (END) --------------------
 
 
-        # In your __init__ method, replace the customer_names initialization:
-        self.customer_names = []
+        # Normalized parties for customer auto-fill
+        self.party_directory = PartyDirectory()
+        self.party_directory.rebuild(self.party_data)
 
-        for key, pdata in self.party_data.items():
-            # Handle multiple possible key variations
-            name = (
-                pdata.get('Customer Name') or 
-                pdata.get('Customer_Name') or 
-                pdata.get('customer_name') or
-                pdata.get('Customer  Name') or
-                pdata.get('Customer name') or
-                pdata.get(' Customer Name') or
-                ""
-            )
-            if name and name not in self.customer_names:
-                self.customer_names.append(name)
-
-        
-        # NEW CODE:
-        self.product_names = []
-        for key in self.product_data.keys():
-            product = self.product_data[key]
-            # Handle both old and new field names
-            if 'Product_Name' in product:
-                self.product_names.append(product['Product_Name'])
-            elif 'Product Name' in product:
-                self.product_names.append(product['Product Name'])
-            else:
-                print(f"⚠️ WARNING: Product {key} has no name field")
-        
+        # Customer / product names and their autocomplete indexes
+        self.customer_suggest_index = SubstringIndex()
+        self.product_suggest_index = SubstringIndex()
+        self.max_suggestions = 50
+        self.rebuild_name_lists()
 
         # Migrate absolute paths to relative paths (one-time operation) - FROM ORIGINAL
         self.migrate_absolute_paths_to_relative()
@@ -239,6 +2829,9 @@ class ModernInvoiceApp:
         self.undo_stack = []
         self.redo_stack = []
         self.max_undo_steps = 50
+        self.search_scheduler = SearchScheduler(self.root)
+        self.search_text_cache = {}   # (collection, code) -> (record, lowercase search text)
+        self.pdf_check_generation = {}   # statement table -> newest background PDF check
         self.current_screen = None
         
         
@@ -251,6 +2844,10 @@ class ModernInvoiceApp:
         # Save data on exit
         self.root.protocol("WM_DELETE_WINDOW", self.on_close)
 
+        # Pull records changed by other machines since the cached snapshot
+        if self.firebase_connected:
+            self.start_background_refresh()
+
     # ========== ORIGINAL APPLICATION METHODS - DATA MANAGEMENT ==========
     
     def load_data(self, ref):
@@ -268,19 +2865,13 @@ class ModernInvoiceApp:
 
             # Handle LIST data (Firebase array)
             if isinstance(data, list):
-                data_dict = {}
-                for i, item in enumerate(data):
-                    if item is not None:  # Skip None values
-                        # Use index as key, or try to find a better key
-                        key = str(i)
-                        # If item has a code/ID field, use that instead
-                        if isinstance(item, dict) and 'Product_Name' in item:
-                            # Try to use product name or create a key
-                            key = f"product_{i}"
-                        data_dict[key] = item
+                data_dict = remote_records(data)
+                # Remote children still sit under their array indexes
+                self.delta_sync.snapshot(ref, {str(i): item for i, item in enumerate(data) if item is not None})
                 return data_dict
             # If already dictionary → return as-is
             if isinstance(data, dict):
+                self.delta_sync.snapshot(ref, data)
                 return data
 
             
@@ -291,21 +2882,312 @@ class ModernInvoiceApp:
             return {}
 
 
-    def save_data(self, ref, data):
+    def load_cached_data(self, ref, normalize=None):
+        """
+        Load a collection from the local snapshot cache.
+        Falls back to a full Firebase download the first time (empty cache).
+        'normalize' (canonical_party / canonical_product) brings records that
+        predate the canonical schema onto it in memory.
+        """
+        collection = self.delta_sync.collection_path(ref)
+        try:
+            data = self.snapshot_cache.load(collection)
+        except Exception as e:
+            print(f"❌ Snapshot cache read error: {e}")
+            data = None
+
+        if data is None:
+            data = self.load_data(ref)
+            try:
+                self.snapshot_cache.replace(collection, data)
+            except Exception as e:
+                print(f"❌ Snapshot cache write error: {e}")
+        else:
+            self.delta_sync.snapshot(ref, data)
+            print(f"⚡ Loaded {len(data)} {collection} records from local cache")
+
+        if normalize is not None:
+            self.normalize_records(ref, data, normalize)
+        return data
+
+    def normalize_records(self, ref, data, normalize):
+        """
+        Rewrite legacy records in 'data' onto the canonical schema, in place.
+        Records already carrying the current schema_version cost one lookup.
+        Normalized records count as stored, so Ctrl+S / closing the app does
+        not re-upload them; Migrate_Schema.py rewrites them in Firebase.
+        """
+        known = self.delta_sync.fingerprints.setdefault(self.delta_sync.collection_path(ref), {})
+        legacy = 0
+        for key, record in data.items():
+            if isinstance(record, dict) and record.get("schema_version") != SCHEMA_VERSION:
+                data[key] = normalize(record)
+                legacy += 1
+                if key in known:
+                    known[key] = self.delta_sync.fingerprint(data[key])
+        if legacy:
+            print(f"⚠️ {legacy} records predate schema v{SCHEMA_VERSION} - run Migrate_Schema.py")
+        return data
+
+    RECONCILE_DELAY_MS = 30000   # quiet time after the last save before reconciling
+
+    def start_background_refresh(self, attrs=None, full_read=True):
+        """
+        Fetch remote changes on a worker thread and merge them on the Tk thread.
+        'attrs' limits the refresh to some collections, e.g. ["bills_data"].
+        With full_read=False a collection whose incremental query fails is
+        skipped instead of downloaded whole. Returns False if a refresh is
+        already running.
+        """
+        if getattr(self, "refresh_in_progress", False):
+            return False
+        self.refresh_in_progress = True
+
+        refs = [
+            (ref, attr) for ref, attr in (
+                (self.party_ref, "party_data"),
+                (self.product_ref, "product_data"),
+                (self.bills_ref, "bills_data"),
+            )
+            if attrs is None or attr in attrs
+        ]
+
+        def worker():
+            results = []
+            for ref, attr in refs:
+                try:
+                    results.append((ref, attr) + self.fetch_remote_changes(ref, full_read))
+                except Exception as e:
+                    print(f"❌ Background refresh error ({attr}): {e}")
+            self.root.after(0, lambda: self.apply_remote_changes(results))
+
+        threading.Thread(target=worker, daemon=True).start()
+        return True
+
+    def schedule_reconcile(self, attrs):
+        """
+        Reconcile 'attrs' with Firebase once saves have been quiet for
+        RECONCILE_DELAY_MS: a burst of saves costs one incremental refresh,
+        and never a full download.
+        """
+        pending = getattr(self, "reconcile_attrs", set())
+        pending.update(attrs)
+        self.reconcile_attrs = pending
+        after_id = getattr(self, "reconcile_after_id", None)
+        if after_id is not None:
+            self.root.after_cancel(after_id)
+
+        def run():
+            self.reconcile_after_id = None
+            if self.start_background_refresh(sorted(self.reconcile_attrs), full_read=False):
+                self.reconcile_attrs = set()
+            else:
+                self.schedule_reconcile(())   # A refresh is running - try again later
+
+        self.reconcile_after_id = self.root.after(self.RECONCILE_DELAY_MS, run)
+
+    def fetch_remote_changes(self, ref, full_read=True):
+        """
+        Return (changed, deleted) for one collection since its cache watermark
+        (less SYNC_OVERLAP_MS). Only records with a newer 'last_modified' are
+        downloaded - this needs the ".indexOn" rules in database.rules.json;
+        deletions are found with a shallow (keys only) read. Without the index
+        the whole collection is read, or nothing is when full_read is False.
+        Runs on a worker thread: it must not touch delta_sync or the collections.
+        """
+        collection = self.delta_sync.collection_path(ref)
+        watermark = self.snapshot_cache.watermark(collection)
+        # Read the cached keys first so a record saved meanwhile is never taken as deleted
+        cached = self.snapshot_cache.keys(collection)
+
+        try:
+            changed = ref.order_by_child("last_modified").start_at(watermark - SYNC_OVERLAP_MS).get() or {}
+        except Exception as e:
+            # No ".indexOn": "last_modified" rule on the server
+            if not full_read:
+                print(f"⚠️ Incremental query unavailable for {collection}, skipped: {e}")
+                return {}, []
+            print(f"⚠️ Incremental query unavailable for {collection}, reading all: {e}")
+            changed = remote_records(ref.get())
+
+        remote_keys = ref.get(shallow=True) or {}
+        deleted = [key for key in cached if key not in remote_keys]
+        return dict(changed), deleted
+
+    def apply_remote_changes(self, results):
+        """
+        Merge fetched records into the in-memory collections (Tk thread).
+        Records with unsaved local edits keep the local copy; the next save
+        uploads it. Records equal to what is already known are skipped.
+        """
+        self.refresh_in_progress = False
+        total = 0
+        for ref, attr, changed, deleted in results:
+            data = getattr(self, attr)
+            collection = self.delta_sync.collection_path(ref)
+            known = self.delta_sync.fingerprints.setdefault(collection, {})
+            watermark = max((LocalSnapshotCache.record_modified(v) for v in changed.values()), default=0.0)
+
+            changed = {
+                key: value for key, value in changed.items()
+                if known.get(key) != self.delta_sync.fingerprint(value)
+                and not self.delta_sync.has_local_changes(ref, data, key)
+            }
+            deleted = [key for key in deleted if not self.delta_sync.has_local_changes(ref, data, key)]
+
+            if attr == "product_data":
+                changed = self.clean_product_keys(changed)
+                changed = {key: canonical_product(value) if isinstance(value, dict) else value
+                           for key, value in changed.items()}
+            elif attr == "party_data":
+                changed = {key: canonical_party(value) if isinstance(value, dict) else value
+                           for key, value in changed.items()}
+
+            for key, value in changed.items():
+                data[key] = value
+                known[key] = self.delta_sync.fingerprint(value)
+            for key in deleted:
+                data.pop(key, None)
+                known.pop(key, None)
+
+            self.snapshot_cache.apply(collection, changed, deleted, watermark)
+            total += len(changed) + len(deleted)
+
+            if attr == "bills_data":
+                self.bills_changed(changed.keys(), deleted)
+            elif attr == "party_data":
+                self.parties_changed(changed.keys(), deleted)
+
+        if total:
+            self.rebuild_name_lists()
+            print(f"🔄 Background refresh merged {total} changed records")
+
+    def parties_changed(self, changed=(), deleted=()):
+        """Keep the party directory in step after parties are saved or deleted."""
+        for party_code in deleted:
+            self.party_directory.remove(party_code)
+        for party_code in changed:
+            if party_code in self.party_data:
+                self.party_directory.add(party_code, self.party_data[party_code])
+
+    def bills_changed(self, changed=(), deleted=()):
+        """Keep everything derived from bills_data in step after bills are saved or deleted."""
+        for bill_no in deleted:
+            self.bill_index.remove(bill_no)
+            self.bill_aggregates.remove(bill_no)
+            self.line_item_cache.pop(bill_no, None)
+            self.commission_base_cache.pop(bill_no, None)
+            if self.stock_aggregator is not None:
+                self.stock_aggregator.remove_bill(bill_no)
+        for bill_no in changed:
+            self.line_item_cache.pop(bill_no, None)
+            self.commission_base_cache.pop(bill_no, None)
+            if bill_no in self.bills_data:
+                self.bill_index.add(bill_no, self.bills_data[bill_no])
+                self.bill_aggregates.add(bill_no, self.bills_data[bill_no])
+                if self.stock_aggregator is not None:
+                    self.stock_aggregator.set_bill(bill_no, self.get_line_items(bill_no))
+
+    def get_line_items(self, bill_no):
+        """Parsed LineItems of a bill, cached until the bill changes."""
+        line_items = self.line_item_cache.get(bill_no)
+        if line_items is None:
+            line_items = bill_line_items(self.bills_data.get(bill_no, {}))
+            self.line_item_cache[bill_no] = line_items
+        return line_items
+
+    def commission_preview(self, bill_no, commission_rate):
+        """
+        (SUB TOTAL, commission, already saved?) of a bill at the given rate.
+        Read-only: the SUB TOTAL is cached until the bill changes and nothing
+        is written back - use commit_agent_commissions() to save.
+        """
+        entry = self.commission_base_cache.get(bill_no)
+        if entry is None:
+            entry = bill_sub_total(self.bills_data.get(bill_no, {}))
+            self.commission_base_cache[bill_no] = entry
+        sub_total = entry[0]
+        commission_amount = commission_on(sub_total, commission_rate)
+        bill = self.bills_data.get(bill_no, {})
+        return sub_total, commission_amount, commission_is_current(bill, commission_amount, commission_rate)
+
+    def rebuild_name_lists(self):
+        """Rebuild the customer / product name lists used by the comboboxes."""
+        self.customer_names = list(dict.fromkeys(
+            party["Customer_Name"] for party in self.party_data.values() if party["Customer_Name"]
+        ))
+        self.product_names = [
+            product["Product_Name"] for product in self.product_data.values() if product["Product_Name"]
+        ]
+        self.sync_suggest_indexes()
+
+    def sync_suggest_indexes(self):
+        """Apply name list changes to the autocomplete indexes (only changed names are re-indexed)."""
+        self.customer_suggest_index.sync(self.customer_names)
+        self.product_suggest_index.sync(self.product_names)
+
+    def save_data(self, ref, data, keys=None):
         """
         Save data to Firebase Realtime Database.
         'ref' is a Firebase Database reference.
+        Only children that changed since the last load/save are uploaded,
+        as one multi-path update. Pass 'keys' when the caller knows which
+        children it touched to skip comparing the rest of the collection.
         """
         try:
-            ref.set(data)
-            print("✅ Firebase save successful")
+            delta = self.delta_sync.flush(ref, data, keys)
+            print(f"✅ Firebase save successful ({len(delta)} changed)")
+            self.cache_saved_delta(ref, delta)
             return True
         except Exception as e:
             print(f"❌ Firebase Save Error: {e}")
             return False
 
+    def write_child(self, ref, key, value):
+        """
+        Write one record with ref.child(key).set() and keep the delta tracker
+        and local cache in step. Raises on Firebase errors like the plain call.
+        """
+        key = str(key)
+        ref.child(key).set(dict(value, last_modified=SERVER_TIMESTAMP) if isinstance(value, dict) else value)
+        self.delta_sync.fingerprints.setdefault(
+            self.delta_sync.collection_path(ref), {}
+        )[key] = self.delta_sync.fingerprint(value)
+        self.cache_saved_delta(ref, {key: value})
+
+    def cache_saved_delta(self, ref, delta):
+        """Mirror a successful Firebase write into the local snapshot cache."""
+        if not delta:
+            return
+        try:
+            self.snapshot_cache.apply(
+                self.delta_sync.collection_path(ref),
+                {k: v for k, v in delta.items() if v is not None},
+                [k for k, v in delta.items() if v is None],
+            )
+        except Exception as e:
+            print(f"❌ Snapshot cache write error: {e}")
+
+    def wait_for_subtotal_backfill(self, timeout=30):
+        """
+        Wait (up to 'timeout' seconds) for a stopping SUB TOTAL backfill to save
+        its last batch. Tk events keep being processed meanwhile, so the
+        worker's root.after() calls neither block nor get lost.
+        """
+        thread = getattr(self, "subtotal_backfill_thread", None)
+        deadline = time.monotonic() + timeout
+        while thread is not None and thread.is_alive() and time.monotonic() < deadline:
+            self.root.update()
+            thread.join(0.05)
+        if thread is not None:
+            self.root.update()   # Apply what the worker queued just before it ended
+
     def on_close(self):
         """Simple application shutdown with data saving - FROM ORIGINAL"""
+        # Let a running SUB TOTAL backfill save what it has read and stop
+        self.subtotal_backfill.stop()
+        self.wait_for_subtotal_backfill()
+
         # Save all data
         self.save_data(self.party_ref, self.party_data)
         self.save_data(self.product_ref, self.product_data)
@@ -354,6 +3236,7 @@ class ModernInvoiceApp:
         invoice_app_base = os.path.join(documents_dir, "InvoiceApp")
         
         migrated_count = 0
+        migrated_bills = []
         for bill_no, bill_data in self.bills_data.items():
             pdf_path = bill_data.get("pdf_file_name", "")
             if pdf_path and os.path.isabs(pdf_path):
@@ -369,13 +3252,14 @@ class ModernInvoiceApp:
                             relative_path = os.path.normpath(relative_path)
                             # Update the bill data
                             self.bills_data[bill_no]["pdf_file_name"] = relative_path
+                            migrated_bills.append(bill_no)
                             migrated_count += 1
                     except Exception as e:
                         print(f"Error migrating path for bill {bill_no}: {e}")
         
         if migrated_count > 0:
             # Save the updated data
-            self.save_data(self.bills_ref, self.bills_data)
+            self.save_data(self.bills_ref, self.bills_data, keys=migrated_bills)
             print(f"Migrated {migrated_count} bill paths from absolute to relative")
 
     def get_pdf_path(self, relative_path):
@@ -410,12 +3294,11 @@ class ModernInvoiceApp:
     def set_window_icon(self):
         """Sets the window icon to logo.png - FROM ORIGINAL"""
         try:
-            # Load the image using PhotoImage for Tkinter or ImageTk for PIL
-            logo_image = Image.open("logo.png")
-            logo_image = logo_image.resize((64, 64))  # Resize if needed to match the icon size
-            logo_photo = ImageTk.PhotoImage(logo_image)
-            
-            # Set the icon for the main window
+            # The 64x64 icon is prepared once and cached on disk
+            logo_photo = ImageTk.PhotoImage(Image.open(image_asset("logo.png", size_px=(64, 64))))
+
+            # Set the icon for the main window (keep a reference so Tk does not drop it)
+            self.logo_photo = logo_photo
             self.root.iconphoto(False, logo_photo)
         except Exception as e:
             print("Error setting logo:", e)
@@ -435,11 +3318,7 @@ class ModernInvoiceApp:
             return
         
         # Update suggestions in the background without forcing dropdown
-        suggestions = []
-        if typed == '':
-            suggestions = self.customer_names
-        else:
-            suggestions = [name for name in self.customer_names if typed.lower() in name.lower()]
+        suggestions = self.customer_suggest_index.search(typed, self.max_suggestions)
         
         # Update values but don't force dropdown open
         self.customer_combobox['values'] = suggestions
@@ -451,48 +3330,15 @@ class ModernInvoiceApp:
         if not selected_customer_name:
             return
 
-        # Accepted key variations
-        possible_name_keys = [
-            "Customer Name", "Customer_Name", "customer_name",
-            "Customer  Name", "Customer name", " Customer Name", 
-            "Customer Name ", "Customer_Name ", "customer name"
-        ]
-
-        for key, pdata in self.party_data.items():
-
-            # Find the correct customer name key dynamically
-            customer_name_value = None
-            for nk in possible_name_keys:
-                if nk in pdata:
-                    customer_name_value = pdata[nk]
-                    break
-
-            if not customer_name_value:
-                continue
-
-            # Compare selected name
-            if customer_name_value.strip().lower() == selected_customer_name.lower():
+        party = self.party_directory.lookup(selected_customer_name)
+        if party is None:
+            return
 
-                # Auto-fill all fields
-                self.to_name.set(customer_name_value)
-                self.to_address.set(
-                    pdata.get("Address") or 
-                    pdata.get("address") or 
-                    ""
-                )
-                self.to_gstin.set(
-                    pdata.get("GST Number") or 
-                    pdata.get("gst") or 
-                    pdata.get("GST_Number") or 
-                    ""
-                )
-                self.agent_name.set(
-                    pdata.get("Agent Name") or 
-                    pdata.get("agent") or 
-                    pdata.get("Agent_Name") or 
-                    ""
-                )
-                return
+        # Auto-fill all fields
+        self.to_name.set(party["Customer_Name"])
+        self.to_address.set(party["Address"])
+        self.to_gstin.set(party["GST_Number"])
+        self.agent_name.set(party["Agent_Name"])
 
     def handle_manual_customer_entry(self):
         """Handle when user types a customer name manually. - FROM ORIGINAL"""
@@ -518,11 +3364,7 @@ class ModernInvoiceApp:
             return
         
         # Update suggestions in the background without forcing dropdown
-        suggestions = []
-        if typed == '':
-            suggestions = self.product_names
-        else:
-            suggestions = [name for name in self.product_names if typed.lower() in name.lower()]
+        suggestions = self.product_suggest_index.search(typed, self.max_suggestions)
         
         # Update values but don't force dropdown open
         self.product_name_combobox['values'] = suggestions
@@ -535,18 +3377,18 @@ class ModernInvoiceApp:
 
         # Existing product - fill details
         for key, value in self.product_data.items():
-            if value.get('Product Name', '').lower() == typed_name.lower():
+            if value["Product_Name"].lower() == typed_name.lower():
                 self.no_of_case_entry.delete(0, tk.END)
-                self.no_of_case_entry.insert(0, value.get('No. of Case', ''))
+                self.no_of_case_entry.insert(0, value["No_of_Case"])
                 self.per_case_entry.delete(0, tk.END)
-                self.per_case_entry.insert(0, value.get('Per Case', ''))
-                self.unit_type_combobox.set(value.get('Unit Type', ''))
-                self.rate.set(value.get('Selling Price', ''))
+                self.per_case_entry.insert(0, value["Per_Case"])
+                self.unit_type_combobox.set(value["Unit_Type"])
+                self.rate.set(value["Selling_Price"])
                 self.per_entry.delete(0, tk.END)
-                self.per_entry.insert(0, value.get('Per', 0))
+                self.per_entry.insert(0, value["Per"] or 0)
                 self.quantity_entry.delete(0, tk.END)
-                self.quantity_entry.insert(0, value.get('Quantity', ''))
-                self.discount.set(value.get('Discount', ''))
+                self.quantity_entry.insert(0, value["Quantity"])
+                self.discount.set(value["Discount"])
                 return  # stop
 
         # New product - clear
@@ -1098,11 +3940,9 @@ class ModernInvoiceApp:
             print(f"Status: {message}")
 
     def refresh_data(self, event=None):
-        """Refresh all data (F5)"""
-        self.party_data = self.load_data("party_data.json")
-        self.product_data = self.load_data("product_data.json")
-        self.bills_data = self.load_data("bills.json")  # Original uses bills.json
-        self.show_status_message("🔄 Data refreshed successfully!")
+        """Refresh all data (F5) - pulls only records changed since the last sync"""
+        self.start_background_refresh()
+        self.show_status_message("🔄 Refreshing data in background...")
         return "break"
 
     def create_navigation_bar(self):
@@ -1547,15 +4387,16 @@ class ModernInvoiceApp:
         stats_frame = tk.Frame(content_frame, bg=self.colors['light_bg'])
         stats_frame.pack(fill=tk.X, pady=10)
 
-        # Calculate office-specific stats
+        # Calculate office-specific stats (materialized, no scan of bills)
         office_prefix = {"A1": "AP", "A2": "AFI", "A3": "AFF"}.get(self.selected_office, "AP")
-        office_bills = {k: v for k, v in self.bills_data.items() if k.startswith(office_prefix)}
+        office_totals = self.bill_aggregates.get("office", office_prefix)
+        today_totals = self.bill_aggregates.get("office_day", office_prefix, datetime.now().toordinal())
         
         stats_data = [
             ("👥 Total Customers", len(self.party_data), self.colors['info'], "F2"),
             ("📦 Total Products", len(self.product_data), self.colors['success'], "F3"),
-            ("🧾 Office Invoices", len(office_bills), self.colors['warning'], "F4"),
-            ("💰 Revenue Today", "₹0", self.colors['accent'], "F6")
+            ("🧾 Office Invoices", office_totals["count"], self.colors['warning'], "F4"),
+            ("💰 Revenue Today", f"₹{today_totals['net_amount']:,.0f}", self.colors['accent'], "F6")
         ]
 
         for title, value, color, shortcut in stats_data:
@@ -2055,40 +4896,25 @@ class ModernInvoiceApp:
                 )
             return False
 
-        # Prepare entry with consistent key naming
+        # Prepare entry in the canonical schema
         self.party_data[party_code] = {
-            "Customer Name": customer_name,      # Standardized key name
-            "Address": address,                  # Standardized key name
-            "GST Number": gst_number,            # Standardized key name
-            "Phone Number": phone_number,        # Standardized key name
-            "Agent Name": agent_name             # Standardized key name
+            "Customer_Name": customer_name,
+            "Address": address,
+            "GST_Number": gst_number,
+            "Phone_Number": phone_number,
+            "Agent_Name": agent_name,
+            "schema_version": SCHEMA_VERSION
         }
 
         # SAVE TO FIREBASE
         print("🔄 DEBUG: Saving to Firebase…")
-        save_result = self.save_data(self.party_ref, self.party_data)
+        save_result = self.save_data(self.party_ref, self.party_data, keys=[party_code])
         print(f"🔄 DEBUG: save_data returned: {save_result}")
+        self.parties_changed([party_code])
 
         if save_result:
-            # Update local dropdown list with flexible key retrieval
-            self.customer_names = []
-            for key, party in self.party_data.items():
-                # Try multiple possible key names for customer name
-                customer = (
-                    party.get("Customer Name") or 
-                    party.get("Customer_Name") or 
-                    party.get("customer_name") or
-                    party.get("Customer  Name") or
-                    party.get("Customer name") or
-                    party.get(" Customer Name") or
-                    ""
-                )
-                if customer:
-                    self.customer_names.append(customer)
-            
-            # Remove duplicates while preserving order
-            seen = set()
-            self.customer_names = [x for x in self.customer_names if not (x in seen or seen.add(x))]
+            # Update local dropdown list
+            self.rebuild_name_lists()
 
             if not silent:
                 messagebox.showinfo(
@@ -2456,55 +5282,32 @@ class ModernInvoiceApp:
         self.show_status_message("✏️ Select a party code to modify details - Use Enter to load party data")
 
     def load_selected_party_details_enhanced(self):
-        """
-        Enhanced load function with better feedback and flexible key retrieval (FIXED)
-        Fixes syncing by checking for multiple possible key variations (e.g., 'Customer Name' and 'Customer_Name').
-        """
+        """Enhanced load function with better feedback (records are in the canonical schema)"""
         party_code = self.party_code_combobox.get().strip()
         
         if not party_code:
             messagebox.showwarning("⚠️ Selection Required", "Please select a party code first!")
             return
-        
-        # Helper function for flexible retrieval of data keys
-        def _get_flexible_value(data, *keys):
-            """Tries multiple keys for retrieval, returns stripped string or empty string."""
-            for key in keys:
-                value = data.get(key)
-                if value is not None:
-                    # Return the stripped string value, or the original value if not a string
-                    if isinstance(value, str):
-                        return value.strip()
-                    return value
-            return ""
 
         if party_code in self.party_data:
             details = self.party_data[party_code]
             
-            # --- Clear and populate fields using flexible retrieval ---
+            # --- Clear and populate fields ---
             
-            # 1. Customer Name (Check for "Customer Name", "Customer_Name", "customer_name")
-            customer_name = _get_flexible_value(details, "Customer Name", "Customer_Name", "customer_name")
+            customer_name = details["Customer_Name"]
             self.customer_name_entry_modify.delete(0, tk.END)
             self.customer_name_entry_modify.insert(0, customer_name)
             
-            # 2. Address (Check for "Address", "Address_Line", "address")
-            address = _get_flexible_value(details, "Address", "Address_Line", "address")
             self.address_entry_modify.delete("1.0", tk.END)
-            self.address_entry_modify.insert("1.0", address)
+            self.address_entry_modify.insert("1.0", details["Address"])
             
-            # 3. GST Number (Check for "GST Number", "GST_Number", "gstin")
-            gst_number = _get_flexible_value(details, "GST Number", "GST_Number", "gstin")
             self.gst_number_entry_modify.delete(0, tk.END)
-            self.gst_number_entry_modify.insert(0, gst_number)
+            self.gst_number_entry_modify.insert(0, details["GST_Number"])
             
-            # 4. Phone Number (Check for "Phone Number", "Phone_Number", "phone")
-            phone_number = _get_flexible_value(details, "Phone Number", "Phone_Number", "phone")
             self.phone_number_entry_modify.delete(0, tk.END)
-            self.phone_number_entry_modify.insert(0, phone_number)
+            self.phone_number_entry_modify.insert(0, details["Phone_Number"])
             
-            # 5. Agent Name (Check for "Agent Name" and "Agent_Name")
-            agent_name = _get_flexible_value(details, "Agent Name", "Agent_Name")
+            agent_name = details["Agent_Name"]
             self.agent_name_entry_modify.delete(0, tk.END)
             self.agent_name_entry_modify.insert(0, agent_name)
             
@@ -2545,15 +5348,18 @@ class ModernInvoiceApp:
 
         # Save the modified party details
         self.party_data[party_code] = {
-            "Customer Name": self.customer_name_entry_modify.get().strip(),
+            "Customer_Name": self.customer_name_entry_modify.get().strip(),
             "Address": self.address_entry_modify.get("1.0", "end-1c").strip(),
-            "GST Number": self.gst_number_entry_modify.get().strip(),
-            "Phone Number": self.phone_number_entry_modify.get().strip(),
-            "Agent Name": self.agent_name_entry_modify.get().strip()
+            "GST_Number": self.gst_number_entry_modify.get().strip(),
+            "Phone_Number": self.phone_number_entry_modify.get().strip(),
+            "Agent_Name": self.agent_name_entry_modify.get().strip(),
+            "schema_version": SCHEMA_VERSION
         }
 
+        self.parties_changed([party_code])
+
         # Save to file
-        if self.save_data(self.party_ref, self.party_data):
+        if self.save_data(self.party_ref, self.party_data, keys=[party_code]):
             # Reload the data to ensure consistency
             self.party_ref = db.reference('party_data')
             
@@ -2596,7 +5402,7 @@ class ModernInvoiceApp:
             return
             
         if party_code in self.party_data:
-            party_name = self.party_data[party_code].get("Customer Name", "Unknown")
+            party_name = self.party_data[party_code]["Customer_Name"] or "Unknown"
             
             confirm = messagebox.askyesno(
                 "🗑️ Confirm Deletion",
@@ -2609,7 +5415,8 @@ class ModernInvoiceApp:
             
             if confirm:
                 del self.party_data[party_code]
-                if self.save_data(self.party_ref, self.party_data):
+                self.parties_changed(deleted=[party_code])
+                if self.save_data(self.party_ref, self.party_data, keys=[party_code]):
                     messagebox.showinfo("✅ Success", f"Party '{party_name}' deleted successfully!")
                     self.show_party_management()
                 else:
@@ -2737,6 +5544,9 @@ class ModernInvoiceApp:
         h_scrollbar = ttk.Scrollbar(table_main, orient="horizontal", command=self.party_table.xview)
         self.party_table.configure(yscrollcommand=v_scrollbar.set, xscrollcommand=h_scrollbar.set)
 
+        # Only the visible rows are created as Tk items
+        self.party_table_view = VirtualTable(self.party_table, v_scrollbar)
+
         # Grid layout for table and scrollbars
         self.party_table.grid(row=0, column=0, sticky="nsew")
         v_scrollbar.grid(row=0, column=1, sticky="ns")
@@ -2830,24 +5640,30 @@ class ModernInvoiceApp:
         self.show_status_message("📋 Party list loaded - Double-click or use context menu to edit")
 
     def filter_party_list(self, event=None):
-        """Filter party list based on search term"""
+        """Filter party list based on search term (debounced, runs in background)"""
         search_term = self.party_search_entry.get().lower()
-        
-        if not search_term:
-            self.populate_party_table()
-            return
-        
-        filtered_data = {}
-        for party_code, details in self.party_data.items():
-            if (search_term in party_code.lower() or
-                search_term in details.get("Customer Name", "").lower() or
-                search_term in details.get("Address", "").lower() or
-                search_term in details.get("GST Number", "").lower() or
-                search_term in details.get("Phone Number", "").lower() or
-                search_term in details.get("Agent Name", "").lower()):
-                filtered_data[party_code] = details
-        
-        self.populate_party_table(filtered_data)
+        fields = ("Customer_Name", "Address", "GST_Number", "Phone_Number", "Agent_Name")
+        parties = list(self.party_data.items())   # taken here, on the Tk thread
+
+        def compute():
+            if not search_term:
+                return None
+            return {
+                party_code: details
+                for party_code, details in parties
+                if search_term in self.get_search_text("party", party_code, details, fields)
+            }
+
+        self.search_scheduler.submit("party", compute, self.populate_party_table)
+
+    def get_search_text(self, collection, code, record, fields):
+        """Lowercase text of a record's searchable fields, cached until the record is replaced"""
+        cached = self.search_text_cache.get((collection, code))
+        if cached is not None and cached[0] is record:
+            return cached[1]
+        text = "\n".join([str(code)] + [str(record.get(field, "")) for field in fields]).lower()
+        self.search_text_cache[(collection, code)] = (record, text)
+        return text
 
     def refresh_party_list(self, event=None):
         """Refresh the party list"""
@@ -2878,11 +5694,11 @@ class ModernInvoiceApp:
                     for party_code, details in self.party_data.items():
                         writer.writerow([
                             party_code,
-                            details.get("Customer Name", ""),
-                            details.get("Address", ""),
-                            details.get("GST Number", ""),
-                            details.get("Phone Number", ""),
-                            details.get("Agent Name", "")
+                            details["Customer_Name"],
+                            details["Address"],
+                            details["GST_Number"],
+                            details["Phone_Number"],
+                            details["Agent_Name"]
                         ])
                 
                 messagebox.showinfo("✅ Export Successful", f"Party list exported to:\n{file_path}")
@@ -2892,60 +5708,29 @@ class ModernInvoiceApp:
             messagebox.showerror("❌ Export Failed", f"Failed to export party list:\n{str(e)}")
 
     def populate_party_table(self, data=None):
-        """Populate the party table with flexible key handling (GST/Phone/Agent fix)."""
+        """Populate the party table (records are in the canonical schema)."""
 
-        # Clear old rows
-        for item in self.party_table.get_children():
-            self.party_table.delete(item)
+        rows = []
 
         # Use provided data or full DB
         party_data = data if data is not None else self.party_data
 
-        # Helper: safe getter that checks many key variations
-        def g(d, keys):
-            for k in keys:
-                if k in d:
-                    return d[k]
-            return ""
-
         # Insert rows
         for index, (party_code, details) in enumerate(party_data.items()):
             
             # Row color
             tags = ('evenrow',) if index % 2 == 0 else ('oddrow',)
 
-            # Customer name key variations
-            customer_name = g(details, [
-                "Customer Name", "Customer_Name", "customer_name",
-                "Customer  Name", "Customer name", " Customer Name"
-            ])
-
             # Address
-            address = g(details, ["Address", "address"])
+            address = details["Address"]
             if len(address) > 100:
                 address = address[:100] + "..."
 
-            # GST key variations
-            gst_number = g(details, [
-                "GST Number", "GST_Number", "GSTNumber", "gst_number", "gst"
-            ])
-
-            # Phone key variations
-            phone_number = g(details, [
-                "Phone Number", "Phone", "phone", "phone_number"
-            ])
-
-            # Agent Name key variations
-            agent_name = g(details, [
-                "Agent Name", "Agent_Name", "agent_name", "Agent", "agent"
-            ])
-
-            # Insert row
-            self.party_table.insert(
-                "", "end",
-                values=(party_code, customer_name, address, gst_number, phone_number, agent_name),
-                tags=tags
-            )
+            # Add row to the backing list
+            rows.append(((party_code, details["Customer_Name"], address, details["GST_Number"],
+                          details["Phone_Number"], details["Agent_Name"]), tags))
+
+        self.party_table_view.set_rows(rows)
 
         # Row colors
         self.party_table.tag_configure('evenrow', background='#ffffff')
@@ -3033,7 +5818,7 @@ class ModernInvoiceApp:
         customer_name = self.party_table.item(item, "values")[1]
         
         if party_code in self.party_data:
-            full_address = self.party_data[party_code].get("Address", "No address available")
+            full_address = self.party_data[party_code]["Address"] or "No address available"
             messagebox.showinfo(
                 f"🏠 Full Address - {customer_name}",
                 f"Party Code: {party_code}\n"
@@ -3115,7 +5900,8 @@ class ModernInvoiceApp:
         """Delete a party from data"""
         if party_code in self.party_data:
             del self.party_data[party_code]
-            return self.save_data(self.party_ref, self.party_data)
+            self.parties_changed(deleted=[party_code])
+            return self.save_data(self.party_ref, self.party_data, keys=[party_code])
         return False
         
     def show_party_statement(self):
@@ -3440,6 +6226,8 @@ class ModernInvoiceApp:
             if changes_made:
                 # Save cleaned data back to Firebase
                 self.product_ref.set(cleaned_data)
+                self.delta_sync.snapshot(self.product_ref, cleaned_data)
+                self.snapshot_cache.replace("product_data", cleaned_data)
                 self.product_data = cleaned_data
                 print("✅ All product keys cleaned successfully!")
                 messagebox.showinfo("✅ Success", "All product keys have been cleaned for Firebase compatibility.")
@@ -3557,7 +6345,8 @@ class ModernInvoiceApp:
             "Selling_Price": self.selling_price_entry.get().strip(),
             "Per": self.per_entry.get().strip(),
             "Quantity": self.quantity_entry.get().strip(),
-            "Discount": self.discount_entry.get().strip()
+            "Discount": self.discount_entry.get().strip(),
+            "schema_version": SCHEMA_VERSION
         }
 
         print(f"🔄 DEBUG: Saving product '{clean_product_code}' to Firebase…")
@@ -3566,7 +6355,7 @@ class ModernInvoiceApp:
         try:
             # METHOD 1: Try direct child set with simple structure
             print("🔄 DEBUG: Attempting direct child set...")
-            self.product_ref.child(clean_product_code).set(product_entry)
+            self.write_child(self.product_ref, clean_product_code, product_entry)
             
             print("✅ DEBUG: Product saved successfully to Firebase using direct child set")
 
@@ -3578,6 +6367,7 @@ class ModernInvoiceApp:
                 self.product_data[key]["Product_Name"]
                 for key in self.product_data
             ]
+            self.sync_suggest_indexes()
 
             if not silent:
                 messagebox.showinfo(
@@ -3602,6 +6392,7 @@ class ModernInvoiceApp:
                 print("🔄 DEBUG: Trying update method...")
                 update_data = {clean_product_code: product_entry}
                 self.product_ref.update(update_data)
+                self.cache_saved_delta(self.product_ref, update_data)
                 
                 print("✅ DEBUG: Product saved successfully using update method")
                 
@@ -3613,6 +6404,7 @@ class ModernInvoiceApp:
                     self.product_data[key]["Product_Name"]
                     for key in self.product_data
                 ]
+                self.sync_suggest_indexes()
 
                 if not silent:
                     messagebox.showinfo(
@@ -3645,6 +6437,7 @@ class ModernInvoiceApp:
                             self.product_data[key]["Product_Name"]
                             for key in self.product_data
                         ]
+                        self.sync_suggest_indexes()
 
                         if not silent:
                             messagebox.showinfo(
@@ -4021,71 +6814,41 @@ class ModernInvoiceApp:
         self.current_focus_index = 0
 
     def load_selected_product_details_enhanced(self):
-        """
-        Enhanced load function with better feedback and flexible key retrieval (FIXED)
-        Fixes syncing by checking for multiple possible key variations (e.g., 'Product Name' and 'Product_Name').
-        """
+        """Enhanced load function with better feedback (records are in the canonical schema)"""
         product_code = self.product_code_combobox_modify.get().strip()
         
         if not product_code:
             messagebox.showwarning("⚠️ Selection Required", "Please select a product code first!")
             return
-        
-        # Helper function for flexible retrieval of data keys
-        def _get_flexible_value(data, *keys):
-            """Tries multiple keys for retrieval, returns stripped string or empty string."""
-            for key in keys:
-                value = data.get(key)
-                if value is not None:
-                    # Return the stripped string value, or the original value if not a string
-                    if isinstance(value, str):
-                        return value.strip()
-                    return value
-            return ""
             
         if product_code in self.product_data:
             details = self.product_data[product_code]
             
-            # --- Clear and populate fields using flexible retrieval ---
+            # --- Clear and populate fields ---
             
-            # 1. Product Name (Checks for "Product Name" and "Product_Name")
-            product_name = _get_flexible_value(details, "Product Name", "Product_Name")
+            product_name = details["Product_Name"]
             self.product_name_entry_modify.delete(0, tk.END)
             self.product_name_entry_modify.insert(0, product_name)
             
-            # 2. No. of Case (Checks for "No. of Case" and "No_of_Case")
-            no_of_case = _get_flexible_value(details, "No. of Case", "No_of_Case")
             self.no_of_case_entry_modify.delete(0, tk.END)
-            self.no_of_case_entry_modify.insert(0, no_of_case)
+            self.no_of_case_entry_modify.insert(0, details["No_of_Case"])
             
-            # 3. Per Case (Checks for "Per Case" and "Per_Case")
-            per_case = _get_flexible_value(details, "Per Case", "Per_Case")
             self.per_case_entry_modify.delete(0, tk.END)
-            self.per_case_entry_modify.insert(0, per_case)
+            self.per_case_entry_modify.insert(0, details["Per_Case"])
             
-            # 4. Unit Type (Checks for "Unit Type" and "Unit_Type")
-            unit_type = _get_flexible_value(details, "Unit Type", "Unit_Type")
-            self.unit_type_combobox_modify.set(unit_type)
+            self.unit_type_combobox_modify.set(details["Unit_Type"])
             
-            # 5. Selling Price (Checks for "Selling Price" and "Selling_Price")
-            selling_price = _get_flexible_value(details, "Selling Price", "Selling_Price")
             self.selling_price_entry_modify.delete(0, tk.END)
-            self.selling_price_entry_modify.insert(0, selling_price)
+            self.selling_price_entry_modify.insert(0, details["Selling_Price"])
             
-            # 6. Per (Likely consistent key)
-            per = _get_flexible_value(details, "Per")
             self.per_entry_modify.delete(0, tk.END)
-            self.per_entry_modify.insert(0, per)
+            self.per_entry_modify.insert(0, details["Per"])
             
-            # 7. Quantity (Likely consistent key)
-            quantity = _get_flexible_value(details, "Quantity")
             self.quantity_entry_modify.delete(0, tk.END)
-            self.quantity_entry_modify.insert(0, quantity)
+            self.quantity_entry_modify.insert(0, details["Quantity"])
             
-            # 8. Discount (Likely consistent key)
-            discount = _get_flexible_value(details, "Discount")
             self.discount_entry_modify.delete(0, tk.END)
-            self.discount_entry_modify.insert(0, discount)
+            self.discount_entry_modify.insert(0, details["Discount"])
             
             # --- Update UI ---
             self.current_product_info.config(
@@ -4158,32 +6921,34 @@ class ModernInvoiceApp:
 
         # Build product entry
         product_entry = {
-            "Product Name": self.product_name_entry_modify.get().strip(),
-            "No. of Case": self.no_of_case_entry_modify.get().strip(),
-            "Per Case": self.per_case_entry_modify.get().strip(),
-            "Unit Type": self.unit_type_combobox_modify.get().strip(),
-            "Selling Price": self.selling_price_entry_modify.get().strip(),
+            "Product_Name": self.product_name_entry_modify.get().strip(),
+            "No_of_Case": self.no_of_case_entry_modify.get().strip(),
+            "Per_Case": self.per_case_entry_modify.get().strip(),
+            "Unit_Type": self.unit_type_combobox_modify.get().strip(),
+            "Selling_Price": self.selling_price_entry_modify.get().strip(),
             "Per": self.per_entry_modify.get().strip(),
             "Quantity": self.quantity_entry_modify.get().strip(),
-            "Discount": self.discount_entry_modify.get().strip()
+            "Discount": self.discount_entry_modify.get().strip(),
+            "schema_version": SCHEMA_VERSION
         }
 
         try:
             # Save to Firebase
-            self.product_ref.child(product_code).set(product_entry)
+            self.write_child(self.product_ref, product_code, product_entry)
             
             # Update local data
             self.product_data[product_code] = product_entry
             
             # Update product list
             self.product_names = [
-                self.product_data[key]["Product Name"]
+                self.product_data[key]["Product_Name"]
                 for key in self.product_data
             ]
+            self.sync_suggest_indexes()
 
             messagebox.showinfo("✅ Success", 
                             f"Product details modified and saved successfully!\n\n"
-                            f"Product: {product_entry['Product Name']}\n"
+                            f"Product: {product_entry['Product_Name']}\n"
                             f"Code: {product_code}")
             
             self.show_product_management()
@@ -4230,7 +6995,7 @@ class ModernInvoiceApp:
             return
             
         if product_code in self.product_data:
-            product_name = self.product_data[product_code].get("Product Name", "Unknown")
+            product_name = self.product_data[product_code]["Product_Name"] or "Unknown"
             
             confirm = messagebox.askyesno(
                 "🗑️ Confirm Deletion",
@@ -4243,7 +7008,7 @@ class ModernInvoiceApp:
             
             if confirm:
                 del self.product_data[product_code]
-                if self.save_data(self.product_ref, self.product_data):
+                if self.save_data(self.product_ref, self.product_data, keys=[product_code]):
                     messagebox.showinfo("✅ Success", f"Product '{product_name}' deleted successfully!")
                     self.show_product_management()
                 else:
@@ -4374,6 +7139,9 @@ class ModernInvoiceApp:
         h_scrollbar = ttk.Scrollbar(table_main, orient="horizontal", command=self.product_table.xview)
         self.product_table.configure(yscrollcommand=v_scrollbar.set, xscrollcommand=h_scrollbar.set)
 
+        # Only the visible rows are created as Tk items
+        self.product_table_view = VirtualTable(self.product_table, v_scrollbar)
+
         # Grid layout for table and scrollbars
         self.product_table.grid(row=0, column=0, sticky="nsew")
         v_scrollbar.grid(row=0, column=1, sticky="ns")
@@ -4468,9 +7236,7 @@ class ModernInvoiceApp:
 
     def populate_product_table(self, data=None):
         """Populate the product table with data"""
-        # Clear existing data
-        for item in self.product_table.get_children():
-            self.product_table.delete(item)
+        rows = []
         
         # Use provided data or all product data
         product_data = data if data is not None else self.product_data
@@ -4479,28 +7245,25 @@ class ModernInvoiceApp:
         for index, (product_code, details) in enumerate(product_data.items()):
             tags = ('evenrow',) if index % 2 == 0 else ('oddrow',)
             
-            # Handle both field name formats
-            product_name = details.get('Product_Name') or details.get('Product Name', '')
-            no_of_case = details.get('No_of_Case') or details.get('No. of Case', '')
-            per_case = details.get('Per_Case') or details.get('Per Case', '')
-            unit_type = details.get('Unit_Type') or details.get('Unit Type', '')
-            selling_price = details.get('Selling_Price') or details.get('Selling Price', '')
+            unit_type = details["Unit_Type"]
             
             # Format the Per value with Unit Type
-            per = details.get("Per", "")
+            per = details["Per"]
             per_value = f"{per} {unit_type}" if per and unit_type else per or unit_type
             
-            self.product_table.insert("", "end", values=(
+            rows.append(((
                 product_code,
-                product_name,
-                no_of_case,
-                per_case,
+                details["Product_Name"],
+                details["No_of_Case"],
+                details["Per_Case"],
                 unit_type,
-                f"₹{selling_price}",
+                f"₹{details['Selling_Price']}",
                 per_value,
-                details.get("Quantity", ""),
-                f"{details.get('Discount', '')}%"
-            ), tags=tags)
+                details["Quantity"],
+                f"{details['Discount']}%"
+            ), tags))
+
+        self.product_table_view.set_rows(rows)
 
         # Configure row colors with better contrast
         self.product_table.tag_configure('evenrow', background='#ffffff')
@@ -4511,23 +7274,21 @@ class ModernInvoiceApp:
             self.product_table_status.config(text=f"📊 Total Products: {len(product_data)}")
 
     def filter_product_list(self, event=None):
-        """Filter product list based on search term"""
+        """Filter product list based on search term (debounced, runs in background)"""
         search_term = self.product_search_entry.get().lower()
-        
-        if not search_term:
-            self.populate_product_table()
-            return
-        
-        filtered_data = {}
-        for product_code, details in self.product_data.items():
-            if (search_term in product_code.lower() or
-                search_term in details.get("Product Name", "").lower() or
-                search_term in details.get("Unit Type", "").lower() or
-                search_term in str(details.get("Selling Price", "")).lower() or
-                search_term in str(details.get("Per", "")).lower()):
-                filtered_data[product_code] = details
-        
-        self.populate_product_table(filtered_data)
+        fields = ("Product_Name", "Unit_Type", "Selling_Price", "Per")
+        products = list(self.product_data.items())   # taken here, on the Tk thread
+
+        def compute():
+            if not search_term:
+                return None
+            return {
+                product_code: details
+                for product_code, details in products
+                if search_term in self.get_search_text("product", product_code, details, fields)
+            }
+
+        self.search_scheduler.submit("product", compute, self.populate_product_table)
 
     def refresh_product_list(self, event=None):
         """Refresh the product list"""
@@ -4636,7 +7397,7 @@ class ModernInvoiceApp:
         """Delete a product from data"""
         if product_code in self.product_data:
             del self.product_data[product_code]
-            return self.save_data(self.product_ref, self.product_data)
+            return self.save_data(self.product_ref, self.product_data, keys=[product_code])
         return False
 
     def show_product_context_menu(self, event):
@@ -4675,12 +7436,12 @@ class ModernInvoiceApp:
                 f"Product Code: {product_code}\n"
                 f"Product: {product_name}\n\n"
                 f"📊 Pricing Information:\n"
-                f"• Selling Price: ₹{details.get('Selling Price', 'N/A')}\n"
-                f"• Per: {details.get('Per', 'N/A')} {details.get('Unit Type', '')}\n"
+                f"• Selling Price: ₹{details.get('Selling_Price', 'N/A')}\n"
+                f"• Per: {details.get('Per', 'N/A')} {details.get('Unit_Type', '')}\n"
                 f"• Quantity: {details.get('Quantity', 'N/A')}\n"
                 f"• Discount: {details.get('Discount', 'N/A')}%\n"
-                f"• No. of Case: {details.get('No. of Case', 'N/A')}\n"
-                f"• Per Case: {details.get('Per Case', 'N/A')}"
+                f"• No. of Case: {details.get('No_of_Case', 'N/A')}\n"
+                f"• Per Case: {details.get('Per_Case', 'N/A')}"
             )
 
     def show_product_details(self):
@@ -4733,11 +7494,11 @@ class ModernInvoiceApp:
             details_text = f"""
     🔢 Product Code: {product_code}
     📝 Product Name: {product_name}
-    📦 No. of Case: {details.get('No. of Case', 'N/A')}
-    🔢 Per Case: {details.get('Per Case', 'N/A')}
-    📏 Unit Type: {details.get('Unit Type', 'N/A')}
-    💰 Selling Price: ₹{details.get('Selling Price', 'N/A')}
-    📊 Per: {details.get('Per', 'N/A')} {details.get('Unit Type', '')}
+    📦 No. of Case: {details.get('No_of_Case', 'N/A')}
+    🔢 Per Case: {details.get('Per_Case', 'N/A')}
+    📏 Unit Type: {details.get('Unit_Type', 'N/A')}
+    💰 Selling Price: ₹{details.get('Selling_Price', 'N/A')}
+    📊 Per: {details.get('Per', 'N/A')} {details.get('Unit_Type', '')}
     📈 Quantity: {details.get('Quantity', 'N/A')}
     🎯 Discount: {details.get('Discount', 'N/A')}%
             """
@@ -4783,14 +7544,14 @@ class ModernInvoiceApp:
                     for product_code, details in self.product_data.items():
                         writer.writerow([
                             product_code,
-                            details.get("Product Name", ""),
-                            details.get("No. of Case", ""),
-                            details.get("Per Case", ""),
-                            details.get("Unit Type", ""),
-                            details.get("Selling Price", ""),
-                            details.get("Per", ""),
-                            details.get("Quantity", ""),
-                            details.get("Discount", "")
+                            details["Product_Name"],
+                            details["No_of_Case"],
+                            details["Per_Case"],
+                            details["Unit_Type"],
+                            details["Selling_Price"],
+                            details["Per"],
+                            details["Quantity"],
+                            details["Discount"]
                         ])
                 
                 messagebox.showinfo("✅ Export Successful", f"Product list exported to:\n{file_path}")
@@ -4908,6 +7669,9 @@ class ModernInvoiceApp:
         h_scrollbar = ttk.Scrollbar(table_main, orient="horizontal", command=self.stock_table.xview)
         self.stock_table.configure(yscrollcommand=v_scrollbar.set, xscrollcommand=h_scrollbar.set)
 
+        # Only the visible rows are created as Tk items
+        self.stock_table_view = VirtualTable(self.stock_table, v_scrollbar)
+
         # Grid layout for table and scrollbars
         self.stock_table.grid(row=0, column=0, sticky="nsew")
         v_scrollbar.grid(row=0, column=1, sticky="ns")
@@ -5160,39 +7924,25 @@ class ModernInvoiceApp:
             if not self.bills_data:
                 return delivery_records
             
-            # Search through all bills for this product
-            for bill_no, bill_info in self.bills_data.items():
-                items = bill_info.get('items', [])
+            # Only the bills that contain this product
+            for bill_no in self.bill_index.product(product_name):
+                bill_info = self.bills_data[bill_no]
                 
-                for item in items:
-                    if len(item) >= 7:  # Ensure item has required data
-                        current_product_name = item[1]  # Product Name is at index 1
-                        
-                        if current_product_name == product_name:
-                            # Extract quantity from the quantity field (e.g., "100 Box" -> 100)
-                            quantity_str = item[4]  # Quantity is at index 4
-                            try:
-                                quantity = int(quantity_str.split()[0]) if quantity_str else 0
-                            except (ValueError, IndexError):
-                                quantity = 0
-                            
-                            # Extract number of cases
-                            no_of_cases = item[2] if len(item) > 2 else 0  # No. of Case is at index 2
-                            
-                            # Create delivery record
-                            record = {
-                                'bill_no': bill_no,
-                                'bill_date': bill_info.get('bill_date', 'N/A'),
-                                'customer_name': bill_info.get('customer_name', 'N/A'),
-                                'agent_name': bill_info.get('agent_name', 'N/A'),
-                                'quantity': quantity,
-                                'no_of_cases': no_of_cases
-                            }
-                            delivery_records.append(record)
+                for line in self.get_line_items(bill_no):
+                    if line.product_name == product_name:
+                        # Create delivery record
+                        record = {
+                            'bill_no': bill_no,
+                            'bill_date': bill_info.get('bill_date', 'N/A'),
+                            'customer_name': bill_info.get('customer_name', 'N/A'),
+                            'agent_name': bill_info.get('agent_name', 'N/A'),
+                            'quantity': line.quantity,
+                            'no_of_cases': line.no_of_case
+                        }
+                        delivery_records.append(record)
             
             # Sort by bill date (most recent first)
-            
-            delivery_records.sort(key=lambda x: parse_date_flexible(x['bill_date']) or datetime.min, reverse=True)
+            delivery_records.sort(key=lambda x: self.bill_index.ordinal(x['bill_no']) or 0, reverse=True)
             
         except Exception as e:
             print(f"Error getting delivery records: {e}")
@@ -5281,14 +8031,13 @@ class ModernInvoiceApp:
     def populate_stock_report(self, filtered_data=None):
         """Populate stock report with product delivery counts"""
         try:
-            # Clear existing data
-            for item in self.stock_table.get_children():
-                self.stock_table.delete(item)
+            rows = []
 
             # Load bills data
             self.bills_ref = db.reference('bills')
 
             if not self.bills_data:
+                self.stock_table_view.set_rows(rows)
                 self.stock_table_status.config(text="❌ No bills data found!")
                 return
 
@@ -5307,14 +8056,14 @@ class ModernInvoiceApp:
             for index, (product_name, stats) in enumerate(display_data.items()):
                 tags = ('evenrow',) if index % 2 == 0 else ('oddrow',)
                 
-                self.stock_table.insert("", "end", values=(
+                rows.append(((
                     product_name,
                     stats['total_cases'],
                     stats['per_case'],
                     stats['total_quantity'],
                     stats['unit_type'],
                     stats['delivery_count']
-                ), tags=tags)
+                ), tags))
 
                 # Update totals
                 total_products += 1
@@ -5322,6 +8071,8 @@ class ModernInvoiceApp:
                 total_cases += stats['total_cases']
                 total_quantity += stats['total_quantity']
 
+            self.stock_table_view.set_rows(rows)
+
             # Configure row colors
             self.stock_table.tag_configure('evenrow', background='#ffffff')
             self.stock_table.tag_configure('oddrow', background='#f0f8ff')
@@ -5336,39 +8087,13 @@ class ModernInvoiceApp:
             self.stock_table_status.config(text=f"❌ Error loading stock report: {str(e)}")
 
     def calculate_product_delivery_counts(self):
-        """Calculate delivery counts for all products"""
-        product_stats = {}
-
-        for bill_no, bill_info in self.bills_data.items():
-            items = bill_info.get('items', [])
-            
-            for item in items:
-                if len(item) >= 7:  # Ensure item has required data
-                    product_name = item[1]  # Product Name
-                    no_of_case = item[2]    # No. of Case
-                    per_case = item[3]      # Per Case
-                    quantity = item[4]      # Quantity
-                    unit_type = item[6]     # Unit Type
-
-                    # Initialize product in stats if not exists
-                    if product_name not in product_stats:
-                        product_stats[product_name] = {
-                            'total_cases': 0,
-                            'per_case': per_case,
-                            'total_quantity': 0,
-                            'unit_type': unit_type,
-                            'delivery_count': 0
-                        }
-
-                    # Update statistics
-                    try:
-                        product_stats[product_name]['total_cases'] += int(no_of_case) if no_of_case else 0
-                        product_stats[product_name]['total_quantity'] += int(quantity.split()[0]) if quantity else 0
-                        product_stats[product_name]['delivery_count'] += 1
-                    except (ValueError, IndexError):
-                        continue
+        """Calculate delivery counts for all products (cached until bills change)"""
+        if self.stock_aggregator is None:
+            self.stock_aggregator = StockAggregator()
+            for bill_no in self.bills_data:
+                self.stock_aggregator.set_bill(bill_no, self.get_line_items(bill_no))
 
-        return product_stats
+        return self.stock_aggregator.totals()
 
     def update_summary_cards(self, total_products, total_deliveries, total_cases, total_quantity):
         """Update the summary cards with current statistics"""
@@ -5390,22 +8115,20 @@ class ModernInvoiceApp:
                 self.summary_cards['total_quantity'].value_label.config(text=f"{total_quantity:,}")
 
     def filter_stock_report(self, event=None):
-        """Filter stock report based on search term"""
+        """Filter stock report based on search term (debounced, runs in background)"""
         search_term = self.stock_search_entry.get().lower()
-        
-        if not search_term:
-            self.populate_stock_report()
-            return
-        
-        # Calculate fresh statistics
-        product_stats = self.calculate_product_delivery_counts()
-        
-        filtered_data = {}
-        for product_name, stats in product_stats.items():
-            if search_term in product_name.lower():
-                filtered_data[product_name] = stats
-        
-        self.populate_stock_report(filtered_data)
+
+        def compute():
+            if not search_term:
+                return None
+            product_stats = self.calculate_product_delivery_counts()
+            return {
+                product_name: stats
+                for product_name, stats in product_stats.items()
+                if search_term in product_name.lower()
+            }
+
+        self.search_scheduler.submit("stock", compute, self.populate_stock_report)
 
     def refresh_stock_report(self, event=None):
         """Refresh the stock report"""
@@ -5659,24 +8382,8 @@ class ModernInvoiceApp:
     def create_gui_compact(self, parent):
         """Create compact billing GUI that matches the user-friendly layout"""
         # Ensure customer_names and product_names are initialized
-        if not hasattr(self, 'customer_names') or not self.customer_names:
-            self.customer_names = []
-            for key, pdata in self.party_data.items():
-                name = (
-                    pdata.get('Customer Name') or 
-                    pdata.get('Customer_Name') or 
-                    pdata.get('customer_name') or
-                    pdata.get('Customer  Name') or
-                    pdata.get('Customer name')
-                )
-                if name:
-                    self.customer_names.append(name)
-                else:
-                    print(f"⚠️ Missing Customer Name in party_data entry: {key}")
-
-        
-        if not hasattr(self, 'product_names') or not self.product_names:
-            self.product_names = [self.product_data[key]['Product Name'] for key in self.product_data.keys()]
+        if not self.customer_names or not self.product_names:
+            self.rebuild_name_lists()
 
         # Header - Centered "Estimate"
         header_label = tk.Label(parent, text="Tax Invoice", font=("Arial", 16, "bold"), 
@@ -6082,20 +8789,18 @@ class ModernInvoiceApp:
         """Modern version of fill_product_details"""
         selected_product_name = self.product_name_combobox.get()
         for key, value in self.product_data.items():
-            # Handle both field name formats
-            product_name = value.get('Product_Name') or value.get('Product Name')
-            if product_name == selected_product_name:
+            if value["Product_Name"] == selected_product_name:
                 self.no_of_case_entry.delete(0, tk.END)
-                self.no_of_case_entry.insert(0, value.get('No_of_Case') or value.get('No. of Case', ''))
+                self.no_of_case_entry.insert(0, value["No_of_Case"])
                 self.per_case_entry.delete(0, tk.END)
-                self.per_case_entry.insert(0, value.get('Per_Case') or value.get('Per Case', ''))
-                self.unit_type_combobox.set(value.get('Unit_Type') or value.get('Unit Type', ''))
-                self.rate.set(value.get('Selling_Price') or value.get('Selling Price', ''))
+                self.per_case_entry.insert(0, value["Per_Case"])
+                self.unit_type_combobox.set(value["Unit_Type"])
+                self.rate.set(value["Selling_Price"])
                 self.per_entry.delete(0, tk.END)
-                self.per_entry.insert(0, value.get('Per', 0))
+                self.per_entry.insert(0, value["Per"] or 0)
                 self.quantity_entry.delete(0, tk.END)
-                self.quantity_entry.insert(0, value.get('Quantity', ''))
-                self.discount.set(value.get('Discount', ''))
+                self.quantity_entry.insert(0, value["Quantity"])
+                self.discount.set(value["Discount"])
                 break
 
     def load_selected_item(self, event):
@@ -6249,6 +8954,7 @@ class ModernInvoiceApp:
             clean_agent_name = re.sub(r'[^\w\-_]', '', agent_name.replace(" ", "_"))
             
             # 🆕 ADD THIS: Get the year from bill date
+            bill_date_obj = None
             try:
                 # Parse the bill date to get year
                 bill_date_obj = parse_date_flexible(self.bill_date.get())
@@ -6314,376 +9020,35 @@ class ModernInvoiceApp:
             # Generate the PDF file name with new format: CustomerName_BillNo_Date
             pdf_file_name = os.path.join(invoice_bill_dir, f"{clean_customer_name}_{padded_bill_no}_{timestamp}.pdf")
 
-            # Create PDF object
-            pdf = FPDF()
-            pdf.add_page()
-            pdf.set_left_margin(15)
-            pdf.set_right_margin(15)
-
-            # Set font for the entire document
-            pdf.set_font("Arial", "B", 9)
-            row_height = 5
-            
-            # Function to add header to every page
-            def add_header():
-                try:
-                    # Add logo on the left
-                    pdf.image("logo.png", x=6, y=1, w=27)
-                except:
-                    # If logo not found, continue without it
-                    pass
-
-                # Move to the right for the title
-                pdf.set_xy(35, 10)
-
-                if self.selected_office == "A1":
-                    pdf.cell(0, row_height, "ANGEL PYROTECH                             ", ln=True, align="C")
-                    # Address details
-                    pdf.set_x(35)
-                    pdf.cell(0, row_height, "D NO 3/89 3/89/1 TO 3/89/11 ONDIPULINAIKANOOR                         ", ln=True, align="C")
-                    pdf.set_x(40)
-                    pdf.cell(0, row_height, "ONDIPULINAIKANOOR VILLAGE TAMILNADU 626119                                ", ln=True, align="C")
-
-                    # Add Title.png to the top-right corner
-                    try:
-                        title_img_width = 50
-                        title_img_height = 20
-                        page_width = pdf.w
-                        image_x = page_width - title_img_width - 6
-                        image_y = 1
-                        pdf.image("Title.png", x=image_x, y=image_y, w=title_img_width, h=title_img_height)
-                    except:
-                        pass
-
-                    # Add the "Glory To God" slogan at the top-center
-                    pdf.set_font("Arial", "I", 8)
-                    slogan_text = "Glory To God                                                                           "
-                    text_width = pdf.get_string_width(slogan_text)
-                    center_x = (page_width - text_width) / 2
-                    pdf.set_xy(center_x, 0)
-                    pdf.cell(0, 10, slogan_text, ln=True, align='C')
-
-                    # Move down and add "TAX INVOICE" centered
-                    pdf.set_font("Arial", "B", 9)
-                    pdf.set_xy(15, 30)
-                    pdf.cell(0, row_height, "TAX INVOICE", ln=True, align="C")
-
-                    # GSTIN and HSN Code in the same row
-                    pdf.set_xy(10, 26)
-                    pdf.cell(90, 4, "GSTIN: 33ABRFA4846J1Z3", align="L")
-                    pdf.set_xy(110, 26)
-                    pdf.cell(90, 4, "HSN CODE: 36041000", align="R")
-            
-                elif self.selected_office == "A2":
-                    pdf.cell(0, row_height, "ANGEL FIREWORKS INDUSTRIES                             ", ln=True, align="C")
-                    # Address details
-                    pdf.set_x(35)
-                    pdf.cell(0, row_height, "FACTORY AT:O.KOVILPATTI,2/2204/W,DEVINAGAR                         ", ln=True, align="C")
-                    pdf.set_x(40)
-                    pdf.cell(0, row_height, "SIVAKASI-626123                                ", ln=True, align="C")
-
-                    # Add Title.png to the top-right corner
-                    try:
-                        title_img_width = 50
-                        title_img_height = 20
-                        page_width = pdf.w
-                        image_x = page_width - title_img_width - 6
-                        image_y = 1
-                        pdf.image("Title.png", x=image_x, y=image_y, w=title_img_width, h=title_img_height)
-                    except:
-                        pass
-
-                    # Add the "Glory To God" slogan at the top-center
-                    pdf.set_font("Arial", "I", 8)
-                    slogan_text = "Glory To God                                                                           "
-                    text_width = pdf.get_string_width(slogan_text)
-                    center_x = (page_width - text_width) / 2
-                    pdf.set_xy(center_x, 0)
-                    pdf.cell(0, 10, slogan_text, ln=True, align='C')
-
-                    # Move down and add "TAX INVOICE" centered
-                    pdf.set_font("Arial", "B", 9)
-                    pdf.set_xy(15, 30)
-                    pdf.cell(0, row_height, "TAX INVOICE", ln=True, align="C")
-
-                    # GSTIN and HSN Code in the same row
-                    pdf.set_xy(10, 26)
-                    pdf.cell(90, 4, "GSTIN: 33AARFA9673N2ZL", align="L")
-                    pdf.set_xy(110, 26)
-                    pdf.cell(90, 4, "HSN CODE: 36041000", align="R")
-
-                elif self.selected_office == "A3":
-                    pdf.cell(0, row_height, "ANGEL FIREWORKS FACTORY                             ", ln=True, align="C")
-                    # Address details
-                    pdf.set_x(35)
-                    pdf.cell(0, row_height, "FACTORY AT:O.KOVILPATTI,2/2204/X,DEVINAGAR                         ", ln=True, align="C")
-                    pdf.set_x(40)
-                    pdf.cell(0, row_height, "VIRUTHUNAGAR-626123                                ", ln=True, align="C")
-
-                    # Add Title.png to the top-right corner
-                    try:
-                        title_img_width = 50
-                        title_img_height = 20
-                        page_width = pdf.w
-                        image_x = page_width - title_img_width - 6
-                        image_y = 1
-                        pdf.image("Title.png", x=image_x, y=image_y, w=title_img_width, h=title_img_height)
-                    except:
-                        pass
-
-                    # Add the "Glory To God" slogan at the top-center
-                    pdf.set_font("Arial", "I", 8)
-                    slogan_text = "Glory To God                                                                           "
-                    text_width = pdf.get_string_width(slogan_text)
-                    center_x = (page_width - text_width) / 2
-                    pdf.set_xy(center_x, 0)
-                    pdf.cell(0, 10, slogan_text, ln=True, align='C')
-
-                    # Move down and add "TAX INVOICE" centered
-                    pdf.set_font("Arial", "B", 9)
-                    pdf.set_xy(15, 30)
-                    pdf.cell(0, row_height, "TAX INVOICE", ln=True, align="C")
-
-                    # GSTIN and HSN Code in the same row
-                    pdf.set_xy(10, 26)
-                    pdf.cell(90, 4, "GSTIN: 33ABKFA4066F1ZN", align="L")
-                    pdf.set_xy(110, 26)
-                    pdf.cell(90, 4, "HSN CODE: 36041000", align="R")
-
-                # Draw a line below GSTIN and HSN Code
-                pdf.ln()
-                pdf.line(10, 35, 200, 35)
-
-            # Add header to the first page
-            add_header()
-            
-            # Customer Information (Left) and Bill Details (Right)
-            pdf.set_font("Arial", "B", 9)
-            pdf.set_xy(10, 36)
-            pdf.cell(90, row_height, "Customer Information", ln=False, align="L")
-            pdf.set_xy(110, 36)
-            pdf.cell(90, row_height, "Bill Details", ln=False, align="L")
-            
             # Ensure customer details are updated before generating the PDF
             self.fill_customer_details()
 
-            # Customer Details (Left Side)
-            pdf.set_font("Arial", "", 9)
-            pdf.set_xy(10, 42)
-            pdf.cell(90, row_height, f"To           :      {self.to_name.get()}", ln=True, align="L")
-        
-            address = self.to_address.get()
-            pdf.set_font("Arial", size=9)
-
-            # First line: "Address : " (no line break)
-            pdf.set_xy(10, 48)
-            pdf.cell(20, 3, "Address  : ", ln=False, align="L")
-
-            # Let FPDF handle wrapping (no manual splitting)
-            pdf.multi_cell(
-                w=80,  # Width after "Address : " (adjust as needed)
-                h=3,   # Line height
-                txt=address,
-                align="L",
-                border=0
-            )
-
-            # Bill Details (Right Side)
-            pdf.set_xy(110, 44)
-            pdf.cell(90, 0, f"Bill NO             :   {self.bill_no}", ln=True, align="L")
-            pdf.set_xy(110, 48)
-            pdf.cell(90, 0, f"Bill DATE         :  {self.bill_date.get()}", ln=True, align="L")
-            pdf.set_xy(110, 52)
-            pdf.cell(90, 0, f"L.R. NUMBER :   {self.lr_number.get()}", ln=True, align="L")
-            
-            pdf.set_xy(110, 56)
-            pdf.cell(90, 0, f"GSTIN             :   {self.to_gstin.get()}", ln=True, align="L")
-            
-
-            # Draw a vertical line between Customer Information and Bill Details
-            pdf.set_line_width(0.4)
-            pdf.line(105, 35, 105, 60)
-
-            # Final Line after Customer & Bill Details
-            pdf.line(10, 60, 200, 60)
-
-            # Product Table
-            pdf.ln(3)
-            pdf.set_x(10)
-            pdf.set_font("Arial", "B", 10)
-            pdf.cell(0, 10, "Product Details:", ln=True, align='L')
-
-            pdf.set_font("Arial", "B", 10)
-
-            # Table headers
-            headers = ["S.No", "Product Name", "Case", "Per Case", "Quantity", "Rate", "Per", "Discount", "Amount"]
-            col_widths = [10, 53, 10, 17, 15, 20, 19, 16, 30]
-
-            # Set line width to make borders thinner
-            pdf.set_line_width(0.4)
-
-            # Draw header row
-            pdf.set_x(10)
-            for i, header in enumerate(headers):
-                pdf.cell(col_widths[i], 6, header, border=1, align='C')
-            
-            pdf.set_font("Arial", "", 9)
-                
-            actual_rows = list(self.table.get_children())
-            product_count = len(actual_rows)
-            MAX_VISIBLE_ROWS = 22
-            row_height = 6  # Fixed row height
-
-            # ==== 1. Draw Table TOP border ====
-            pdf.set_x(10)
-            pdf.cell(sum(col_widths), row_height, "", border='T', ln=1)
-
-            # ==== 2. Draw Product Rows (NO horizontal lines) ====
-            for i, item in enumerate(actual_rows, 1):
-                values = self.table.item(item, "values")
-                
-                pdf.set_x(10)
-                # S.No column (left and right border)
-                pdf.cell(col_widths[0], row_height, str(i), border='LR', align='C')
-                
-                # Middle columns (right border only)
-                for j, value in enumerate(values[1:]):
-                    if j == 5: continue  # Skip Unit Type column
-                    adjusted_index = j - 1 if j > 5 else j
-                    
-                    if adjusted_index == 6:  # Discount column
-                        match = re.search(r"(\d+)%", str(values[8]))
-                        discount = match.group(1) if match else "0"
-                        pdf.cell(col_widths[adjusted_index+1], row_height, f"{discount}%", border='R', align='C')
-                    else:
-                        pdf.cell(col_widths[adjusted_index+1], row_height, str(value), border='R', align='C')
-                
-                pdf.ln(row_height)
-
-            # ==== 3. Fill remaining space with blank rows ====
-            if product_count < MAX_VISIBLE_ROWS:
-                for _ in range(MAX_VISIBLE_ROWS - product_count):
-                    pdf.set_x(10)
-                    pdf.cell(col_widths[0], row_height, "", border='LR')
-                    for width in col_widths[1:-1]:
-                        pdf.cell(width, row_height, "", border='R')
-                    pdf.cell(col_widths[-1], row_height, "", border='R')
-                    pdf.ln(row_height)
-
-            # ==== 4. End Table (No Bottom Border + No Extra Space) ====
-            pdf.set_x(10)
-            pdf.cell(sum(col_widths), row_height, "", border=0)
-
-            # Amount Section
-            def check_page_break(pdf, content_height):
-                # Check if adding content will exceed the bottom margin
-                if pdf.get_y() + content_height > pdf.h - pdf.b_margin:
-                    pdf.add_page()  
-                    return pdf.get_y()  
-                return pdf.get_y()  
-            
-            rect_y = check_page_break(pdf, 35)  
-
-            pdf.set_line_width(0.4)
-            rect_y = pdf.get_y()
-            new_x = 10  
-            new_height = 38  
-
-            # Check if content will exceed the page and move to the next page
-            rect_y = check_page_break(pdf, new_height)
-
-            pdf.rect(new_x, rect_y, 190, new_height)
-            pdf.line(new_x + 90, rect_y, new_x + 90, rect_y + new_height)
-
-            # Calculate total number of cases (1st index of the table)
-            total_no_of_cases = sum(int(self.table.item(item, "values")[2]) for item in self.table.get_children())
-
-            # Check and move the content to the next page if needed
-            rect_y = check_page_break(pdf, 10)
-
-            # Left Side (From, To, Document Through)
-            pdf.set_xy(20, rect_y + 2)
-            pdf.set_x(20)
-            pdf.set_font("Arial", "B", 9)
-            pdf.cell(50, 3, f"No. of Cases          {total_no_of_cases}", ln=True, align="L")
-
-            pdf.set_font("Arial", "", 9)
-            if pdf.get_y() + 10 > pdf.h - pdf.b_margin:  
-                pdf.add_page()  
-                rect_y = pdf.get_y()  
-
-            pdf.set_x(20)
-            pdf.cell(50, 5, f"From        : {self.from_.get()}", ln=True, align="L")
-
-            if pdf.get_y() + 10 > pdf.h - pdf.b_margin:  
-                pdf.add_page()  
-                rect_y = pdf.get_y()  
-
-            pdf.set_x(20)
-            pdf.cell(50, 3, f"To            : {self.to_.get()}", ln=True, align="L")
-
-            if pdf.get_y() + 10 > pdf.h - pdf.b_margin:  
-                pdf.add_page()  
-                rect_y = pdf.get_y()  
-
-            pdf.set_x(20)
-            pdf.cell(50, 3, f"Through   : {self.document_through.get()}", ln=True, align="L")
-
-            # Adding space before footer text
-            pdf.ln(5)
-            if pdf.get_y() + 10 > pdf.h - pdf.b_margin:  
-                        pdf.add_page()  
-                        rect_y = pdf.get_y()  
-            # Footer Note
-            pdf.set_font("Arial", "I", 9)
-            footer_text = [
-                "Note:",
-                "1. Company not responsible for transit loss/damage",
-                "2. subject to Sivakasi jurisdiction. E.& O.E"
-            ]
-
-            # Display footer note
-            for line in footer_text:
-                pdf.cell(0, 3, line, ln=True, align="L")
-
-            pdf.set_font("Arial", "", 9)
-
-            # Calculate GOODS VALUE (Sum of all amounts in the 9th index of the table)
-            goods_value = sum(float(self.table.item(item, "values")[9]) for item in self.table.get_children())
-            special_discount = sum(float(self.table.item(item, "values")[8].split('(')[0]) for item in self.table.get_children())
-            sub_total = goods_value - special_discount
-            packing_charge_percentage = float(self.packing_charge.get())
-            packing_charges = (sub_total * packing_charge_percentage) / 100
-            sub_total_with_packing = sub_total + packing_charges
-            mahamai_percentage = 0.3  # Fixed 0.3%
-            mahamai_charges = (sub_total_with_packing * mahamai_percentage) / 100
-            taxable_value = sub_total_with_packing + mahamai_charges
-            gst_percentage = float(self.gst_percentage.get())
-            if self.region.get() == "South":
-                cgst_amount = (taxable_value * (gst_percentage / 2)) / 100
-                sgst_amount = (taxable_value * (gst_percentage / 2)) / 100
-                igst_amount = 0
-            else:
-                cgst_amount = 0
-                sgst_amount = 0
-                igst_amount = (taxable_value * gst_percentage) / 100
-
-            def custom_round(value):
-                if value % 1 >= 0.5:
-                    return int(value) + 1  
-                else:
-                    return int(value)  
-                
-            # Calculate the unrounded net amount
-            unrounded_net_amount = taxable_value + cgst_amount + sgst_amount + igst_amount
-
-            # Calculate the rounded net amount using custom_round
-            rounded_net_amount = custom_round(unrounded_net_amount)
-
-            # Calculate the round off amount
-            round_off_amount = rounded_net_amount - unrounded_net_amount
-            
-            net_amount = custom_round(taxable_value + cgst_amount + sgst_amount + igst_amount)
+            # Lay out the invoice from the same record that is saved to Firebase
+            invoice = {
+                "bill_no": self.bill_no,
+                "bill_date": self.bill_date.get(),
+                "customer_name": self.to_name.get(),
+                "address": self.to_address.get(),
+                "agent_name": self.agent_name.get(),
+                "gstin": self.to_gstin.get(),
+                "lr_number": self.lr_number.get(),
+                "from_": self.from_.get(),
+                "to_": self.to_.get(),
+                "document_through": self.document_through.get(),
+                "region": self.region.get(),
+                "gst_percentage": float(self.gst_percentage.get()),
+                "packing_charge": float(self.packing_charge.get()),
+                "items": [self.table.item(item, "values") for item in self.table.get_children()],
+                "office_type": self.selected_office,
+            }
+            totals = render_invoice_pdf(invoice, pdf_file_name)
+            self.pdf_index.add_file(pdf_file_name)
+            line_items = bill_line_items(invoice)
+            goods_value = totals["goods_value"]
+            special_discount = totals["special_discount"]
+            sub_total = totals["sub_total"]
+            packing_charges = totals["packing_charges"]
+            net_amount = totals["net_amount"]
 
             # Update the fields in the GUI
             self.before_discount_amount_field.set(round(goods_value, 2))  
@@ -6692,98 +9057,6 @@ class ModernInvoiceApp:
             self.Packing_Amount.set(round(packing_charges, 2))  
             self.total_amount.set(round(net_amount, 2))  
 
-            # Function to round the value to the nearest integer
-            def format_value(value):
-                return f"{value:.2f}"  
-                
-            
-            pdf.set_xy(110, rect_y+2)
-            pdf.cell(50, 3, "             GOODS VALUE", ln=False, align="L")
-            pdf.cell(20, 3, f"{format_value(goods_value)}", ln=True, align="R")
-
-            pdf.set_x(110)
-            pdf.cell(50, 3, "    SPECIAL DISCOUNT", ln=False, align="L")
-            pdf.cell(20, 3, f"-{format_value(special_discount)}", ln=True, align="R")
-
-            pdf.set_x(110)
-            pdf.cell(50, 3, "                  SUB TOTAL", ln=False, align="L")
-            pdf.cell(20, 3, f"{format_value(sub_total)}", ln=True, align="R")
-
-            pdf.set_x(100)
-            pdf.cell(50, 3, f"PACKING CHARGES @ {packing_charge_percentage}%", ln=False, align="L")
-            pdf.cell(30, 3, f"{format_value(packing_charges)}", ln=True, align="R")
-
-            pdf.set_x(110)
-            pdf.cell(50, 3, "                   SUB TOTAL", ln=False, align="L")
-            pdf.cell(20, 3, f"{format_value(sub_total_with_packing)}", ln=True, align="R")
-
-            pdf.set_x(100)
-            pdf.cell(50, 3, f"                  MAHAMAI @ {mahamai_percentage}%", ln=False, align="L")
-            pdf.cell(30, 3, f"{format_value(mahamai_charges)}", ln=True, align="R")
-
-            pdf.set_x(110)
-            pdf.cell(50, 3, "          TAXABLE VALUE", ln=False, align="L")
-            pdf.cell(20, 3, f"{format_value(taxable_value)}", ln=True, align="R")
-
-            if self.region.get() == "South":
-                pdf.set_x(110)
-                pdf.cell(50, 3, "                     CGST (9%)", ln=False, align="L")
-                pdf.cell(20, 3, f"{format_value(cgst_amount)}", ln=True, align="R")
-
-                pdf.set_x(110)
-                pdf.cell(50, 3, "                     SGST (9%)", ln=False, align="L")
-                pdf.cell(20, 3, f"{format_value(sgst_amount)}", ln=True, align="R")
-            else:
-                pdf.set_x(110)
-                pdf.cell(50, 3, "                     IGST (18%)", ln=False, align="L")
-                pdf.cell(20, 3, f"{format_value(igst_amount)}", ln=True, align="R")
-
-            # Add the Round Off section to the PDF
-            pdf.set_x(110)
-            pdf.cell(50, 3, "                  ROUND OFF", ln=False, align="L")
-            pdf.cell(20, 3, f"{round_off_amount:.2f}", ln=True, align="R")
-
-            pdf.set_x(110)
-            pdf.set_font("Arial", "B", 10)
-            pdf.cell(50, 7, "           NET AMOUNT", ln=False, align="L")
-            pdf.cell(20, 7, f"{format_value(net_amount)}", ln=True, align="R")
-
-            if pdf.get_y() + 10 > pdf.h - pdf.b_margin:
-                pdf.add_page()
-                rect_y = pdf.get_y()
-
-            # Amount in words
-            pdf.ln(5)
-            pdf.set_line_width(0.4)
-            rect_y = pdf.get_y()
-            new_x = 10
-            width = 190
-            height = 5
-            pdf.rect(new_x, rect_y, width, height)
-            pdf.set_xy(new_x + 5, rect_y - 2)
-            pdf.set_font("Arial", "I", 9)
-            amount_in_words = self.number_to_words(self.total_amount.get())
-            pdf.cell(0, 10, f"Amount in Words: {amount_in_words}", ln=True, align="L")
-
-            # Check for page break again after the NET AMOUNT
-            rect_y = check_page_break(pdf, 10)
-            
-            # Set the y-coordinate to a specific value to move up
-            pdf.set_y(pdf.get_y() - 3)
-
-            # Determine the company name based on the selected office
-            company_name = {
-                "A1": "ANGEL PYROTECH",
-                "A2": "Angel Fireworks Industries",
-                "A3": "Angel Fireworks Factory"
-            }.get(self.selected_office, "ANGEL PYROTECH")
-
-            pdf.cell(0, 10, f"                                                                                                                For {company_name}", ln=True, align="C")
-            pdf.cell(0, 10, "                                                                                                                Authorized Signature", ln=True, align="C")
-
-            # Save the PDF file
-            pdf.output(pdf_file_name)
-
             # Show success message with modern design
             self.show_status_message("✅ PDF invoice generated successfully!")
             messagebox.showinfo("✅ Success", 
@@ -6799,6 +9072,7 @@ class ModernInvoiceApp:
             bill_details = {
                 "bill_no": self.bill_no,
                 "bill_date": self.bill_date.get(),
+                "bill_date_ordinal": bill_date_obj.toordinal() if bill_date_obj else None,
                 "pdf_file_name": relative_pdf_path, 
                 "customer_name": self.to_name.get(),
                 "address": self.to_address.get(),
@@ -6811,10 +9085,11 @@ class ModernInvoiceApp:
                 "region": self.region.get(),
                 "gst_percentage": float(self.gst_percentage.get()),  # ✅ Convert to float
                 "packing_charge": float(self.packing_charge.get()),  # ✅ Convert to float
-                "no_of_cases": sum(int(self.table.item(item, "values")[2]) for item in self.table.get_children()),
+                "no_of_cases": totals["no_of_cases"],
                 "net_amount": float(self.total_amount.get()),  # ✅ Convert to float
                 "payment_status": "Pending",
                 "items": [self.table.item(item, "values") for item in self.table.get_children()],
+                "line_items": [line.to_dict() for line in line_items],
                 # Store RELATIVE path from Documents folder
                 "pdf_file_name": os.path.relpath(pdf_file_name, os.path.join(os.path.expanduser("~"), "Documents")),
                 "cgst_amount": float(self.cgst.get()),  # ✅ Convert to float
@@ -6835,10 +9110,13 @@ class ModernInvoiceApp:
             
             
             # SAVE ONLY THIS ONE BILL INTO FIREBASE UNDER ITS BILL NUMBER
-            self.bills_ref.child(str(self.bill_no)).set(bill_details)
+            self.write_child(self.bills_ref, self.bill_no, bill_details)
 
-            # REFRESH LOCAL COPY FROM FIREBASE
-            self.bills_data = self.load_data(self.bills_ref)
+            # Write-through: keep the saved bill in memory instead of re-downloading
+            # every bill, then let a background pass pick up bills saved elsewhere
+            self.bills_data[str(self.bill_no)] = bill_details
+            self.bills_changed([str(self.bill_no)])
+            self.schedule_reconcile(["bills_data"])
 
             print("🔥 Bill saved successfully to Firebase!")
 
@@ -6878,11 +9156,7 @@ class ModernInvoiceApp:
 
     def number_to_words(self, num):
         """Convert number to words with enhanced formatting"""
-        try:
-            words = num2words(num, lang='en_IN').title() + " Rupees Only"
-            return words
-        except Exception as e:
-            return f"Amount: ₹{num:.2f}"
+        return amount_in_words(num)
 
     def get_pdf_path(self, relative_path):
         """
@@ -7531,6 +9805,9 @@ class ModernInvoiceApp:
         h_scrollbar = ttk.Scrollbar(table_main, orient="horizontal", command=self.bill_table.xview)
         self.bill_table.configure(yscrollcommand=v_scrollbar.set, xscrollcommand=h_scrollbar.set)
 
+        # Only the visible rows are created as Tk items
+        self.bill_table_view = VirtualTable(self.bill_table, v_scrollbar)
+
         # Grid layout for table and scrollbars
         self.bill_table.grid(row=0, column=0, sticky="nsew")
         v_scrollbar.grid(row=0, column=1, sticky="ns")
@@ -7678,16 +9955,14 @@ class ModernInvoiceApp:
     def populate_bill_table(self, filtered_data=None):
         """Populate the bill table with data from bills.json"""
         try:
-            # Clear existing data
-            for item in self.bill_table.get_children():
-                self.bill_table.delete(item)
+            rows = []
             
             # Use provided data or all bills data
             bills_data = filtered_data if filtered_data is not None else self.bills_data
             
-            # Calculate statistics
+            # Calculate statistics (whole history comes from the running totals)
             total_bills = len(bills_data)
-            total_amount = 0
+            total_amount = self.bill_aggregates.get("all")["net_amount"] if filtered_data is None else 0
             
             # Insert data with alternating row colors
             for index, (bill_no, bill_info) in enumerate(bills_data.items()):
@@ -7706,9 +9981,10 @@ class ModernInvoiceApp:
                 office_display = {"A1": "AP", "A2": "AFI", "A3": "AFF"}.get(bill_office, "AP")
                 
                 # Update statistics
-                total_amount += net_amount
+                if filtered_data is not None:
+                    total_amount += net_amount
                 
-                self.bill_table.insert("", "end", values=(
+                rows.append(((
                     bill_no,
                     bill_date,
                     customer_name,
@@ -7717,7 +9993,9 @@ class ModernInvoiceApp:
                     status,
                     items_count,
                     office_display  # ✅ ADDED Office column
-                ), tags=tags)
+                ), tags))
+
+            self.bill_table_view.set_rows(rows)
 
             # Configure row colors
             self.bill_table.tag_configure('evenrow', background='#ffffff')
@@ -7725,7 +10003,7 @@ class ModernInvoiceApp:
             
             # Update status
             if hasattr(self, 'bill_table_status'):
-                self.bill_table_status.config(text=f"📊 Total Bills: {total_bills} | Total Amount: ₹ 0")
+                self.bill_table_status.config(text=f"📊 Total Bills: {total_bills} | Total Amount: ₹{total_amount:,.2f}")
                 
         except Exception as e:
             print(f"Error populating bill table: {e}")
@@ -7736,63 +10014,55 @@ class ModernInvoiceApp:
         date_filter = self.date_filter_var.get()
         office_filter = self.office_filter_var.get()
         
-        filtered_data = {}
-        
-        for bill_no, bill_info in self.bills_data.items():
-            # Search term filter
-            matches_search = (
-                search_term in bill_no.lower() or
-                search_term in bill_info.get('customer_name', '').lower() or
-                search_term in bill_info.get('agent_name', '').lower()
-            )
-            
-            if not matches_search:
-                continue
-                
-            # Date filter
-            if date_filter != "All":
-                bill_date_str = bill_info.get('bill_date', '')
-                if bill_date_str:
-                    try:
-                        bill_date = parse_date_flexible(bill_date_str)
-                        today = datetime.now()
-                        
-                        if date_filter == "Today":
-                            if bill_date.date() != today.date():
-                                continue
-                        elif date_filter == "This Week":
-                            start_of_week = today - timedelta(days=today.weekday())
-                            if bill_date < start_of_week:
-                                continue
-                        elif date_filter == "This Month":
-                            if bill_date.month != today.month or bill_date.year != today.year:
-                                continue
-                        elif date_filter == "Last Month":
-                            first_day_this_month = today.replace(day=1)
-                            last_month = first_day_this_month - timedelta(days=1)
-                            if bill_date.month != last_month.month or bill_date.year != last_month.year:
-                                continue
-                    except Exception:
-                        continue
-            
-            # ✅ ADDED: Office Filter
-            if office_filter != "All":
-                bill_office = self.get_bill_office(bill_no)
-                office_prefix_map = {"AP": "AP", "AFI": "AFI", "AFF": "AFF"}
-                
-                if office_filter == "Current":
-                    # Show only bills from current office
-                    current_prefix = self.get_office_prefix(self.selected_office)
-                    if not bill_no.startswith(current_prefix):
-                        continue
-                else:
-                    # Show bills from specific office
-                    if not bill_no.startswith(office_filter):
-                        continue
-                    
-            filtered_data[bill_no] = bill_info
-        
-        self.populate_bill_table(filtered_data)
+        # Debounced; the index query runs on a worker thread
+        self.search_scheduler.submit(
+            "bills",
+            lambda: self.query_bills(search_term, date_filter, office_filter),
+            self.populate_bill_table
+        )
+
+    def get_date_filter_range(self, date_filter):
+        """Return (start, end) dates for the quick date filters, None = open end"""
+        today = datetime.now().date()
+        if date_filter == "Today":
+            return today, today
+        if date_filter == "This Week":
+            return today - timedelta(days=today.weekday()), None
+        if date_filter == "This Month":
+            next_month = (today.replace(day=1) + timedelta(days=32)).replace(day=1)
+            return today.replace(day=1), next_month - timedelta(days=1)
+        if date_filter == "Last Month":
+            last_month_end = today.replace(day=1) - timedelta(days=1)
+            return last_month_end.replace(day=1), last_month_end
+        return None, None
+
+    def query_bills(self, search_term, date_filter="All", office_filter="All"):
+        """
+        Bills matching the search box, quick date filter and office filter,
+        answered from the bill index. Returns {bill_no: bill} in bills_data
+        order. Bills without a date pass the date filter, as they always have.
+        """
+        candidates = None
+
+        if office_filter != "All":
+            prefix = self.get_office_prefix(self.selected_office) if office_filter == "Current" else office_filter
+            candidates = set(self.bill_index.office(prefix))
+
+        if date_filter != "All":
+            start, end = self.get_date_filter_range(date_filter)
+            dated = self.bill_index.date_range(start, end, within=candidates)
+            undated = self.bill_index.undated if candidates is None else self.bill_index.undated & candidates
+            candidates = set(dated) | undated
+
+        if search_term:
+            matches = self.bill_index.numbers_containing(search_term)
+            matches |= self.bill_index.customers_containing(search_term)
+            matches |= self.bill_index.agents_containing(search_term)
+            candidates = matches if candidates is None else candidates & matches
+
+        if candidates is None:
+            return dict(self.bills_data)
+        return {b: self.bills_data[b] for b in self.bill_index.in_order(candidates) if b in self.bills_data}
 
     def edit_selected_bill(self):
         """Edit the selected bill with office validation"""
@@ -7976,7 +10246,8 @@ class ModernInvoiceApp:
             ):
                 if bill_no in self.bills_data:
                     del self.bills_data[bill_no]
-                    self.save_data(self.bills_ref, self.bills_data)
+                    self.bills_changed(deleted=[bill_no])
+                    self.save_data(self.bills_ref, self.bills_data, keys=[bill_no])
                     self.refresh_bill_list()
                     self.show_status_message(f"🗑️ Bill {bill_no} deleted successfully", "success")
 
@@ -8177,6 +10448,9 @@ class ModernInvoiceApp:
         h_scrollbar = ttk.Scrollbar(table_main, orient="horizontal", command=self.view_bill_table.xview)
         self.view_bill_table.configure(yscrollcommand=v_scrollbar.set, xscrollcommand=h_scrollbar.set)
 
+        # Only the visible rows are created as Tk items
+        self.view_bill_table_view = VirtualTable(self.view_bill_table, v_scrollbar)
+
         # Grid layout for table and scrollbars
         self.view_bill_table.grid(row=0, column=0, sticky="nsew")
         v_scrollbar.grid(row=0, column=1, sticky="ns")
@@ -8346,18 +10620,20 @@ class ModernInvoiceApp:
     def populate_view_bill_table(self, filtered_data=None):
         """Populate the view bill table with data"""
         try:
-            # Clear existing data
-            for item in self.view_bill_table.get_children():
-                self.view_bill_table.delete(item)
+            rows = []
             
             # Use provided data or all bills data
             bills_data = filtered_data if filtered_data is not None else self.bills_data
             
-            # Calculate statistics
+            # Calculate statistics (whole history comes from the running totals)
             total_bills = len(bills_data)
             total_revenue = 0
             total_items = 0
             paid_bills = 0
+            if filtered_data is None:
+                totals = self.bill_aggregates.get("all")
+                total_items = totals["items"]
+                paid_bills = totals["paid"]
             
             # Insert data with status-based coloring
             for index, (bill_no, bill_info) in enumerate(bills_data.items()):
@@ -8374,9 +10650,11 @@ class ModernInvoiceApp:
                 
                 # Update statistics
                 total_revenue += 0
-                total_items += items_count
+                if filtered_data is not None:
+                    total_items += items_count
+                    paid_bills += 1 if bill_info.get('payment_status') == "Paid" else 0
 
-                self.view_bill_table.insert("", "end", values=(
+                rows.append(((
                     bill_no,
                     bill_date,
                     customer_name,
@@ -8384,7 +10662,9 @@ class ModernInvoiceApp:
                     f"₹{net_amount:,.2f}",
                     items_count,
                     office_display  # ✅ ADDED Office column
-                ))
+                ), ()))
+
+            self.view_bill_table_view.set_rows(rows)
 
             # Update status and statistics
             if hasattr(self, 'view_bill_table_status'):
@@ -8413,62 +10693,12 @@ class ModernInvoiceApp:
         date_filter = self.view_date_filter_var.get()
         office_filter = self.view_office_filter_var.get()
         
-        filtered_data = {}
-        
-        for bill_no, bill_info in self.bills_data.items():
-            # Search term filter
-            matches_search = (
-                search_term in bill_no.lower() or
-                search_term in bill_info.get('customer_name', '').lower() or
-                search_term in bill_info.get('agent_name', '').lower()
-            )
-            
-            if not matches_search:
-                continue
-                
-            # Date filter
-            if date_filter != "All":
-                bill_date_str = bill_info.get('bill_date', '')
-                if bill_date_str:
-                    try:
-                        bill_date = parse_date_flexible(bill_date_str)
-                        today = datetime.now()
-                        
-                        if date_filter == "Today":
-                            if bill_date.date() != today.date():
-                                continue
-                        elif date_filter == "This Week":
-                            start_of_week = today - timedelta(days=today.weekday())
-                            if bill_date < start_of_week:
-                                continue
-                        elif date_filter == "This Month":
-                            if bill_date.month != today.month or bill_date.year != today.year:
-                                continue
-                        elif date_filter == "Last Month":
-                            first_day_this_month = today.replace(day=1)
-                            last_month = first_day_this_month - timedelta(days=1)
-                            if bill_date.month != last_month.month or bill_date.year != last_month.year:
-                                continue
-                    except Exception:
-                        continue
-            
-            # ✅ ADDED: Office Filter
-            if office_filter != "All":
-                bill_office = self.get_bill_office(bill_no)
-                
-                if office_filter == "Current":
-                    # Show only bills from current office
-                    current_prefix = self.get_office_prefix(self.selected_office)
-                    if not bill_no.startswith(current_prefix):
-                        continue
-                else:
-                    # Show bills from specific office
-                    if not bill_no.startswith(office_filter):
-                        continue
-                    
-            filtered_data[bill_no] = bill_info
-        
-        self.populate_view_bill_table(filtered_data)
+        # Debounced; the index query runs on a worker thread
+        self.search_scheduler.submit(
+            "view_bills",
+            lambda: self.query_bills(search_term, date_filter, office_filter),
+            self.populate_view_bill_table
+        )
 
     def refresh_view_bill_list(self):
         """Refresh the view bill list"""
@@ -8922,6 +11152,17 @@ class ModernInvoiceApp:
         )
         select_all_cb.pack(anchor="w", pady=5)
 
+        # Statements are rendered from the bill records; stored invoice PDFs are optional
+        self.attach_original_pdfs = tk.BooleanVar(value=False)
+        attach_cb = tk.Checkbutton(
+            left_selection_frame,
+            text="Attach original PDFs",
+            variable=self.attach_original_pdfs,
+            font=("Segoe UI", 10),
+            bg=self.colors['light_bg']
+        )
+        attach_cb.pack(anchor="w", pady=2)
+
         # Selection info
         self.customer_selection_info = tk.Label(
             left_selection_frame,
@@ -9004,10 +11245,7 @@ class ModernInvoiceApp:
                 typed = self.customer_combobox.get().strip().lower()
                 
                 # Generate filtered suggestions
-                if not typed:
-                    suggestions = self.customer_names
-                else:
-                    suggestions = [name for name in self.customer_names if typed.lower() in name.lower()]
+                suggestions = self.customer_suggest_index.search(typed, self.max_suggestions)
                 
                 # Update combobox dropdown values and open it
                 self.customer_combobox['values'] = suggestions
@@ -9020,10 +11258,7 @@ class ModernInvoiceApp:
                 typed = self.customer_combobox.get().strip().lower()
                 
                 # Generate filtered suggestions
-                if not typed:
-                    suggestions = self.customer_names
-                else:
-                    suggestions = [name for name in self.customer_names if typed.lower() in name.lower()]
+                suggestions = self.customer_suggest_index.search(typed, self.max_suggestions)
                 
                 # Only update the values, don't open dropdown
                 self.customer_combobox['values'] = suggestions
@@ -9154,21 +11389,14 @@ class ModernInvoiceApp:
         matching_bills = []
         total_amount = 0
 
-        for bill_no, bill in self.bills_data.items():
+        # Case insensitive partial match, answered by the bill index
+        for bill_no in self.bill_index.customers_containing(customer_name):
+            bill = self.bills_data[bill_no]
             bill_customer_name = bill.get("customer_name", "").strip()
-            
-            # Check customer name match (case insensitive partial match)
-            if customer_name.lower() not in bill_customer_name.lower():
-                continue
 
-            # Check if PDF exists
-            pdf_available = "❌ No"
+            # PDF availability is filled in by a background check once the rows are shown
             pdf_path = bill.get("pdf_file_name", "")
-            if pdf_path:
-                # Resolve PDF path
-                resolved_path = self.resolve_pdf_path_updated(pdf_path, bill_no)
-                if resolved_path and os.path.exists(resolved_path):
-                    pdf_available = "✅ Yes"
+            pdf_available = self.PDF_PENDING
 
             amount = float(bill.get("net_amount", 0))
             total_amount += amount
@@ -9190,7 +11418,7 @@ class ModernInvoiceApp:
             return
 
         # Sort by bill date (newest first)
-        matching_bills.sort(key=lambda x: (parse_date_flexible(x.get('bill_date')) or datetime.min), reverse=True)
+        matching_bills.sort(key=lambda x: self.bill_index.ordinal(x['bill_no']) or 0, reverse=True)
 
         # Populate table
         for bill in matching_bills:
@@ -9209,6 +11437,9 @@ class ModernInvoiceApp:
             bill['item_id'] = item_id
             self.customer_bills_data.append(bill)
 
+        self.check_pdfs_in_background("customer_statement", self.customer_bills_table, "PDF Available",
+                                      matching_bills)
+
         # Update selection info
         self.update_customer_selection_info()
 
@@ -9300,36 +11531,18 @@ class ModernInvoiceApp:
         self.selected_customer_bills.clear()
         self.select_all_customer.set(False)
 
-        # Collect filtered bills
+        # Collect filtered bills (newest first, straight from the date index)
         filtered_bills = []
         total_amount = 0
 
-        for bill_no, bill in self.bills_data.items():
+        matching = self.bill_index.customers_containing(customer_name)
+        for bill_no in self.bill_index.date_range(from_date, to_date, within=matching, newest_first=True):
+            bill = self.bills_data[bill_no]
             bill_customer_name = bill.get("customer_name", "").strip()
-            
-            # Check customer name match
-            if customer_name.lower() not in bill_customer_name.lower():
-                continue
-
-            # Check date range
-            try:
-                bill_date = parse_date_flexible(bill.get("bill_date", ""))
-                if not bill_date:
-                    # skip bills with unparsable dates when filtering by date range
-                    continue
-
-                if not (from_date <= bill_date <= to_date):
-                    continue
-            except ValueError:
-                continue
 
-            # Check if PDF exists
-            pdf_available = "❌ No"
+            # PDF availability is filled in by a background check once the rows are shown
             pdf_path = bill.get("pdf_file_name", "")
-            if pdf_path:
-                resolved_path = self.resolve_pdf_path_updated(pdf_path, bill_no)
-                if resolved_path and os.path.exists(resolved_path):
-                    pdf_available = "✅ Yes"
+            pdf_available = self.PDF_PENDING
 
             amount = float(bill.get("net_amount", 0))
             total_amount += amount
@@ -9350,9 +11563,6 @@ class ModernInvoiceApp:
             self.show_status_message("❌ No bills found for selected criteria")
             return
 
-        # Sort by bill date (newest first)
-        filtered_bills.sort(key=lambda x: datetime.strptime(x['bill_date'], "%d/%m/%Y"), reverse=True)
-
         # Populate table
         for bill in filtered_bills:
             item_id = self.customer_bills_table.insert("", "end", values=(
@@ -9369,6 +11579,9 @@ class ModernInvoiceApp:
             bill['item_id'] = item_id
             self.customer_bills_data.append(bill)
 
+        self.check_pdfs_in_background("customer_statement", self.customer_bills_table, "PDF Available",
+                                      filtered_bills)
+
         self.update_customer_selection_info()
         self.show_status_message(f"✅ Found {len(filtered_bills)} bills - Total: ₹{total_amount:,.2f}")
 
@@ -9493,28 +11706,15 @@ class ModernInvoiceApp:
         close_btn.pack(side=tk.LEFT, padx=5)
 
     def generate_customer_statement(self, event=None):
-        """Generate customer statement from selected bills - searches ALL office folders"""
+        """Generate customer statement from selected bills, rendered from the bill records"""
         if not self.selected_customer_bills:
             messagebox.showwarning("⚠️ Selection Required", "Please select at least one bill to generate statement.")
             return
 
         # Get selected bills data
-        selected_bills_data = []
-        total_amount = 0
-        pdfs_to_merge = []
-
-        for bill in self.customer_bills_data:
-            if bill['bill_no'] in self.selected_customer_bills:
-                selected_bills_data.append(bill)
-                total_amount += bill['amount']
-                
-                # Collect PDF paths for merging - searches ALL office folders
-                if bill['pdf_available'] == '✅ Yes' and bill['pdf_path']:
-                    resolved_path = self.resolve_pdf_path_updated(bill['pdf_path'], bill['bill_no'])
-                    if resolved_path and os.path.exists(resolved_path):
-                        pdfs_to_merge.append(resolved_path)
-                    else:
-                        print(f"DEBUG: ❌ Could not resolve PDF path for bill {bill['bill_no']}")
+        selected_bills_data = [bill for bill in self.customer_bills_data if bill['bill_no'] in self.selected_customer_bills]
+        total_amount = sum(bill['amount'] for bill in selected_bills_data)
+        pdfs_to_merge, originals_not_found = self.original_statement_pdfs(selected_bills_data)
 
         customer_name = self.customer_combobox.get().strip()
 
@@ -9524,7 +11724,7 @@ class ModernInvoiceApp:
         
         📊 Summary:
         • Bills to include: {len(selected_bills_data)}
-        • PDFs available: {len(pdfs_to_merge)}
+        • Original PDFs attached: {len(pdfs_to_merge)}
         • Total amount: ₹{total_amount:,.2f}
         
         Proceed with statement generation?
@@ -9534,19 +11734,6 @@ class ModernInvoiceApp:
             return
 
         try:
-            from PyPDF2 import PdfMerger
-            merger = PdfMerger()
-            merged_pdfs_count = 0
-
-            # Add available PDFs from ALL office folders
-            for pdf_path in pdfs_to_merge:
-                try:
-                    merger.append(pdf_path)
-                    merged_pdfs_count += 1
-                    print(f"DEBUG: ✅ Merged PDF: {os.path.basename(pdf_path)}")
-                except Exception as e:
-                    print(f"DEBUG: ❌ Could not merge {pdf_path}: {e}")
-
             customer_name = self.customer_combobox.get().strip()
 
             # Get current year for statement folder
@@ -9567,17 +11754,40 @@ class ModernInvoiceApp:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             output_filename = os.path.join(statements_dir, f"{clean_customer_name}_Statement_{timestamp}.pdf")
             
-            # Write merged PDF
-            merger.write(output_filename)
-            merger.close()
+            # Render the invoices from the bill records, with any originals attached at the end
+            records, no_record = self.statement_bill_records(selected_bills_data)
+            stats = render_statement_pdf(records, output_filename, original_pdfs=pdfs_to_merge, missing=no_record,
+                                         missing_originals=originals_not_found)
+            for source, error in stats["failed"]:
+                print(f"DEBUG: ❌ Could not include {source}: {error}")
+            print(f"DEBUG: ✅ Statement: {describe_statement(stats)}")
+            missing = statement_problems(stats)
+
+            if not stats["pages"]:
+                messagebox.showwarning(
+                    "⚠️ No Bills",
+                    "None of the selected bills could be rendered.\n\n" + "\n".join(missing)
+                )
+                self.show_status_message("❌ Statement not generated - no bills rendered", error=True)
+                return
+
+            # Total of the bills that are actually in the statement
+            rendered = set(stats["rendered"])
+            total_amount = sum(bill['amount'] for bill in selected_bills_data if str(bill['bill_no']) in rendered)
+
+            if missing:
+                messagebox.showwarning(
+                    "⚠️ Statement with Missing Bills",
+                    "Some bills or original PDFs could not be included and were skipped:\n" + "\n".join(missing)
+                )
 
             # Show success message
             success_msg = f"""
             ✅ Customer Statement Generated Successfully!
             
             👤 Customer: {customer_name}
-            📄 Bills Included: {len(selected_bills_data)}
-            📁 PDFs Merged: {merged_pdfs_count} (searched across ALL office folders)
+            📄 Bills Included: {stats['bills']} of {len(selected_bills_data)}
+            📁 Original PDFs Attached: {stats['attached']}
             💰 Total Amount: ₹{total_amount:,.2f}
             💾 Saved as: {os.path.basename(output_filename)}
             """
@@ -9587,7 +11797,7 @@ class ModernInvoiceApp:
             # Open the generated statement
             self.display_pdf(output_filename)
 
-            self.show_status_message(f"✅ Statement generated with {len(selected_bills_data)} bills - {merged_pdfs_count} PDFs merged from ALL offices")
+            self.show_status_message(f"✅ Statement generated - {describe_statement(stats)}")
 
         except Exception as e:
             messagebox.showerror("❌ Error", f"Failed to generate statement:\n{str(e)}")
@@ -9599,6 +11809,7 @@ class ModernInvoiceApp:
         self.current_screen = "agent_commission"
         self.create_navigation_bar()
         self.create_status_bar()
+        self.start_subtotal_backfill()
 
         # Reset focusable widgets
         self.focusable_widgets.clear()
@@ -9699,6 +11910,17 @@ class ModernInvoiceApp:
         )
         update_commission_btn.pack(side=tk.LEFT, padx=10)
 
+        # Save the previewed commissions of the listed bills
+        commit_commission_btn = self.create_modern_button(
+            commission_frame,
+            "💾 Save Commissions",
+            self.commit_agent_commissions,
+            style="success",
+            width=16,
+            height=1
+        )
+        commit_commission_btn.pack(side=tk.LEFT, padx=(0, 10))
+
         # Date range
         date_frame = tk.Frame(search_frame, bg=self.colors['card_bg'])
         date_frame.pack(fill=tk.X, pady=10)
@@ -9816,6 +12038,17 @@ class ModernInvoiceApp:
         )
         select_all_cb.pack(anchor="w", pady=5)
 
+        # Statements are rendered from the bill records; stored invoice PDFs are optional
+        self.attach_original_pdfs = tk.BooleanVar(value=False)
+        attach_cb = tk.Checkbutton(
+            left_frame,
+            text="Attach original PDFs",
+            variable=self.attach_original_pdfs,
+            font=("Segoe UI", 10),
+            bg=self.colors['light_bg']
+        )
+        attach_cb.pack(anchor="w", pady=2)
+
         # Selection info
         self.agent_selection_info = tk.Label(
             left_frame,
@@ -9939,7 +12172,7 @@ class ModernInvoiceApp:
                 net_amount = bill["amount"]
 
                 if sub_total > 0:
-                    bill_commission = (sub_total * commission_rate) / 100
+                    bill_commission = commission_on(sub_total, commission_rate)
                     total_sub_total += sub_total
                     total_commission += bill_commission
                 else:
@@ -10041,7 +12274,7 @@ class ModernInvoiceApp:
 
 
     def generate_agent_statement_bills(self):
-        """Merge all selected agent bill PDFs into one Agent Statement file - searches ALL office folders"""
+        """Render all selected agent bills into one Agent Statement file from the bill records"""
         if not self.selected_agent_bills:
             messagebox.showwarning("Selection Required", "Please select at least one bill to merge.")
             return
@@ -10052,7 +12285,6 @@ class ModernInvoiceApp:
             return
 
         try:
-            from PyPDF2 import PdfMerger
             import re, os
             from datetime import datetime
 
@@ -10074,46 +12306,35 @@ class ModernInvoiceApp:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             output_file = os.path.join(statements_dir, f"{clean_agent}_Bills_Merged_{timestamp}.pdf")
 
-            merger = PdfMerger()
-            missing = []
+            # Render selected bills from their records, with any originals attached at the end
+            selected = [bill for bill in self.agent_bills_data if bill["bill_no"] in self.selected_agent_bills]
+            records, no_record = self.statement_bill_records(selected)
+            originals, originals_not_found = self.original_statement_pdfs(selected)
+            stats = render_statement_pdf(records, output_file, original_pdfs=originals,
+                                         missing=no_record, missing_originals=originals_not_found)
+            missing = statement_problems(stats)
+            print(f"DEBUG: ✅ Agent statement: {describe_statement(stats)}")
 
-            # Merge selected bills from ALL office folders
-            for bill in self.agent_bills_data:
-                if bill["bill_no"] in self.selected_agent_bills:
-                    pdf_path = bill.get("pdf_path", "")
-                    if not pdf_path or not os.path.exists(pdf_path):
-                        pdf_path = self.resolve_pdf_path_updated(pdf_path, bill["bill_no"])
-                    if pdf_path and os.path.exists(pdf_path):
-                        merger.append(pdf_path)
-                        print(f"DEBUG: ✅ Merged PDF for bill {bill['bill_no']}: {pdf_path}")
-                    else:
-                        missing.append(bill["bill_no"])
-                        print(f"DEBUG: ❌ PDF not found for bill {bill['bill_no']}")
+            if stats["pages"]:  # Check if any bills were rendered
+                self.show_status_message(f"✅ Agent statement: {describe_statement(stats)}")
 
-            if merger.pages:  # Check if any PDFs were merged
-                merger.write(output_file)
-                merger.close()
-                
                 if missing:
                     messagebox.showwarning(
-                        "Merged with Missing Bills",
-                        f"Some bills were not found and skipped:\n{', '.join(missing)}\n\n"
-                        f"Searched in ALL office folders (AP, AFI, AFF, Invoice_Bills)\n\n"
-                        f"Merged file saved to:\n{output_file}"
+                        "Statement with Missing Bills",
+                        f"Some bills could not be included and were skipped:\n{', '.join(missing)}\n\n"
+                        f"Statement saved to:\n{output_file}"
                     )
                 else:
                     messagebox.showinfo(
                         "Success", 
-                        f"All selected bills merged successfully!\n\n"
-                        f"Searched across ALL office folders\n\n"
+                        f"All selected bills included successfully!\n\n"
                         f"Saved to:\n{output_file}"
                     )
                 self.display_pdf(output_file)
             else:
-                merger.close()
                 messagebox.showerror(
-                    "No PDFs Found", 
-                    f"No PDFs found for the selected bills in ANY office folder.\n\n"
+                    "No Bills Rendered", 
+                    f"None of the selected bills could be rendered.\n\n"
                     f"Missing bills: {', '.join(missing)}"
                 )
 
@@ -10141,7 +12362,7 @@ class ModernInvoiceApp:
 
 
     def load_agent_bills_for_commission(self):
-        """Load bills for selected agent with commission from SUB TOTAL and AUTO-SAVE to JSON"""
+        """Load bills for selected agent with a preview of the commission from SUB TOTAL (nothing is saved)"""
         agent_name = self.agent_name_combobox.get().strip()
 
         if not agent_name:
@@ -10164,50 +12385,24 @@ class ModernInvoiceApp:
         total_sales = 0
         commission_rate = float(self.commission_rate.get())
         
-        # Track commission updates
-        updated_commissions_count = 0
-        bills_updated = []
+        # Commissions not saved yet at this rate
+        unsaved_commissions_count = 0
 
-        for bill_no, bill in self.bills_data.items():
+        for bill_no in sorted(self.bill_index.agent(agent_name)):
+            bill = self.bills_data[bill_no]
             bill_agent_name = bill.get("agent_name", "").strip()
-            
-            # Check agent name match
-            if agent_name.lower() != bill_agent_name.lower():
-                continue
 
-            # ✅ Calculate commission from SUB TOTAL instead of net_amount
-            sub_total = bill.get("sub_total", 0)
-            if sub_total > 0:
-                commission_amount = (sub_total * commission_rate) / 100
-            else:
-                commission_amount = 0  # No SUB TOTAL = No commission
+            # ✅ Preview commission from SUB TOTAL instead of net_amount
+            sub_total, commission_amount, saved = self.commission_preview(bill_no, commission_rate)
+            if not saved:
+                unsaved_commissions_count += 1
             
             amount = float(bill.get("net_amount", 0))
             total_sales += amount
 
-            # ✅ AUTO-SAVE COMMISSION TO JSON
-            old_commission = bill.get("commission_amount", 0)
-            old_rate = bill.get("commission_rate", 0)
-            
-            # Check if commission needs updating
-            if (commission_amount != old_commission or commission_rate != old_rate):
-                # Update bill data with new commission
-                bill.update({
-                    "commission_rate": commission_rate,
-                    "commission_amount": commission_amount,
-                    "commission_calculated_on": "sub_total",
-                    "commission_last_updated": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                })
-                updated_commissions_count += 1
-                bills_updated.append(bill_no)
-
-            # Check if PDF exists
-            pdf_available = "❌ No"
+            # PDF availability is filled in by a background check once the rows are shown
             pdf_path = bill.get("pdf_file_name", "")
-            if pdf_path:
-                resolved_path = self.resolve_pdf_path_updated(pdf_path, bill_no)
-                if resolved_path and os.path.exists(resolved_path):
-                    pdf_available = "✅ Yes"
+            pdf_available = self.PDF_PENDING
 
             matching_bills.append({
                 'bill_no': bill_no,
@@ -10224,26 +12419,13 @@ class ModernInvoiceApp:
                 'commission_rate': commission_rate  # Store current rate
             })
 
-        # ✅ SAVE UPDATED COMMISSIONS TO JSON FILE
-        if updated_commissions_count > 0:
-            try:
-                success = self.save_data(self.bills_ref, self.bills_data)
-                if success:
-                    self.show_status_message(f"✅ Auto-saved commissions for {updated_commissions_count} bills")
-                    print(f"DEBUG: ✅ Auto-saved commissions for {updated_commissions_count} bills: {bills_updated}")
-                else:
-                    self.show_status_message("⚠️ Commissions calculated but save failed")
-            except Exception as e:
-                print(f"DEBUG: ❌ Error saving commissions: {e}")
-                self.show_status_message("❌ Error saving commissions")
-
         if not matching_bills:
             messagebox.showinfo("ℹ️ No Bills Found", f"No bills found for agent: {agent_name}")
             self.show_status_message("❌ No bills found for selected agent")
             return
 
         # Sort by bill date (newest first)
-        matching_bills.sort(key=lambda x: (parse_date_flexible(x.get('bill_date')) or datetime.min), reverse=True)
+        matching_bills.sort(key=lambda x: self.bill_index.ordinal(x['bill_no']) or 0, reverse=True)
 
         # Populate table
         for bill in matching_bills:
@@ -10262,6 +12444,8 @@ class ModernInvoiceApp:
             bill['item_id'] = item_id
             self.agent_bills_data.append(bill)
 
+        self.check_pdfs_in_background("agent_statement", self.agent_bills_table, "PDF", matching_bills)
+
         # Update selection info
         self.update_agent_selection_info()
 
@@ -10271,13 +12455,13 @@ class ModernInvoiceApp:
         # Final status message
         if bills_without_subtotal > 0:
             status_msg = f"📊 Loaded {len(matching_bills)} bills - {bills_without_subtotal} without SUB TOTAL"
-            if updated_commissions_count > 0:
-                status_msg += f" | ✅ Auto-saved {updated_commissions_count} commissions"
+            if unsaved_commissions_count > 0:
+                status_msg += f" | 👁 {unsaved_commissions_count} commissions previewed, not saved"
             self.show_status_message(status_msg)
         else:
             status_msg = f"📊 Loaded {len(matching_bills)} bills for {agent_name} | Sales: ₹{total_sales:,.2f}"
-            if updated_commissions_count > 0:
-                status_msg += f" | ✅ Auto-saved {updated_commissions_count} commissions"
+            if unsaved_commissions_count > 0:
+                status_msg += f" | 👁 {unsaved_commissions_count} commissions previewed, not saved"
             self.show_status_message(status_msg)
 
     def on_agent_bill_click(self, event):
@@ -10354,22 +12538,43 @@ class ModernInvoiceApp:
             messagebox.showerror("❌ Error", "Please enter a valid commission rate.")
             return
 
-        # Recalculate commission for all bills using SUB TOTAL
+        # Preview commission for all bills using SUB TOTAL
         for bill in self.agent_bills_data:
             # ✅ Direct calculation from SUB TOTAL
-            sub_total = bill['sub_total']
-            if sub_total > 0:
-                new_commission = (sub_total * commission_rate) / 100
-            else:
-                new_commission = 0
-            
+            bill['sub_total'], new_commission, _ = self.commission_preview(bill['bill_no'], commission_rate)
             bill['commission'] = new_commission
+            bill['commission_rate'] = commission_rate
             self.agent_bills_table.set(bill['item_id'], "Commission", f"₹{new_commission:,.2f}")
 
         # Update selection info
         self.update_agent_selection_info()
 
-        self.show_status_message(f"✅ Commission rate updated to {commission_rate}% based on SUB TOTAL")
+        self.show_status_message(f"👁 Commission preview at {commission_rate}% based on SUB TOTAL - press 💾 Save Commissions to keep it")
+
+    def commit_agent_commissions(self):
+        """Save the previewed commissions of the listed bills, as one batched update of the bills that changed"""
+        if not self.agent_bills_data:
+            messagebox.showwarning("⚠️ No Bills", "Please load an agent's bills first.")
+            return
+
+        try:
+            commission_rate = float(self.commission_rate.get())
+            if commission_rate < 0 or commission_rate > 100:
+                messagebox.showerror("❌ Error", "Commission rate must be between 0 and 100%.")
+                return
+        except (ValueError, tk.TclError):
+            messagebox.showerror("❌ Error", "Please enter a valid commission rate.")
+            return
+
+        bill_nos = [bill['bill_no'] for bill in self.agent_bills_data]
+        if not messagebox.askyesno(
+            "💾 Save Commissions",
+            f"Save commissions at {commission_rate}% of SUB TOTAL for the {len(bill_nos)} listed bills?\n\n"
+            "Only bills whose saved commission differs are updated."
+        ):
+            return
+
+        self.recalculate_all_commissions(commission_rate, bill_nos)
 
     def apply_agent_date_filter(self):
         """Apply date filter to agent bills"""
@@ -10412,31 +12617,17 @@ class ModernInvoiceApp:
         total_sales = 0
         commission_rate = float(self.commission_rate.get())
 
-        for bill_no, bill in self.bills_data.items():
+        agent_bills = self.bill_index.agent(agent_name)
+        for bill_no in self.bill_index.date_range(from_date, to_date, within=agent_bills, newest_first=True):
+            bill = self.bills_data[bill_no]
             bill_agent_name = bill.get("agent_name", "").strip()
-            
-            # Check agent name match
-            if agent_name.lower() != bill_agent_name.lower():
-                continue
-
-            # Check date range
-            try:
-                bill_date = datetime.strptime(bill.get("bill_date", ""), "%d/%m/%Y")
-                if not (from_date <= bill_date <= to_date):
-                    continue
-            except ValueError:
-                continue
 
-            # Check if PDF exists
-            pdf_available = " No"
+            # PDF availability is filled in by a background check once the rows are shown
             pdf_path = bill.get("pdf_file_name", "")
-            if pdf_path:
-                resolved_path = self.resolve_pdf_path_updated(pdf_path, bill_no)
-                if resolved_path and os.path.exists(resolved_path):
-                    pdf_available = " Yes"
+            pdf_available = self.PDF_PENDING
 
             amount = float(bill.get("net_amount", 0))
-            commission_amount = (amount * commission_rate) / 100
+            sub_total, commission_amount, _ = self.commission_preview(bill_no, commission_rate)
             total_sales += amount
 
             filtered_bills.append({
@@ -10446,9 +12637,12 @@ class ModernInvoiceApp:
                 'agent_name': bill_agent_name,
                 'amount': amount,
                 'commission': commission_amount,
+                'sub_total': sub_total,
                 'status': bill.get("payment_status", "Pending"),
                 'pdf_available': pdf_available,
-                'pdf_path': pdf_path
+                'pdf_path': pdf_path,
+                'stored_commission': "commission_amount" in bill,
+                'commission_rate': commission_rate
             })
 
         if not filtered_bills:
@@ -10456,9 +12650,6 @@ class ModernInvoiceApp:
             self.show_status_message("❌ No bills found for selected criteria")
             return
 
-        # Sort by bill date (newest first)
-        filtered_bills.sort(key=lambda x: datetime.strptime(x['bill_date'], "%d/%m/%Y"), reverse=True)
-
         # Populate table
         for bill in filtered_bills:
             item_id = self.agent_bills_table.insert("", "end", values=(
@@ -10475,6 +12666,9 @@ class ModernInvoiceApp:
             bill['item_id'] = item_id
             self.agent_bills_data.append(bill)
 
+        self.check_pdfs_in_background("agent_statement", self.agent_bills_table, "PDF", filtered_bills,
+                                      yes=" Yes", no=" No")
+
         self.update_agent_selection_info()
         self.show_status_message(f"✅ Found {len(filtered_bills)} bills - Total Sales: ₹{total_sales:,.2f}")
 
@@ -10549,7 +12743,7 @@ class ModernInvoiceApp:
                 
                 if sub_total > 0:
                     # Calculate commission from SUB TOTAL
-                    bill_commission = (sub_total * commission_rate) / 100
+                    bill_commission = commission_on(sub_total, commission_rate)
                     total_sub_total += sub_total
                     total_commission += bill_commission
                 else:
@@ -10703,23 +12897,17 @@ class ModernInvoiceApp:
 
             # Merge commission + bill PDFs
             try:
-                from PyPDF2 import PdfMerger
-                merger = PdfMerger()
-                merger.append(output_file)
-
-                missing = []
-                for bill in selected_bills_data:
-                    pdf_path = bill.get('pdf_path', '')
-                    if not pdf_path or not os.path.exists(pdf_path):
-                        pdf_path = self.resolve_pdf_path_updated(bill.get('pdf_path', ''), bill['bill_no'])
-                    if pdf_path and os.path.exists(pdf_path):
-                        merger.append(pdf_path)
-                    else:
-                        missing.append(bill['bill_no'])
-
+                # Commission summary first, then the bills rendered from their records
                 merged_output = os.path.join(statements_dir, f"{clean_agent}_Commission_Merged_{timestamp}.pdf")
-                merger.write(merged_output)
-                merger.close()
+                records, no_record = self.statement_bill_records(selected_bills_data)
+                originals, originals_not_found = self.original_statement_pdfs(selected_bills_data)
+                stats = render_statement_pdf(records, merged_output,
+                                             leading_pdfs=[output_file],
+                                             original_pdfs=originals,
+                                             missing=no_record,
+                                             missing_originals=originals_not_found)
+                missing = statement_problems(stats)
+                print(f"DEBUG: ✅ Commission statement: {describe_statement(stats)}")
 
                 if missing:
                     messagebox.showwarning("Missing PDFs", f"Some bills not merged:\n{', '.join(missing)}")
@@ -10824,25 +13012,23 @@ class ModernInvoiceApp:
             goods_value = float(bill.get("goods_value", 0))
             special_discount = float(bill.get("special_discount", 0))
             sub_total = goods_value - special_discount
-        # 3. Third try: Extract from PDF (for older bills)
+        # 3. Third try: Work it out from the items (older bills) - the printed
+        #    value is read from the PDF by the background backfill
         else:
-            sub_total = self.extract_subtotal_from_pdf(bill_no)
-            
-            # If found from PDF, save it for future use
-            if sub_total > 0:
-                bill["sub_total"] = sub_total
-                self.save_data(self.bills_ref, self.bills_data)
+            sub_total = bill_sub_total(bill)[0]
+            self.start_subtotal_backfill()
         
         # Calculate commission
-        commission_amount = (sub_total * commission_rate) / 100
+        commission_amount = commission_on(sub_total, commission_rate)
         
         # Store commission data in bill
         bill["commission_rate"] = commission_rate
         bill["commission_amount"] = commission_amount
-        bill["commission_calculated_on"] = "sub_total"
+        bill["commission_calculated_on"] = commission_base_source(bill)
         
         # Save updated bill data
-        self.save_data(self.bills_ref, self.bills_data)
+        self.bills_changed([bill_no])
+        self.save_data(self.bills_ref, self.bills_data, keys=[bill_no])
         
         return commission_amount
 
@@ -10863,66 +13049,125 @@ class ModernInvoiceApp:
             return 0
         
         try:
-            import PyPDF2
-            with open(resolved_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                text = ""
-                for page in pdf_reader.pages:
-                    text += page.extract_text()
-                
-                # Look for SUB TOTAL in the text
-                lines = text.split('\n')
-                for i, line in enumerate(lines):
-                    if "SUB TOTAL" in line.upper():
-                        # Look for amount in current or next line
-                        amount_line = line
-                        if not any(char.isdigit() for char in line):
-                            # Check next line if current line has no digits
-                            if i + 1 < len(lines):
-                                amount_line = lines[i + 1]
-                        
-                        # Extract numeric value
-                        import re
-                        numbers = re.findall(r"[\d,]+\.\d{2}", amount_line)
-                        if numbers:
-                            # Remove commas and convert to float
-                            amount = float(numbers[0].replace(',', ''))
-                            return amount
-                
-                # Alternative pattern: Look for amount after "SUB TOTAL"
-                pattern = r"SUB TOTAL\s*[\d,]+\.\d{2}"
-                matches = re.findall(pattern, text.upper())
-                if matches:
-                    numbers = re.findall(r"[\d,]+\.\d{2}", matches[0])
-                    if numbers:
-                        return float(numbers[0].replace(',', ''))
-                        
+            return pdf_subtotal(resolved_path) or 0
         except Exception as e:
             print(f"DEBUG: Error extracting SUB TOTAL from PDF: {e}")
         
         return 0
 
+    def start_subtotal_backfill(self):
+        """
+        Read the SUB TOTAL of legacy bills from their PDFs on a background
+        thread (parsing runs in worker processes) and save it in batches.
+        Does nothing while a run is in progress or when no bill needs it.
+        The bills are picked here on the Tk thread; the worker only uploads,
+        and the saved values are put into bills_data back on the Tk thread.
+        A commission already saved on a bill (worked out from its items) is
+        recalculated from the printed SUB TOTAL in the same update.
+        """
+        backfill = self.subtotal_backfill
+        if backfill.running:
+            return
+        pending = backfill.pending(self.bills_data)
+        if not pending:
+            return
+        pdf_names = {bill_no: self.bills_data[bill_no].get("pdf_file_name", "") for bill_no in pending}
+        rates = {}
+        for bill_no in pending:
+            rate = BillAggregates._number(self.bills_data[bill_no].get("commission_rate"))
+            if rate:
+                rates[bill_no] = rate
+        backfill.running = True
+
+        def resolve_paths(bill_nos):
+            return self.resolve_pdf_paths((pdf_names[bill_no], bill_no) for bill_no in bill_nos)
+
+        def apply(updates):
+            self.delta_sync.apply_fields(self.bills_ref, self.bills_data, updates)
+            saved = [bill_no for bill_no in updates if bill_no in self.bills_data]
+            self.bills_changed(saved)
+            self.cache_saved_delta(self.bills_ref, {bill_no: self.bills_data[bill_no] for bill_no in saved})
+
+        def save(updates):
+            stamp = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
+            for bill_no, fields in updates.items():
+                if bill_no in rates:
+                    fields.update({
+                        "commission_amount": commission_on(fields["sub_total"], rates[bill_no]),
+                        "commission_calculated_on": "sub_total",
+                        "commission_last_updated": stamp,
+                    })
+            self.delta_sync.upload_fields(self.bills_ref, updates)
+            self.root.after(0, apply, updates)
+
+        def progress(done, total, saved):
+            if total:
+                self.root.after(0, lambda: self.show_status_message(
+                    f"📄 Reading SUB TOTAL from old invoices... {done:,}/{total:,} PDFs, {saved:,} saved"
+                ))
+
+        def worker():
+            try:
+                saved, failed = backfill.run(pending, resolve_paths, save, progress)
+            except Exception as e:
+                backfill.running = False
+                print(f"❌ SUB TOTAL backfill error: {e}")
+                return
+            print(f"✅ SUB TOTAL backfill: {saved} saved, {failed} without a readable PDF")
+            if saved:
+                self.root.after(0, lambda: self.show_status_message(f"✅ SUB TOTAL saved for {saved:,} older bills"))
+
+        self.subtotal_backfill_thread = threading.Thread(target=worker, daemon=True)
+        self.subtotal_backfill_thread.start()
+
+    def recalculate_all_commissions(self, commission_rate, bill_nos=None):
+        """
+        Recompute the commission of every bill (or just bill_nos) in one pass and
+        upload only the commission fields of the bills that changed, as one
+        multi-path update. Progress goes to the status bar. Returns the number
+        of bills updated.
+        """
+        def progress(done, total):
+            self.show_status_message(f"🔄 Calculating commissions... {done:,}/{total:,} bills")
+            self.root.update_idletasks()
+
+        bills = self.bills_data
+        if bill_nos is not None:
+            bills = {bill_no: bills[bill_no] for bill_no in bill_nos if bill_no in bills}
+        updates = commission_updates(bills, commission_rate, progress)
+        if not updates:
+            self.show_status_message("✅ All commissions already up to date")
+            return 0
+
+        self.show_status_message(f"⬆️ Saving commissions for {len(updates):,} bills...")
+        self.root.update_idletasks()
+        try:
+            paths = self.delta_sync.update_fields(self.bills_ref, self.bills_data, updates)
+        except Exception as e:
+            print(f"❌ Firebase Save Error: {e}")
+            self.show_status_message("❌ Error saving commissions", error=True)
+            return 0
+
+        self.bills_changed(list(updates))
+        self.cache_saved_delta(self.bills_ref, {bill_no: self.bills_data[bill_no] for bill_no in updates})
+        print(f"✅ Commissions saved for {len(updates)} bills ({paths} fields in one update)")
+        self.show_status_message(f"✅ Commissions updated for {len(updates):,} bills")
+        return len(updates)
+
     def batch_update_commissions(self):
         """Update commissions for all bills in database"""
         confirm = messagebox.askyesno(
             "🔄 Batch Update Commissions", 
             "This will calculate commissions from SUB TOTAL for ALL bills.\n\n"
-            "For bills without SUB TOTAL stored, it will try to extract from PDFs.\n\n"
-            "This may take a while. Continue?"
+            "For bills without SUB TOTAL stored, it is worked out from the bill's items.\n\n"
+            "Continue?"
         )
         
         if not confirm:
             return
         
-        updated_count = 0
         commission_rate = float(self.commission_rate.get())
-        
-        for bill_no in self.bills_data:
-            old_commission = self.bills_data[bill_no].get("commission_amount", 0)
-            new_commission = self.calculate_agent_commission(bill_no, commission_rate)
-            
-            if new_commission != old_commission:
-                updated_count += 1
+        updated_count = self.recalculate_all_commissions(commission_rate)
         
         messagebox.showinfo(
             "✅ Batch Update Complete", 
@@ -10941,12 +13186,8 @@ class ModernInvoiceApp:
         # Get SUB TOTAL for commission calculation
         sub_total = bill.get("sub_total", 0)
         
-        if sub_total > 0:
-            # Calculate commission from SUB TOTAL
-            commission_amount = (sub_total * commission_rate) / 100
-        else:
-            # If no SUB TOTAL, commission is 0
-            commission_amount = 0
+        # Calculate commission from SUB TOTAL (0 when there is none)
+        commission_amount = commission_on(sub_total, commission_rate)
         
         # Update bill data with commission information
         bill.update({
@@ -10957,7 +13198,8 @@ class ModernInvoiceApp:
         })
         
         # Save to JSON
-        self.save_data(self.bills_ref, self.bills_data)
+        self.bills_changed([bill_no])
+        self.save_data(self.bills_ref, self.bills_data, keys=[bill_no])
         
         print(f"DEBUG: Commission saved for bill {bill_no} - Rate: {commission_rate}%, Amount: ₹{commission_amount:,.2f}")
 
@@ -10975,15 +13217,7 @@ class ModernInvoiceApp:
             return
         
         commission_rate = float(self.commission_rate.get())
-        updated_count = 0
-        
-        for bill_no in self.bills_data:
-            old_commission = self.bills_data[bill_no].get("commission_amount", 0)
-            self.calculate_and_save_commission(bill_no, commission_rate)
-            new_commission = self.bills_data[bill_no].get("commission_amount", 0)
-            
-            if new_commission != old_commission:
-                updated_count += 1
+        updated_count = self.recalculate_all_commissions(commission_rate)
         
         messagebox.showinfo(
             "Commissions Updated",
@@ -10998,93 +13232,108 @@ class ModernInvoiceApp:
         RESOLVE PDF PATH - Checks in ALL office folders within year-based folders
         Structure: Documents/InvoiceApp/Invoice_Bill_2025/[Office]/[Agent]/
         """
-        # If it's already an absolute path and exists, return it
-        if os.path.isabs(pdf_file_path) and os.path.exists(pdf_file_path):
-            return pdf_file_path
-        
-        # Get the user's documents folder
-        documents_dir = os.path.join(os.path.expanduser("~"), "Documents")
-        invoice_app_dir = os.path.join(documents_dir, "InvoiceApp")
-        
-        # Define office folders
-        office_folders = ["AP", "AFI", "AFF"]
-        
-        # Try to extract year from bill data
-        bill_year = None
-        if bill_no in self.bills_data:
-            bill_date = self.bills_data[bill_no].get("bill_date", "")
-            try:
-                bill_date_obj = parse_date_flexible(bill_date)
-                if bill_date_obj:
-                    bill_year = str(bill_date_obj.year)
-            except:
-                pass
-        
-        # Extract filename from the path
-        filename = os.path.basename(pdf_file_path)
-        
-        # Search strategy:
-        # 1. First try specific year folder (if we know the year)
-        # 2. Then try all year folders
-        
-        years_to_search = []
-        if bill_year:
-            years_to_search.append(f"Invoice_Bill_{bill_year}")
-        
-        # Add all existing year folders
-        if os.path.exists(invoice_app_dir):
-            for folder in os.listdir(invoice_app_dir):
-                if folder.startswith("Invoice_Bill_") and os.path.isdir(os.path.join(invoice_app_dir, folder)):
-                    if folder not in years_to_search:
-                        years_to_search.append(folder)
-        
-        # Search in year folders
-        for year_folder in years_to_search:
-            year_folder_path = os.path.join(invoice_app_dir, year_folder)
-            
-            if not os.path.exists(year_folder_path):
+        resolved_path = self.resolve_pdf_paths([(pdf_file_path, bill_no)])[bill_no]
+        if resolved_path is None:
+            print(f"DEBUG: ❌ PDF NOT FOUND for bill {bill_no} in any year folder")
+        return resolved_path
+
+    def resolve_pdf_paths(self, bills):
+        """
+        Resolve the PDFs of many bills at once: one refresh of the PDF index
+        (a stat per folder), then a dictionary lookup per bill.
+        'bills' yields (pdf_file_path, bill_no); returns {bill_no: path or None}.
+        """
+        self.pdf_index.refresh()
+        resolved = {}
+        for pdf_file_path, bill_no in bills:
+            if not pdf_file_path:
+                resolved[bill_no] = None
                 continue
-                
-            # Search in each office folder within the year folder
-            for office_folder in office_folders:
-                office_path = os.path.join(year_folder_path, office_folder)
-                
-                if not os.path.exists(office_path):
-                    continue
-                
-                # Try direct path in office folder
-                direct_path = os.path.join(office_path, filename)
-                if os.path.exists(direct_path):
-                    print(f"DEBUG: ✅ PDF found in {year_folder}/{office_folder}: {direct_path}")
-                    return direct_path
-                
-                # Try with agent subfolder
-                agent_name = self.bills_data.get(bill_no, {}).get("agent_name", "Unknown_Agent")
-                if agent_name:
-                    clean_agent_name = re.sub(r'[^\w\s-]', '', agent_name).strip().replace(' ', '_')
-                    agent_folder_path = os.path.join(office_path, clean_agent_name)
-                    agent_file_path = os.path.join(agent_folder_path, filename)
-                    
-                    if os.path.exists(agent_file_path):
-                        print(f"DEBUG: ✅ PDF found in {year_folder}/{office_folder}/{clean_agent_name}: {agent_file_path}")
-                        return agent_file_path
-        
-        # Fallback: Search recursively in all year folders
-        if os.path.exists(invoice_app_dir):
-            for year_folder in os.listdir(invoice_app_dir):
-                if year_folder.startswith("Invoice_Bill_"):
-                    year_path = os.path.join(invoice_app_dir, year_folder)
-                    try:
-                        for root, dirs, files in os.walk(year_path):
-                            if filename in files:
-                                found_path = os.path.join(root, filename)
-                                print(f"DEBUG: ✅ PDF found via recursive search in {year_folder}: {found_path}")
-                                return found_path
-                    except Exception:
-                        continue
-        
-        print(f"DEBUG: ❌ PDF NOT FOUND for bill {bill_no} in any year folder")
-        return None
+
+            # Prefer the copy in the bill's own year folder
+            bill_year = None
+            bill_ordinal = self.bill_index.ordinal(bill_no)
+            if bill_ordinal:
+                bill_year = datetime.fromordinal(bill_ordinal).year
+
+            path = self.pdf_index.resolve(pdf_file_path, bill_year)
+            if path is None and os.path.isabs(pdf_file_path) and os.path.exists(pdf_file_path):
+                path = pdf_file_path   # Saved outside Documents/InvoiceApp
+            resolved[bill_no] = path
+        return resolved
+
+    def statement_bill_records(self, rows):
+        """
+        Full bill records (from bills_data) for the selected rows of a statement
+        table. Returns (records, missing bill numbers).
+        """
+        records, missing = [], []
+        for row in rows:
+            bill = self.bills_data.get(str(row['bill_no']))
+            if isinstance(bill, dict):
+                records.append(bill)
+            else:
+                print(f"DEBUG: ❌ No bill record for {row['bill_no']}")
+                missing.append(str(row['bill_no']))
+        return records, missing
+
+    def original_statement_pdfs(self, rows):
+        """
+        Stored invoice PDFs to attach to a statement, only when 'Attach original
+        PDFs' is ticked. Returns (paths, bill numbers whose PDF was not found).
+        """
+        attach = getattr(self, "attach_original_pdfs", None)
+        if attach is None or not attach.get():
+            return [], []
+        not_found = [str(row['bill_no']) for row in rows if row.get('pdf_available') == '❌ No']
+        resolved = self.resolve_pdf_paths(
+            (row.get('pdf_path', ''), row['bill_no']) for row in rows if row.get('pdf_available') != '❌ No'
+        )
+        for bill_no, path in resolved.items():
+            if not path:
+                print(f"DEBUG: ❌ Could not resolve PDF path for bill {bill_no}")
+                not_found.append(str(bill_no))
+        return [path for path in resolved.values() if path], not_found
+
+    def check_pdfs_in_background(self, channel, table, column, bills, yes="✅ Yes", no="❌ No"):
+        """
+        Fill the PDF column of a statement table after its rows are shown.
+        Rows start as PDF_PENDING; a worker thread resolves the bills in
+        chunks (one index refresh for the whole batch) and streams each chunk
+        back to the Tk thread. Reloading the same table ('channel') drops
+        results still on their way for the old rows.
+        """
+        generation = self.pdf_check_generation.get(channel, 0) + 1
+        self.pdf_check_generation[channel] = generation
+        by_bill_no = {bill['bill_no']: bill for bill in bills}
+        pairs = [(bill['pdf_path'], bill['bill_no']) for bill in bills]
+
+        def is_current():
+            return self.pdf_check_generation.get(channel) == generation
+
+        def apply(resolved):
+            if not is_current():
+                return
+            for bill_no, path in resolved.items():
+                bill = by_bill_no[bill_no]
+                bill['pdf_available'] = yes if path else no
+                try:
+                    table.set(bill['item_id'], column, bill['pdf_available'])
+                except tk.TclError:
+                    return   # Table rebuilt or screen closed
+
+        def worker():
+            for start in range(0, len(pairs), self.PDF_CHECK_CHUNK):
+                if not is_current():
+                    return
+                try:
+                    resolved = self.resolve_pdf_paths(pairs[start:start + self.PDF_CHECK_CHUNK])
+                except Exception as e:
+                    print(f"❌ PDF check error ({channel}): {e}")
+                    return
+                self.root.after(0, lambda resolved=resolved: apply(resolved))
+
+        threading.Thread(target=worker, daemon=True).start()
 
     def locate_missing_pdf_updated(self, bill_no):
         """Locate missing PDF file - searches ALL office folders"""
@@ -11124,7 +13373,7 @@ class ModernInvoiceApp:
             if file_path and os.path.exists(file_path):
                 # Update the database with the correct path
                 self.bills_data[bill_no]["pdf_file_name"] = file_path
-                self.save_data(self.bills_ref, self.bills_data)
+                self.save_data(self.bills_ref, self.bills_data, keys=[bill_no])
                 
                 # Open the PDF
                 self.display_pdf(file_path)
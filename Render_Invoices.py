@@ -0,0 +1,130 @@
+import json
+import os
+import sys
+import time
+
+from Online_Invoice_Application_2 import invoice_pdf_path, render_invoices_parallel
+
+# -----------------------------------------------------
+# Re-renders invoice PDFs from the saved bill records,
+# one invoice per worker process, into the usual
+# Documents/InvoiceApp/Invoice_Bill_<year>/<office>/<agent>
+# folders, and reports how long each document took.
+#
+#   python Render_Invoices.py json [Invoice_mergerd.json] [bill_no ...]
+#   python Render_Invoices.py firebase [bill_no ...]
+#
+# With no bill numbers every bill is rendered. A bill keeps
+# its stored file name, so existing links keep working;
+# bills without one get a new name, which is saved back.
+# -----------------------------------------------------
+DEFAULT_JSON = "Invoice_mergerd.json"
+FIREBASE_KEY_PATH = os.path.join(os.path.expanduser("~"), "billing_key_Invoice.json")
+DATABASE_URL = "https://onlineinvoiceapplication-default-rtdb.firebaseio.com/"
+DOCUMENTS_DIR = os.path.join(os.path.expanduser("~"), "Documents")
+BATCH_SIZE = 500
+
+
+# =====================================================
+# Helper: (bill, absolute path) jobs for the chosen bills
+# =====================================================
+def render_jobs(bills, bill_nos):
+    renamed = {}
+    jobs = []
+    for bill_no in bill_nos or bills:
+        bill = bills.get(str(bill_no))
+        if not isinstance(bill, dict):
+            print(f"⚠ Bill {bill_no} not found")
+            continue
+        relative_path = invoice_pdf_path(bill)
+        stored = bill.get("pdf_file_name")
+        if stored:
+            relative_path = os.path.join(os.path.dirname(relative_path), os.path.basename(stored.replace("\\", "/")))
+        if relative_path.replace("\\", "/") != str(stored).replace("\\", "/"):
+            renamed[str(bill_no)] = relative_path
+        jobs.append((bill, os.path.join(DOCUMENTS_DIR, relative_path)))
+    return jobs, renamed
+
+
+# =====================================================
+# Render in parallel with per-document timing
+# =====================================================
+def render(bills, bill_nos):
+    jobs, renamed = render_jobs(bills, bill_nos)
+    print(f"➡ Rendering {len(jobs)} invoices on {min(os.cpu_count() or 1, max(len(jobs), 1))} processes")
+
+    start = time.perf_counter()
+    rendered = set()
+    busy = 0.0
+    for bill_no, pdf_file_name, seconds, error in render_invoices_parallel(jobs):
+        busy += seconds
+        if error:
+            print(f"❌ {bill_no:<12} {error}")
+            continue
+        rendered.add(bill_no)
+        print(f"✔ {bill_no:<12} {seconds * 1000:8.1f} ms  {pdf_file_name}")
+    elapsed = time.perf_counter() - start
+
+    if jobs:
+        print(f"✔ {len(rendered)}/{len(jobs)} invoices in {elapsed:.2f}s "
+              f"({len(rendered) / elapsed:.1f}/s, {busy / len(jobs) * 1000:.1f} ms per document)")
+    return {bill_no: path for bill_no, path in renamed.items() if bill_no in rendered}
+
+
+# =====================================================
+# Render bills from a JSON export
+# =====================================================
+def render_json(path, bill_nos):
+    with open(path, "rb") as f:
+        newline = "\r\n" if b"\r\n" in f.read(4096) else "\n"
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    bills = data.get("bills", data)
+    renamed = render(bills, bill_nos)
+    if renamed:
+        for bill_no, relative_path in renamed.items():
+            bills[bill_no]["pdf_file_name"] = relative_path
+        with open(path, "w", encoding="utf-8", newline=newline) as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+        print(f"✔ {len(renamed)} PDF paths updated in {path}")
+
+
+# =====================================================
+# Render bills from Firebase, saving new paths in batches
+# =====================================================
+def render_firebase(bill_nos):
+    import firebase_admin
+    from firebase_admin import credentials, db
+
+    if not firebase_admin._apps:
+        firebase_admin.initialize_app(
+            credentials.Certificate(FIREBASE_KEY_PATH), {"databaseURL": DATABASE_URL}
+        )
+
+    bills_ref = db.reference("bills")
+    bills = bills_ref.get() or {}
+    if isinstance(bills, list):
+        bills = {str(i): b for i, b in enumerate(bills) if b is not None}
+
+    renamed = render(bills, bill_nos)
+    batch = {}
+    for bill_no, relative_path in renamed.items():
+        batch[f"{bill_no}/pdf_file_name"] = relative_path
+        if len(batch) >= BATCH_SIZE:
+            bills_ref.update(batch)
+            batch = {}
+    if batch:
+        bills_ref.update(batch)
+    if renamed:
+        print(f"✔ {len(renamed)} PDF paths updated in Firebase")
+
+
+if __name__ == "__main__":
+    target = sys.argv[1] if len(sys.argv) > 1 else "json"
+    if target == "firebase":
+        render_firebase(sys.argv[2:])
+    else:
+        args = sys.argv[2:]
+        path = args.pop(0) if args and args[0].endswith(".json") else DEFAULT_JSON
+        render_json(path, args)